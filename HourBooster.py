@@ -1,18 +1,29 @@
+import argparse
 import asyncio
 import logging
-import threading
 from aiogram import Bot, Dispatcher, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 
 # Импорты наших модулей
 from src.config_manager import ConfigManager
 from src.bot.states import SteamGuardStates
-from src.steam.steam_manager import clients, client_threads, pending_logins, run_steam_client
+from src.runtime import start_services, stop_services, start_all_accounts, resume_accounts
+from src.storage import state_storage
+from src.metrics import metrics
+from src.steam.steam_manager import session_pool, session_store, apply_account_changes, stop_steam_client, stop_all_clients, LOGIN_OK, STOP_OK
+from src.bot.callbacks import CallbackRouter, MenuCallback, AccountCallback, HELP, BACK, CANCEL_CODE
 from src.bot.ui_manager import create_main_keyboard, get_main_menu_text, create_account_keyboard, create_cancel_keyboard
-from src.bot.handlers import safe_edit_message, handle_account_start, handle_account_stop, handle_account_stats
-from src.bot.access_middleware import AccessMiddleware
+from src.bot.edit_queue import edit_queue
+from src.bot.dashboard import Dashboard
+from src.bot.handlers import safe_edit_message, guard_prompt, handle_account_start, handle_account_stop, handle_account_stats
+from src.bot.fsm_storage import PersistentStorage
+from src.steam.active_accounts import active_accounts
+from src.bot.access_middleware import AccessMiddleware, Tenant
+from src.bot.metrics_middleware import TelegramRequestMetrics, CallbackMetricsMiddleware
+from src.bot.webhook import run_webhook
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -21,24 +32,30 @@ logger = logging.getLogger(__name__)
 # Инициализируем менеджер конфигурации
 config_manager = ConfigManager()
 
-# Создаем экземпляры бота и диспетчера
-bot = Bot(token=config_manager.get_bot_token())
-dp = Dispatcher()
+# Диспетчер создается при импорте для регистрации хэндлеров, сам бот - в main()
+# Состояние диалогов хранится в state_storage и переживает перезапуск
+dp = Dispatcher(storage=PersistentStorage(state_storage))
 
-# Подключаем middleware для проверки доступа
-dp.message.middleware(AccessMiddleware(config_manager))
-dp.callback_query.middleware(AccessMiddleware(config_manager))
+NO_PERMISSION = "🚫 Недостаточно прав для этого действия"
+
+# Живая панель состояния включается командой /dashboard
+dashboard = Dashboard(config_manager.get_accounts_from_config, config_manager.get_dashboard_interval())
+
+# Подключаем middleware для проверки доступа (одна таблица пользователей на все события)
+access = AccessMiddleware(config_manager)
+dp.message.middleware(access)
+dp.callback_query.middleware(access)
 
 # Регистрация хэндлеров
 # Команда /start для отображения главного меню
 @dp.message(Command("start"))
-async def start_command(message: Message):
+async def start_command(message: Message, tenant: Tenant):
     """Главное меню бота"""
-    accounts = config_manager.get_accounts_from_config()
+    accounts = tenant.accounts
     text = get_main_menu_text(accounts)
     
     if not accounts:
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="ℹ️ Помощь", callback_data="help")]])
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="ℹ️ Помощь", callback_data=HELP)]])
     else:
         keyboard = create_main_keyboard(accounts)
     
@@ -57,19 +74,94 @@ async def help_command(message: Message):
     text += "⚙️ *Настройка:*\n"
     text += "Аккаунты настраиваются в файле `config.ini`\n\n"
     text += "📊 *Функции:*\n"
-    text += "• Управление тремя аккаунтами\n"
+    text += "• Управление любым количеством аккаунтов\n"
     text += "• Автоматическая Steam Guard поддержка\n"
     text += "• Статистика работы\n"
     text += "• Удобное управление кнопками\n\n"
     text += "🔧 *Команды:*\n"
     text += "/start - Главное меню\n"
     text += "/help - Помощь\n"
+    text += "/startall - Запустить все аккаунты\n"
+    text += "/stopall - Остановить все аккаунты\n"
+    text += "/dashboard - Живая панель состояния (/dashboard off - выключить)\n"
     text += "/cancel - Отменить ввод кода"
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="⬅️ Назад", callback_data="back")]])
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="⬅️ Назад", callback_data=BACK)]])
     
     await message.answer(text, reply_markup=keyboard, parse_mode='Markdown')
 
+# Команда /startall для запуска всех аккаунтов
+@dp.message(Command("startall"))
+async def start_all_command(message: Message, tenant: Tenant):
+    """Запустить все аккаунты"""
+    if not tenant.can('admin'):
+        await message.answer(NO_PERMISSION)
+        return
+    status_message = await message.answer("🚀 *Массовый запуск*\n\n⏳ Подготовка...", parse_mode='Markdown')
+    
+    async def progress(done, total, eta):
+        # Очередь правок склеивает частые обновления и соблюдает лимиты Telegram
+        text = "🚀 *Массовый запуск*\n\n"
+        text += f"📊 Обработано: {done}/{total}\n"
+        text += f"⏳ Осталось примерно: {int(eta)} сек"
+        edit_queue.post(status_message, text, parse_mode='Markdown')
+    
+    report = await start_all_accounts(config_manager, progress, tenant.accounts)
+    
+    text = "✅ *Массовый запуск завершен*\n\n"
+    text += f"🟢 Запущено: {len(report['started'])}/{report['total']}\n"
+    text += f"🕐 Время: {report['elapsed']:.0f} сек\n"
+    if report['failed']:
+        text += f"\n❌ Ошибки ({len(report['failed'])}):\n"
+        for account_name, reason in list(report['failed'].items())[:20]:
+            text += f"• {account_name}: `{reason}`\n"
+    try:
+        await edit_queue.edit(status_message, text, parse_mode='Markdown')
+    except TelegramBadRequest:
+        pass
+
+# Команда /stopall для параллельной остановки всех аккаунтов
+@dp.message(Command("stopall"))
+async def stop_all_command(message: Message, tenant: Tenant):
+    """Остановить все аккаунты"""
+    if not tenant.can('admin'):
+        await message.answer(NO_PERMISSION)
+        return
+    status_message = await message.answer("⏹️ *Остановка всех аккаунтов*\n\n⏳ Выполняется...", parse_mode='Markdown')
+    report = await stop_all_clients(config_manager.get_shutdown_timeout(), tenant.accounts)
+    
+    stopped = [name for name, outcome in report.items() if outcome == STOP_OK]
+    failed = {name: outcome for name, outcome in report.items() if outcome != STOP_OK}
+    text = "⏹️ *Остановка завершена*\n\n"
+    text += f"✅ Остановлено: {len(stopped)}/{len(report)}\n"
+    if failed:
+        text += f"\n⚠️ Проблемы ({len(failed)}):\n"
+        for account_name, outcome in list(failed.items())[:20]:
+            text += f"• {account_name}: `{outcome}`\n"
+    try:
+        await edit_queue.edit(status_message, text, parse_mode='Markdown')
+    except TelegramBadRequest:
+        pass
+
+# Команда /dashboard для закрепленной панели, которая обновляется сама
+@dp.message(Command("dashboard"))
+async def dashboard_command(message: Message, tenant: Tenant):
+    """Включить или выключить живую панель состояния"""
+    if message.text.split()[1:] == ["off"]:
+        if dashboard.close(message.chat.id):
+            await message.answer("📡 Панель состояния больше не обновляется")
+        else:
+            await message.answer("📡 Панель состояния не была включена")
+        return
+    await dashboard.open(message, tenant.accounts)
+
+# Реакция на изменение config.ini
+async def on_config_change(diff):
+    """Применить изменения аккаунтов и пользователей и обновить панель"""
+    access.reload()
+    await apply_account_changes(diff, config_manager.get_accounts_from_config())
+    dashboard.schedule()
+
 # Команда /cancel для отмены текущей операции
 @dp.message(Command("cancel"))
 async def cancel_command(message: Message, state: FSMContext):
@@ -78,97 +170,116 @@ async def cancel_command(message: Message, state: FSMContext):
     user_id = message.from_user.id
     
     if current_state in [SteamGuardStates.waiting_for_guard_code, SteamGuardStates.waiting_for_email_code]:
-        # Очищаем данные входа
-        if user_id in pending_logins:
-            del pending_logins[user_id]
+        # Закрываем незавершенный вход
+        login_data = session_store.pending_login(user_id)
+        if login_data:
+            await stop_steam_client(login_data.account_name)
         
         await state.clear()
         await message.answer("❌ Ввод кода отменен. Используйте /start для возврата в меню.")
     else:
         await message.answer("ℹ️ Нет активных операций для отмены. Используйте /start для начала работы.")
 
+# Обработчики нажатий на кнопки: маршрут находится по callback_data одним поиском
+callback_router = CallbackRouter()
+
+async def show_main_menu(callback_query, accounts, page=0, status_filter='all'):
+    text = get_main_menu_text(accounts)
+    if not accounts:
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="ℹ️ Помощь", callback_data=HELP)]])
+    else:
+        keyboard = create_main_keyboard(accounts, page, status_filter)
+    await safe_edit_message(callback_query, text, keyboard, 'Markdown')
+
+# Отмена ввода Steam Guard кода
+@callback_router.exact(CANCEL_CODE)
+async def on_cancel_code(callback_query, state, accounts, tenant):
+    login_data = session_store.pending_login(callback_query.from_user.id)
+    if login_data:
+        await stop_steam_client(login_data.account_name)
+    await state.clear()
+    await show_main_menu(callback_query, accounts)
+
+@callback_router.exact(BACK)
+async def on_back(callback_query, state, accounts, tenant):
+    await show_main_menu(callback_query, accounts)
+
+# Навигация по страницам главного меню и фильтр по статусу
+@callback_router.typed(MenuCallback)
+async def on_menu(callback_query, state, accounts, tenant, payload):
+    await show_main_menu(callback_query, accounts, payload.page, payload.status)
+
+@callback_router.exact(HELP)
+async def on_help(callback_query, state, accounts, tenant):
+    text = "📖 *Помощь*\n\n"
+    text += "🎯 *Как использовать:*\n"
+    text += "1. Выберите аккаунт из списка\n"
+    text += "2. Нажмите 'Запустить' для начала накрутки часов\n"
+    text += "3. При необходимости введите Steam Guard код\n"
+    text += "4. Используйте 'Остановить' для завершения\n\n"
+    text += "⚙️ *Настройка:*\n"
+    text += "Аккаунты настраиваются в файле `config.ini`\n\n"
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="⬅️ Назад", callback_data=BACK)]])
+    await safe_edit_message(callback_query, text, keyboard, 'Markdown')
+
+@callback_router.typed(AccountCallback, 'open')
+async def on_account(callback_query, state, accounts, tenant, payload):
+    account_name = accounts.name_for_key(payload.key)
+    if account_name not in accounts:
+        await safe_edit_message(callback_query, "❌ Аккаунт не найден")
+        return
+    
+    account_data = accounts[account_name]
+    is_active = session_store.is_active(account_name)
+    
+    text = f"⚙️ *Управление аккаунтом*\n\n"
+    text += f"👤 Логин: `{account_data['username']}`\n"
+    text += f"📁 Статус: {'🟢 Активен' if is_active else '🔴 Неактивен'}\n"
+    text += f"🎮 Игры: {', '.join(map(str, account_data['games']))}\n\n"
+    text += "Выберите действие:"
+    
+    keyboard = create_account_keyboard(account_name, tenant.can('operator'))
+    await safe_edit_message(callback_query, text, keyboard, 'Markdown')
+
+@callback_router.typed(AccountCallback, 'start')
+async def on_account_start(callback_query, state, accounts, tenant, payload):
+    await handle_account_start(accounts.name_for_key(payload.key), accounts, callback_query, state)
+
+@callback_router.typed(AccountCallback, 'stop')
+async def on_account_stop(callback_query, state, accounts, tenant, payload):
+    await handle_account_stop(accounts.name_for_key(payload.key), accounts, callback_query)
+
+@callback_router.typed(AccountCallback, 'stats')
+async def on_account_stats(callback_query, state, accounts, tenant, payload):
+    await handle_account_stats(accounts.name_for_key(payload.key), accounts, callback_query, tenant.can('operator'))
+
+# Кнопки, которые запускают и останавливают аккаунты (не для роли viewer)
+CONTROL_HANDLERS = {on_account_start, on_account_stop}
+
 # Обработчик callback запросов (нажатий на кнопки)
 @dp.callback_query()
-async def handle_callback_query(callback_query: CallbackQuery, state: FSMContext):
-    await callback_query.answer()
-    
-    data = callback_query.data
-    accounts = config_manager.get_accounts_from_config()
+async def handle_callback_query(callback_query: CallbackQuery, state: FSMContext, tenant: Tenant):
+    # Пользователь видит только свои аккаунты; набор готов заранее в таблице пользователей
+    accounts = tenant.accounts
+    handler, payload = callback_router.resolve(callback_query.data)
     
-    # Обработка отмены ввода кода
-    if data == "cancel_code":
-        user_id = callback_query.from_user.id
-        if user_id in pending_logins:
-            del pending_logins[user_id]
-        
-        await state.clear()
-        
-        text = get_main_menu_text(accounts)
-        if not accounts:
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="ℹ️ Помощь", callback_data="help")]])
-        else:
-            keyboard = create_main_keyboard(accounts)
-        
-        await safe_edit_message(callback_query, text, keyboard, 'Markdown')
+    if handler in CONTROL_HANDLERS and not tenant.can('operator'):
+        await callback_query.answer(NO_PERMISSION, show_alert=True)
         return
+    await callback_query.answer()
     
     # Сбрасываем состояние при любом callback (кроме самого процесса входа)
-    if not data.startswith("start_"):
+    if handler is not on_account_start:
         await state.clear()
     
-    if data == "refresh" or data == "back":
-        text = get_main_menu_text(accounts)
-        
-        if not accounts:
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="ℹ️ Помощь", callback_data="help")]])
-        else:
-            keyboard = create_main_keyboard(accounts)
-        
-        await safe_edit_message(callback_query, text, keyboard, 'Markdown')
-        
-    elif data == "help":
-        text = "📖 *Помощь*\n\n"
-        text += "🎯 *Как использовать:*\n"
-        text += "1. Выберите аккаунт из списка\n"
-        text += "2. Нажмите 'Запустить' для начала накрутки часов\n"
-        text += "3. При необходимости введите Steam Guard код\n"
-        text += "4. Используйте 'Остановить' для завершения\n\n"
-        text += "⚙️ *Настройка:*\n"
-        text += "Аккаунты настраиваются в файле `config.ini`\n\n"
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="⬅️ Назад", callback_data="back")]])
-        await safe_edit_message(callback_query, text, keyboard, 'Markdown')
-        
-    elif data.startswith("account_"):
-        account_name = data.replace("account_", "")
-        
-        if account_name not in accounts:
-            await safe_edit_message(callback_query, "❌ Аккаунт не найден")
-            return
-        
-        account_data = accounts[account_name]
-        is_active = account_name in clients and clients[account_name].logged_on
-        
-        text = f"⚙️ *Управление аккаунтом*\n\n"
-        text += f"👤 Логин: `{account_data['username']}`\n"
-        text += f"📁 Статус: {'🟢 Активен' if is_active else '🔴 Неактивен'}\n"
-        text += f"🎮 Игры: {', '.join(map(str, account_data['games']))}\n\n"
-        text += "Выберите действие:"
-        
-        keyboard = create_account_keyboard(account_name)
-        await safe_edit_message(callback_query, text, keyboard, 'Markdown')
-        
-    elif data.startswith("start_"):
-        account_name = data.replace("start_", "")
-        await handle_account_start(account_name, accounts, callback_query, state)
-        
-    elif data.startswith("stop_"):
-        account_name = data.replace("stop_", "")
-        await handle_account_stop(account_name, accounts, callback_query)
-        
-    elif data.startswith("stats_"):
-        account_name = data.replace("stats_", "")
-        await handle_account_stats(account_name, accounts, callback_query)
+    if handler is None:
+        # Неизвестная или устаревшая кнопка (например, в старом сообщении) - возвращаем в меню
+        await show_main_menu(callback_query, accounts)
+    elif payload is None:
+        await handler(callback_query, state, accounts, tenant)
+    else:
+        await handler(callback_query, state, accounts, tenant, payload)
 
 # Обработчик для ввода Steam Guard кода
 @dp.message(SteamGuardStates.waiting_for_guard_code)
@@ -177,15 +288,15 @@ async def process_guard_code(message: Message, state: FSMContext):
     user_id = message.from_user.id
     guard_code = message.text.strip()
     
-    if user_id not in pending_logins:
+    login_data = session_store.pending_login(user_id)
+    if login_data is None:
         await message.answer("❌ Сессия истекла. Попробуйте запустить аккаунт заново.")
         await state.clear()
         return
     
-    login_data = pending_logins[user_id]
-    account_name = login_data['account_name']
-    account_data = login_data['account_data']
-    original_message = login_data.get('original_message')
+    account_name = login_data.account_name
+    account_data = login_data.account_data
+    original_message = login_data.original_message
     
     # Обновляем исходное сообщение
     if original_message:
@@ -195,18 +306,10 @@ async def process_guard_code(message: Message, state: FSMContext):
         cancel_keyboard = create_cancel_keyboard()
         await safe_edit_message(original_message, text, cancel_keyboard, 'Markdown')
     
-    # Запускаем вход с кодом
-    thread = threading.Thread(
-        target=run_steam_client, 
-        args=(account_name, account_data, user_id, guard_code, None)
-    )
-    thread.daemon = True
-    thread.start()
-    client_threads[account_name] = thread
+    # Запускаем вход с кодом и ждем ответа Steam
+    result = await session_pool.login(account_name, account_data, user_id, guard_code, None)
     
-    await asyncio.sleep(3)
-    
-    if account_name in clients and clients[account_name].logged_on:
+    if result.status == LOGIN_OK:
         # Успешный вход - обновляем исходное сообщение
         if original_message:
             text = f"✅ *Успешный вход!*\n\n"
@@ -248,15 +351,15 @@ async def process_email_code(message: Message, state: FSMContext):
     user_id = message.from_user.id
     email_code = message.text.strip()
     
-    if user_id not in pending_logins:
+    login_data = session_store.pending_login(user_id)
+    if login_data is None:
         await message.answer("❌ Сессия истекла. Попробуйте запустить аккаунт заново.")
         await state.clear()
         return
     
-    login_data = pending_logins[user_id]
-    account_name = login_data['account_name']
-    account_data = login_data['account_data']
-    original_message = login_data.get('original_message')
+    account_name = login_data.account_name
+    account_data = login_data.account_data
+    original_message = login_data.original_message
     
     # Обновляем исходное сообщение
     if original_message:
@@ -266,18 +369,10 @@ async def process_email_code(message: Message, state: FSMContext):
         cancel_keyboard = create_cancel_keyboard()
         await safe_edit_message(original_message, text, cancel_keyboard, 'Markdown')
     
-    # Запускаем вход с кодом
-    thread = threading.Thread(
-        target=run_steam_client, 
-        args=(account_name, account_data, user_id, None, email_code)
-    )
-    thread.daemon = True
-    thread.start()
-    client_threads[account_name] = thread
-    
-    await asyncio.sleep(3)
+    # Запускаем вход с кодом и ждем ответа Steam
+    result = await session_pool.login(account_name, account_data, user_id, None, email_code)
     
-    if account_name in clients and clients[account_name].logged_on:
+    if result.status == LOGIN_OK:
         # Успешный вход - обновляем исходное сообщение
         if original_message:
             text = f"✅ *Успешный вход!*\n\n"
@@ -329,10 +424,10 @@ async def unknown_command(message: Message, state: FSMContext):
             pass
         
         # Обновляем исходное сообщение с подсказкой
-        if user_id in pending_logins:
-            login_data = pending_logins[user_id]
-            original_message = login_data.get('original_message')
-            account_data = login_data['account_data']
+        login_data = session_store.pending_login(user_id)
+        if login_data:
+            original_message = login_data.original_message
+            account_data = login_data.account_data
             
             if original_message:
                 if current_state == SteamGuardStates.waiting_for_guard_code:
@@ -355,12 +450,60 @@ async def unknown_command(message: Message, state: FSMContext):
     text = "❓ Неизвестная команда. Используйте /start для начала работы."
     await message.answer(text)
 
+# Восстановление после перезапуска: аккаунтам, которым снова нужен Steam Guard код,
+# запрос приходит новым сообщением
+async def resume_sessions(bot, start_all):
+    report = await resume_accounts(config_manager)
+    if report:
+        for entry in active_accounts.restored.values():
+            user_id = entry['user_id']
+            login_data = session_store.pending_login(user_id) if user_id else None
+            if login_data is None or login_data.original_message is not None:
+                continue
+            text, guard_state = guard_prompt(login_data.account_data, login_data.guard_type)
+            try:
+                sent = await bot.send_message(user_id, text, reply_markup=create_cancel_keyboard(), parse_mode='Markdown')
+            except Exception as e:
+                logger.error(f"Не удалось запросить Steam Guard код для {login_data.account_name}: {e}")
+                continue
+            session_store.update(login_data.account_name, original_message=sent)
+            await dp.fsm.get_context(bot, chat_id=user_id, user_id=user_id).set_state(guard_state)
+    if start_all:
+        await start_all_accounts(config_manager)
+
 # Обработчик для получения статистики аккаунта
-async def main():
+async def main(start_all=False):
     """Главная функция для запуска бота"""
+    bot = Bot(token=config_manager.get_bot_token())
+    edit_queue.configure(*config_manager.get_edit_limits())
+    tasks = await start_services(config_manager, on_config_change)
+    if metrics.enabled:
+        # Без включенных метрик замеры не подключаются вовсе
+        bot.session.middleware(TelegramRequestMetrics())
+        dp.callback_query.middleware(CallbackMetricsMiddleware())
+    # Запуск идет в фоне, бот отвечает сразу
+    tasks.append(asyncio.create_task(resume_sessions(bot, start_all)))
     logger.info("🤖 Бот запущен!")
-    await dp.start_polling(bot)
+    try:
+        if config_manager.get_update_mode() == 'webhook':
+            await run_webhook(dp, bot, config_manager.get_webhook_settings())
+        else:
+            # Оставшийся от режима webhook webhook не дает получать обновления через getUpdates
+            await bot.delete_webhook()
+            # start_polling сам завершается по SIGINT/SIGTERM
+            await dp.start_polling(bot)
+    finally:
+        # Корректно выходим из Steam всеми аккаунтами за ограниченное время
+        await stop_services(config_manager, tasks)
+        stats = edit_queue.stats
+        logger.info(
+            f"Правки сообщений: запрошено {stats['requested']}, отправлено {stats['sent']}, "
+            f"сэкономлено {edit_queue.saved_calls()}, RetryAfter {stats['retry_after']}"
+        )
 
 # Запуск бота
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Steam Hour Booster Bot")
+    parser.add_argument('--start-all', action='store_true', help="запустить все аккаунты при старте")
+    args = parser.parse_args()
+    asyncio.run(main(start_all=args.start_all))
@@ -0,0 +1,78 @@
+"""Стоимость поиска аккаунта на один callback при 10k аккаунтов:
+старый подход (перечитать конфиг на каждый callback) против реестра.
+
+Запуск: python benchmarks/account_lookup.py [--accounts 10000]
+"""
+import argparse
+import configparser
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.account_registry import AccountRegistry
+
+
+def build_ini(count):
+    config = configparser.ConfigParser()
+    for i in range(1, count + 1):
+        config[f'account{i}'] = {'username': f'user{i}', 'password': 'secret', 'games': '570,730,440'}
+    return config
+
+
+def legacy_lookup(config, account_name):
+    # Как было: весь словарь собирается заново на каждый callback
+    accounts = {}
+    for section in config.sections():
+        accounts[section] = {
+            'username': config[section]['username'],
+            'password': config[section]['password'],
+            'games': [int(game.strip()) for game in config[section]['games'].split(',') if game.strip()]
+        }
+    return accounts[account_name]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--accounts', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=10000)
+    args = parser.parse_args()
+
+    config = build_ini(args.accounts)
+    target = f'account{args.accounts // 2}'
+
+    rounds = max(1, args.lookups // 1000)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        legacy_lookup(config, target)
+    legacy = (time.perf_counter() - start) / rounds
+
+    with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+        for i in range(1, args.accounts + 1):
+            f.write(json.dumps({'name': f'account{i}', 'username': f'user{i}', 'password': 'secret', 'games': [570, 730, 440]}) + '\n')
+        path = f.name
+    try:
+        start = time.perf_counter()
+        registry = AccountRegistry()
+        registry.load_file(path)
+        load_time = time.perf_counter() - start
+    finally:
+        os.unlink(path)
+
+    start = time.perf_counter()
+    for _ in range(args.lookups):
+        registry[target]
+        registry.by_username('user1')
+    indexed = (time.perf_counter() - start) / args.lookups
+
+    print(f"accounts={args.accounts}")
+    print(f"legacy per-callback rebuild: {legacy * 1e3:.2f} ms")
+    print(f"registry load (jsonl, once): {load_time * 1e3:.1f} ms")
+    print(f"registry per-callback lookup: {indexed * 1e6:.3f} us")
+
+
+if __name__ == '__main__':
+    main()
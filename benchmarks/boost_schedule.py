@@ -0,0 +1,173 @@
+"""Стоимость планирования накрутки для тысяч аккаунтов: общая куча событий
+BoostScheduler против опроса всех аккаунтов раз в минуту (так ведет себя
+таймер на аккаунт с периодической проверкой окна, партии и целей).
+
+Steam и Telegram не нужны: сессии - записи SessionStore в состоянии ACTIVE,
+пул только считает отправленные списки игр, часы по играм растут вместе
+с модельным временем. Модельная неделя проходит без сна, часы подменены.
+
+Запуск: python benchmarks/boost_schedule.py [--accounts 10000] [--days 7]
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.account_registry import AccountRegistry
+from src.steam import boost_schedule
+from src.steam.boost_schedule import BoostScheduler
+from src.steam.session_store import SessionStore, SessionState
+
+WINDOWS = [
+    None,
+    "mon-fri 18:00-23:30; sat,sun 10:00-02:00",
+    "* 09:00-21:00",
+    "* 22:00-06:00",
+]
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Clock:
+    """Модельные часы вместо модуля time в boost_schedule"""
+    now = 1_800_000_000.0
+
+    def time(self):
+        return self.now
+
+    def localtime(self, seconds=None):
+        return time.localtime(self.now if seconds is None else seconds)
+
+
+class Tracker:
+    """Часы по играм считаются от модельного времени по текущим спискам игр"""
+    enabled = True
+
+    def __init__(self, store, clock):
+        self.store = store
+        self.clock = clock
+        self.hours = {}
+        self.since = {}
+
+    def games_changed(self, account_name, games):
+        self._settle(account_name)
+
+    def _settle(self, account_name):
+        now = self.clock.now
+        record = self.store.get(account_name)
+        started = self.since.get(account_name, now)
+        hours = self.hours.setdefault(account_name, {})
+        for app_id in record.games or ():
+            hours[app_id] = hours.get(app_id, 0.0) + (now - started) / 3600
+        self.since[account_name] = now
+
+    def summary(self, account_name):
+        self._settle(account_name)
+        return {'game_hours': self.hours.get(account_name, {})}
+
+
+class Pool:
+    def __init__(self, store, tracker):
+        self.store = store
+        self.tracker = tracker
+        self.updates = 0
+
+    def update_games(self, account_name, games):
+        self.tracker.games_changed(account_name, games)
+        self.store.update(account_name, games=tuple(games))
+        self.updates += 1
+
+
+def build(args, seed):
+    rng = random.Random(seed)
+    registry = AccountRegistry()
+    schedules, targets = {}, {}
+    for index in range(args.accounts):
+        name = f'account{index}'
+        games = rng.sample(range(10, 5000), rng.randint(3, 80))
+        registry.add(name, name, 'x', games)
+        window = rng.choice(WINDOWS)
+        if window:
+            schedules[name] = window
+        if rng.random() < 0.5:
+            targets[name] = ', '.join(f'{app_id}:{rng.randint(5, 60)}' for app_id in rng.sample(games, min(3, len(games))))
+    settings = {'schedules': schedules, 'targets': targets, 'batch_size': 32, 'interval': 3600}
+    return registry, settings
+
+
+def make_scheduler(registry, settings, clock):
+    store = SessionStore()
+    tracker = Tracker(store, clock)
+    pool = Pool(store, tracker)
+    scheduler = BoostScheduler()
+    scheduler.configure(settings)
+    # То же, что open(), но без asyncio: цикл ведет сам бенчмарк
+    scheduler._accounts, scheduler._store, scheduler._pool, scheduler._tracker = registry, store, pool, tracker
+    scheduler._wakeup = type('Event', (), {'set': lambda self: None})()
+    for name in registry:
+        store.transition(name, SessionState.ACTIVE, games=())
+        scheduler.on_state_change(name, SessionState.CONNECTING, SessionState.ACTIVE)
+    return scheduler, pool
+
+
+def run_heap(registry, settings, clock, days):
+    scheduler, pool = make_scheduler(registry, settings, clock)
+    end = clock.now + days * 86400
+    wakeups = 0
+    started = cpu_seconds()
+    while True:
+        next_due = scheduler.run_due(clock.now)
+        if next_due is None or next_due > end:
+            break
+        clock.now = next_due
+        wakeups += 1
+    return cpu_seconds() - started, wakeups, scheduler.stats['plans'], pool.updates
+
+
+def run_polling(registry, settings, clock, days, step):
+    scheduler, pool = make_scheduler(registry, settings, clock)
+    end = clock.now + days * 86400
+    wakeups = 0
+    started = cpu_seconds()
+    while clock.now + step <= end:
+        clock.now += step
+        wakeups += 1
+        for name in registry:
+            scheduler._apply(name, clock.now)
+    return cpu_seconds() - started, wakeups, scheduler.stats['plans'], pool.updates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=10000)
+    parser.add_argument('--days', type=float, default=7)
+    parser.add_argument('--poll', type=float, default=60, help="период опроса для сравнения (секунды)")
+    parser.add_argument('--poll-days', type=float, default=0.25, help="сколько дней опрашивать (опрос медленный)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    registry, settings = build(args, args.seed)
+    print(f"Аккаунтов: {args.accounts}, расписаний: {len(settings['schedules'])}, с целями: {len(settings['targets'])}\n")
+
+    clock = Clock()
+    boost_schedule.time = clock
+    cpu, wakeups, plans, updates = run_heap(registry, settings, clock, args.days)
+    print(f"куча событий, {args.days:g} дн.: CPU {cpu:6.2f} с ({cpu / args.days:.3f} с/день), пробуждений {wakeups}, "
+          f"планов {plans}, смен игр {updates}")
+
+    clock = Clock()
+    boost_schedule.time = clock
+    cpu, wakeups, plans, updates = run_polling(registry, settings, clock, args.poll_days, args.poll)
+    print(f"опрос раз в {args.poll:g} с, {args.poll_days:g} дн.: CPU {cpu:6.2f} с ({cpu / args.poll_days:.3f} с/день), "
+          f"пробуждений {wakeups}, планов {plans}, смен игр {updates}")
+
+
+if __name__ == '__main__':
+    main()
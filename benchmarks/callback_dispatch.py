@@ -0,0 +1,123 @@
+"""Стоимость поиска обработчика нажатия: старая цепочка startswith/replace
+против CallbackRouter с типизированными данными кнопок.
+
+Измеряется только маршрутизация (без Telegram и Steam): для каждого нажатия
+нужно найти обработчик и разобрать параметры. Набор нажатий похож на живой:
+в основном меню и карточки аккаунтов, реже запуск, остановка и статистика.
+
+Запуск: python benchmarks/callback_dispatch.py [--accounts 500] [--clicks 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.account_registry import account_key
+from src.bot.callbacks import CallbackRouter, MenuCallback, AccountCallback, HELP, BACK, CANCEL_CODE
+
+WEIGHTS = {'menu': 40, 'open': 30, 'start': 8, 'stop': 8, 'stats': 10, 'help': 2, 'back': 2}
+
+
+def _handler(*args):
+    pass
+
+
+def legacy_dispatch(data):
+    # Цепочка из HourBooster.py до перехода на CallbackRouter
+    if data == "cancel_code":
+        return _handler, None
+    if data == "refresh" or data == "back" or data.startswith("menu_"):
+        page, status_filter = 0, 'all'
+        if data.startswith("menu_"):
+            _, page, status_filter = data.split("_", 2)
+            page = int(page)
+        return _handler, (page, status_filter)
+    elif data == "help":
+        return _handler, None
+    elif data.startswith("account_"):
+        return _handler, data.replace("account_", "")
+    elif data.startswith("start_"):
+        return _handler, data.replace("start_", "")
+    elif data.startswith("stop_"):
+        return _handler, data.replace("stop_", "")
+    elif data.startswith("stats_"):
+        return _handler, data.replace("stats_", "")
+    return None, None
+
+
+def legacy_data(kind, account, page):
+    if kind == 'menu':
+        return f"menu_{page}_all"
+    if kind == 'open':
+        return f"account_{account}"
+    if kind in ('help', 'back'):
+        return kind
+    return f"{kind}_{account}"
+
+
+def typed_data(kind, account, page):
+    if kind == 'menu':
+        return MenuCallback(page=page).pack()
+    if kind == 'help':
+        return HELP
+    if kind == 'back':
+        return BACK
+    return AccountCallback(action=kind, key=account_key(account)).pack()
+
+
+def build_router():
+    router = CallbackRouter()
+    for data in (HELP, BACK, CANCEL_CODE):
+        router.exact(data)(_handler)
+    router.typed(MenuCallback)(_handler)
+    for action in ('open', 'start', 'stop', 'stats'):
+        router.typed(AccountCallback, action)(_handler)
+    return router
+
+
+def bench(name, dispatch, clicks):
+    started = time.perf_counter()
+    for data in clicks:
+        dispatch(data)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<8} clicks={len(clicks)} {elapsed / len(clicks) * 1e6:.2f}us/click")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--accounts', type=int, default=500)
+    parser.add_argument('--clicks', type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    # Имена вроде stop_farm_1 - старая схема путает их с действиями
+    accounts = [f"{rng.choice(['main', 'farm', 'stop_farm', 'start'])}_{i}" for i in range(args.accounts)]
+    kinds = rng.choices(list(WEIGHTS), weights=list(WEIGHTS.values()), k=args.clicks)
+    plan = [(kind, rng.choice(accounts), rng.randrange(20)) for kind in kinds]
+
+    legacy = [legacy_data(*click) for click in plan]
+    typed = [typed_data(*click) for click in plan]
+    router = build_router()
+    bench('legacy', legacy_dispatch, legacy)
+    # Без кэша разбора - каждое нажатие проходит валидацию pydantic
+    bench('cold', router._unpack_uncached, typed)
+    bench('router', router.resolve, typed)
+
+    # Корректность разбора: имя аккаунта должно вернуться без изменений
+    wrong = sum(
+        1 for (kind, account, _), data in zip(plan, legacy)
+        if kind in ('open', 'start', 'stop', 'stats') and legacy_dispatch(data)[1] != account
+    )
+    print(f"legacy misparsed account names: {wrong}")
+    wrong = sum(
+        1 for (kind, account, _), data in zip(plan, typed)
+        if kind in ('open', 'start', 'stop', 'stats') and router.resolve(data)[1].key != account_key(account)
+    )
+    print(f"router misparsed account names: {wrong}")
+
+
+if __name__ == '__main__':
+    main()
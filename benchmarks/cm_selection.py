@@ -0,0 +1,200 @@
+"""Подключение к CM серверам: свой список у каждого клиента (как в steam)
+против общего CMDirectory с кэшем на диске и выбором по задержке.
+
+Steam не нужен: список серверов поддельный, у каждого сервера своя задержка
+подключения и доля отказов, запрос к WebAPI тоже имитируется задержкой.
+Подключается настоящий CMClient.connect, подменено только соединение.
+Сценарии: массовый запуск, затем "шторм" переподключений, когда часть
+серверов перестает отвечать, и повторный запуск с кэшем на диске.
+
+Пауза CMClient между неудачными попытками (до 5 секунд) ускорена в
+--pause-scale раз, но во время подключения засчитывается полностью.
+
+Запуск: python benchmarks/cm_selection.py [--clients 500] [--servers 60]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import gevent
+from steam.core.cm import CMClient, CMServerList
+from steam.core.connection import Connection
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.steam.cm_directory import CMDirectory
+
+WEBAPI_LATENCY = 0.15
+
+
+class FakeCM:
+    """Поддельные CM серверы: адрес -> (задержка, доля отказов)"""
+
+    def __init__(self, count, seed):
+        rng = random.Random(seed)
+        self.servers = {}
+        for index in range(count):
+            latency = min(0.4, rng.lognormvariate(-3.0, 0.8))
+            failure_rate = 0.5 if rng.random() < 0.1 else 0.02
+            self.servers[(f'10.0.{index // 250}.{index % 250 + 1}', 27017)] = (latency, failure_rate)
+        self.dead = set()
+        self.rng = rng
+        self.webapi_requests = 0
+
+    def addresses(self):
+        self.webapi_requests += 1
+        gevent.sleep(WEBAPI_LATENCY)
+        return list(self.servers)
+
+    def kill(self, share):
+        self.dead = set(self.rng.sample(list(self.servers), int(len(self.servers) * share)))
+
+
+class FakeConnection(Connection):
+    def __init__(self, cm):
+        super().__init__()
+        self.cm = cm
+
+    def connect(self, server_addr):
+        latency, failure_rate = self.cm.servers[server_addr]
+        if server_addr in self.cm.dead:
+            gevent.sleep(0.5)  # пока не истечет таймаут
+            return False
+        gevent.sleep(latency)
+        if random.random() < failure_rate:
+            return False
+        self.server_addr = server_addr
+        self.event_connected.set()
+        return True
+
+    def disconnect(self):
+        self.event_connected.clear()
+        self.server_addr = None
+
+
+class PerClientList(CMServerList):
+    """Поведение по умолчанию: каждый клиент сам запрашивает список"""
+
+    def __init__(self, cm):
+        super().__init__()
+        self.cm = cm
+
+    def bootstrap_from_webapi(self, cell_id=0):
+        self.clear()
+        self.merge_list(self.cm.addresses())
+        return True
+
+
+class FakeDirectory(CMDirectory):
+    def __init__(self, cm):
+        super().__init__()
+        self.cm = cm
+
+    def _fetch(self):
+        return self.cm.addresses()
+
+
+class Client(CMClient):
+    pause_scale = 0.01
+
+    def __init__(self, cm, directory=None):
+        super().__init__()
+        self.connection = FakeConnection(cm)
+        if directory is None:
+            self.cm_servers = PerClientList(cm)
+        else:
+            directory.attach(self)
+        self.paused = 0.0
+
+    def sleep(self, seconds):
+        self.paused += seconds
+        gevent.sleep(seconds * self.pause_scale)
+
+
+def connect_all(clients, stagger):
+    """Подключить клиентов с шагом stagger; вернуть время подключения каждого (секунды)"""
+    durations = []
+
+    def connect(client):
+        client.paused = 0.0
+        started = time.perf_counter()
+        client.connect()
+        elapsed = time.perf_counter() - started
+        durations.append(elapsed - client.paused * client.pause_scale + client.paused)
+
+    greenlets = []
+    for client in clients:
+        greenlets.append(gevent.spawn(connect, client))
+        gevent.sleep(stagger)
+    gevent.joinall(greenlets)
+    return durations
+
+
+def spread(clients):
+    counts = {}
+    for client in clients:
+        counts[client.current_server_addr] = counts.get(client.current_server_addr, 0) + 1
+    return max(counts.values()), len(counts)
+
+
+def report(name, cm, clients, durations, requests_before):
+    durations.sort()
+    peak, used = spread(clients)
+    p99 = durations[int(len(durations) * 0.99) - 1]
+    print(f"{name:<36} среднее {statistics.mean(durations) * 1000:6.0f} мс   p50 {statistics.median(durations) * 1000:5.0f} мс   "
+          f"p99 {p99 * 1000:6.0f} мс   "
+          f"WebAPI {cm.webapi_requests - requests_before:4d}   серверов {used:3d}, максимум сессий {peak}")
+
+
+def run(name, cm, args, directory_factory=None):
+    directory = directory_factory() if directory_factory else None
+    clients = [Client(cm, directory) for _ in range(args.clients)]
+    cm.dead = set()
+    requests_before = cm.webapi_requests
+    report(f"{name}: запуск", cm, clients, connect_all(clients, args.stagger), requests_before)
+
+    for client in clients:
+        client.disconnect()
+    cm.kill(args.dead)
+    requests_before = cm.webapi_requests
+    report(f"{name}: переподключение", cm, clients, connect_all(clients, args.stagger / 4), requests_before)
+    for client in clients:
+        client.disconnect()
+    if directory is not None:
+        directory.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--servers', type=int, default=60)
+    parser.add_argument('--dead', type=float, default=0.25, help="доля серверов, отказавших перед переподключением")
+    parser.add_argument('--stagger', type=float, default=0.002, help="шаг между запусками клиентов (секунды)")
+    parser.add_argument('--pause-scale', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    Client.pause_scale = args.pause_scale
+
+    random.seed(args.seed)
+    cm = FakeCM(args.servers, args.seed)
+    print(f"Клиентов: {args.clients}, серверов: {args.servers}, отказывают при переподключении: {args.dead:.0%}\n")
+    run("свой список", cm, args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cm_servers.json')
+
+        def directory():
+            directory = FakeDirectory(cm)
+            directory.open(path, 86400)
+            return directory
+
+        run("CMDirectory, пустой кэш", cm, args, directory)
+        run("CMDirectory, кэш на диске", cm, args, directory)
+
+
+if __name__ == '__main__':
+    main()
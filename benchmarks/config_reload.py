@@ -0,0 +1,95 @@
+"""Стоимость перезагрузки конфигурации при N неизмененных аккаунтов.
+
+Как ConfigWatcher: config.ini и файл аккаунтов ([accounts] source) читаются
+заново (read_config) и применяются к живому реестру (apply_config). Меняется
+ровно один аккаунт:
+- ini: игры аккаунта в config.ini, файл аккаунтов не тронут;
+- файл: одна строка в файле аккаунтов (CSV или JSONL).
+Для каждого N печатается медиана времени, число затронутых аккаунтов и, для
+сравнения, время простого чтения строк файла аккаунтов: измененный файл
+приходится прочитать целиком, остальное зависит только от числа изменений.
+
+Запуск: python benchmarks/config_reload.py [--sizes 1000,10000,100000] [--format jsonl]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config_manager import ConfigManager
+
+
+def write_ini(path, source, games):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"[account1]\nusername = ini_user\npassword = secret\ngames = {games}\n\n")
+        f.write(f"[accounts]\nsource = {source}\n\n[reload]\ninterval = 0\n")
+
+
+def write_accounts(path, count, changed_games, file_format):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if file_format == 'csv':
+            f.write("name,username,password,games\n")
+        for index in range(count):
+            games = changed_games if index == count // 2 else '570,730,440'
+            if file_format == 'csv':
+                f.write(f'file{index},user{index},secret,"{games}"\n')
+            else:
+                record = {'name': f'file{index}', 'username': f'user{index}', 'password': 'secret',
+                          'games': [int(game) for game in games.split(',')]}
+                f.write(json.dumps(record) + '\n')
+
+
+def reload(config_manager):
+    started = time.perf_counter()
+    config, accounts = config_manager.read_config()
+    diff = config_manager.apply_config(config, accounts)
+    return time.perf_counter() - started, len(diff.added) + len(diff.removed) + len(diff.changed)
+
+
+def measure(directory, count, file_format, rounds):
+    ini_path = os.path.join(directory, 'config.ini')
+    source = os.path.join(directory, f'accounts.{file_format}')
+    write_ini(ini_path, source, '570')
+    write_accounts(source, count, '570,730,440', file_format)
+    config_manager = ConfigManager(ini_path)
+    config_manager.get_accounts_from_config()
+
+    results = {'ini': [], 'файл': [], 'чтение': []}
+    touched = {}
+    for round_index in range(rounds):
+        # Каждый раунд меняет значение, чтобы изменение действительно было
+        write_ini(ini_path, source, f'570,{round_index + 1}')
+        elapsed, touched['ini'] = reload(config_manager)
+        results['ini'].append(elapsed)
+        write_accounts(source, count, f'570,{round_index + 1}', file_format)
+        elapsed, touched['файл'] = reload(config_manager)
+        results['файл'].append(elapsed)
+        started = time.perf_counter()
+        with open(source, encoding='utf-8') as f:
+            f.readlines()
+        results['чтение'].append(time.perf_counter() - started)
+    touched['чтение'] = 0
+    return {name: (statistics.median(values), touched[name]) for name, values in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'аккаунтов':>10} {'изменение':>10} {'время, мс':>10} {'мкс/аккаунт':>12} {'затронуто':>10}")
+    for count in map(int, args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, (elapsed, touched) in measure(directory, count, args.format, args.rounds).items():
+                print(f"{count:>10} {name:>10} {elapsed * 1000:>10.2f} {elapsed / count * 1e6:>12.3f} {touched:>10}")
+
+
+if __name__ == '__main__':
+    main()
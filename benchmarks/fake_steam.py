@@ -0,0 +1,161 @@
+"""Поддельный Steam для бенчмарков: CM серверы и вход без сети.
+
+FakeSteamClient - настоящий SteamClient, у которого подменены соединение и
+вход. Подключение идет обычным CMClient.connect через cm_directory (с паузой
+5 секунд после отказа сервера, как у steam), вход отвечает EResult с заданной
+задержкой: часть аккаунтов требует Steam Guard код, часть входов отклоняется,
+сессии обрываются "сервером" через случайное время, выход подтверждается
+закрытием соединения. Сокеты не открываются, поэтому память сессии меньше
+настоящей на буферы сокета.
+
+Использование: install(settings) подменяет SteamClient в steam_manager;
+для процессов шардов - functools.partial(install, settings) как initializer.
+"""
+import logging
+import os
+import random
+import struct
+import sys
+import zlib
+
+import gevent
+from steam.client import SteamClient
+from steam.core.connection import Connection
+from steam.enums import EResult
+from steam.enums.emsg import EMsg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Код Steam Guard, который принимает поддельный Steam
+GUARD_CODE = '12345'
+# Отказы входа, не связанные с паролем и кодами
+FAILURE_RESULTS = (EResult.TryAnotherCM, EResult.ServiceUnavailable, EResult.RateLimitExceeded, EResult.Timeout)
+PROTO_MASK = 0x80000000
+
+DEFAULTS = {
+    'servers': 20,
+    'cm_latency': 0.03,  # медиана подключения к CM серверу (секунды)
+    'cm_failures': 0.01,  # доля неудачных подключений
+    'login_latency': 0.3,  # медиана ответа на вход (секунды)
+    'latency_sigma': 0.5,  # разброс задержек (сигма логнормального распределения)
+    'guard': 0.05,  # доля аккаунтов, которым нужен Steam Guard код
+    'failures': 0.02,  # доля входов, отклоненных с FAILURE_RESULTS
+    'disconnect_interval': 0,  # среднее время жизни соединения (секунды), 0 - без обрывов
+    'logout_latency': 0.05,  # через сколько сервер закрывает соединение после выхода
+    'seed': 1,
+}
+
+
+class FakeSteam:
+    """Поведение серверов Steam; одно на процесс"""
+
+    def __init__(self, settings=None):
+        self.settings = dict(DEFAULTS, **(settings or {}))
+        self.rng = random.Random(self.settings['seed'])
+        self.login_keys = {}  # username -> выданный login key
+
+    def addresses(self):
+        return [(f'10.0.0.{index + 1}', 27017) for index in range(self.settings['servers'])]
+
+    def _latency(self, median):
+        return median * self.rng.lognormvariate(0, self.settings['latency_sigma'])
+
+    def needs_guard(self, username):
+        # Один и тот же аккаунт всегда требует код одного типа
+        bucket = zlib.crc32(username.encode('utf-8')) % 10000
+        if bucket / 10000 >= self.settings['guard']:
+            return None
+        return 'mobile' if bucket % 2 == 0 else 'email'
+
+    def connect(self, server_addr):
+        gevent.sleep(self._latency(self.settings['cm_latency']))
+        return self.rng.random() >= self.settings['cm_failures']
+
+    def login(self, username, password, login_key, auth_code, two_factor_code):
+        gevent.sleep(self._latency(self.settings['login_latency']))
+        if self.rng.random() < self.settings['failures']:
+            return self.rng.choice(FAILURE_RESULTS)
+        if login_key:
+            return EResult.OK if self.login_keys.get(username) == login_key else EResult.InvalidPassword
+        guard = self.needs_guard(username)
+        if guard == 'mobile' and two_factor_code != GUARD_CODE:
+            return EResult.TwoFactorCodeMismatch if two_factor_code else EResult.AccountLoginDeniedNeedTwoFactor
+        if guard == 'email' and auth_code != GUARD_CODE:
+            return EResult.InvalidLoginAuthCode if auth_code else EResult.AccountLogonDenied
+        self.login_keys.setdefault(username, f'key-{username}')
+        return EResult.OK
+
+    def session_lifetime(self):
+        interval = self.settings['disconnect_interval']
+        return self.rng.expovariate(1 / interval) if interval > 0 else None
+
+
+class FakeConnection(Connection):
+    """Соединение без сокета: отправленные сообщения разбираются только до EMsg"""
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    def connect(self, server_addr):
+        if not self.client.backend.connect(server_addr):
+            return False
+        self.server_addr = server_addr
+        self.event_connected.set()
+        return True
+
+    def disconnect(self):
+        if not self.event_connected.is_set():
+            return
+        self.event_connected.clear()
+        self.server_addr = None
+        self.recv_queue.put(StopIteration)
+
+    def put_message(self, message):
+        emsg = struct.unpack_from('<I', message)[0] & ~PROTO_MASK
+        if emsg == EMsg.ClientLogOff:
+            # Steam отвечает на выход закрытием соединения
+            gevent.spawn_later(self.client.backend.settings['logout_latency'], self.client.disconnect)
+
+
+class FakeSteamClient(SteamClient):
+    backend = None
+
+    def __init__(self):
+        super().__init__()
+        self.connection = FakeConnection(self)
+        self._drop = None
+
+    def login(self, username, password='', login_key=None, auth_code=None, two_factor_code=None, login_id=None):
+        self.username = username
+        if not self.connected and not self._connecting and not self.connect():
+            return EResult.Fail
+        result = self.backend.login(username, password, login_key, auth_code, two_factor_code)
+        if result != EResult.OK:
+            # После отказа во входе Steam закрывает соединение
+            self.disconnect()
+            return result
+        self.logged_on = True
+        self.login_key = self.backend.login_keys[username]
+        self.emit(self.EVENT_LOGGED_ON)
+        self.emit(self.EVENT_NEW_LOGIN_KEY)
+        lifetime = self.backend.session_lifetime()
+        if lifetime is not None:
+            self._drop = gevent.spawn_later(lifetime, self.disconnect)
+        return result
+
+    def disconnect(self, *args, **kwargs):
+        drop, self._drop = self._drop, None
+        if drop is not None and drop is not gevent.getcurrent():
+            drop.kill(block=False)
+        super().disconnect(*args, **kwargs)
+
+
+def install(settings=None):
+    """Подменить Steam в steam_manager поддельным (в текущем процессе)"""
+    from src.steam import steam_manager
+    FakeSteamClient.backend = FakeSteam(settings)
+    steam_manager.SteamClient = FakeSteamClient
+    steam_manager.cm_directory.merge(FakeSteamClient.backend.addresses())
+    # Журнал тысяч сессий (и подстроенных отказов) заглушил бы вывод бенчмарка
+    logging.disable(logging.ERROR)
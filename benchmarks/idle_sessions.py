@@ -0,0 +1,95 @@
+"""Сравнение памяти и CPU на 100 простаивающих Steam сессий:
+поток на аккаунт против пула сессий на gevent хабах.
+
+Запуск: python benchmarks/idle_sessions.py [--sessions 100] [--idle 10]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def idle_session(stop_event=None):
+    # Простаивающая сессия: клиент создан, гринлет ждет сигнала остановки
+    from steam.client import SteamClient
+    client = SteamClient()
+    if stop_event is None:
+        client.run_forever()
+    stop_event.wait()
+    return client
+
+
+def run_threads(sessions):
+    # Как в старой модели: у каждого потока свой хаб и run_forever()
+    for _ in range(sessions):
+        threading.Thread(target=idle_session, daemon=True).start()
+
+
+def run_pool(sessions, workers):
+    from gevent.event import Event
+    from src.steam.steam_manager import SessionPool
+
+    pool = SessionPool()
+    pool.start(workers)
+    for i in range(sessions):
+        worker = pool.worker_for(f"account{i}")
+        worker.submit(lambda: idle_session(Event()))
+
+
+def measure(mode, sessions, workers, idle):
+    import steam.client  # noqa: F401 - исключаем импорт из измерения
+    base_rss = rss_kb()
+    if mode == 'threads':
+        run_threads(sessions)
+    else:
+        run_pool(sessions, workers)
+    time.sleep(1)
+    cpu_start = cpu_seconds()
+    time.sleep(idle)
+    cpu_used = cpu_seconds() - cpu_start
+    rss = rss_kb() - base_rss
+    print(f"{mode:8} sessions={sessions} threads={threading.active_count()} "
+          f"rss_delta={rss / 1024:.1f}MiB cpu_idle={cpu_used * 1000:.1f}ms/{idle}s "
+          f"per_session={rss / sessions:.1f}KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--idle', type=float, default=10)
+    parser.add_argument('--mode', choices=['threads', 'pool'])
+    args = parser.parse_args()
+
+    if args.mode:
+        measure(args.mode, args.sessions, args.workers, args.idle)
+        return
+
+    # Каждый режим в отдельном процессе, чтобы RSS не смешивался
+    for mode in ('threads', 'pool'):
+        subprocess.run([sys.executable, __file__, '--mode', mode,
+                        '--sessions', str(args.sessions),
+                        '--workers', str(args.workers),
+                        '--idle', str(args.idle)], check=True)
+
+
+if __name__ == '__main__':
+    main()
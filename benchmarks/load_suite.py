@@ -0,0 +1,230 @@
+"""Нагрузочный прогон всего бота на поддельных Steam и Telegram.
+
+Сессии запускаются настоящим пулом (session_pool.login, с Guard кодом, если
+Steam его спросил), Steam заменен FakeSteamClient из fake_steam.py, Telegram -
+FakeTelegram из telegram_replay.py. Сеть не нужна, только Linux (/proc).
+
+Отчет:
+- вход: p50/p99 до ACTIVE (вместе с вводом кода), входов в секунду, исходы;
+- память на сессию: прирост RSS (с процессами шардов) между 10% и 100% сессий;
+- простой: CPU на сессию, обрывы и переподключения за --hold секунд;
+- сессий на хост: оценка по свободной памяти и ядрам при такой нагрузке;
+- кнопки: p50/p99 от выдачи нажатия до answerCallbackQuery при всех сессиях;
+- остановка: время stop_all_clients и исходы.
+
+Запуск: python benchmarks/load_suite.py [--accounts 1000] [--processes 0]
+(нужен config/config.ini, достаточно скопировать config.ini.example)
+"""
+import argparse
+import asyncio
+import functools
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_steam
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def process_usage(pid):
+    """RSS (КиБ) и процессорное время (секунды) процесса из /proc"""
+    with open(f'/proc/{pid}/status') as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+    with open(f'/proc/{pid}/stat') as f:
+        # Имя процесса в скобках может содержать пробелы
+        fields = f.read().rsplit(')', 1)[1].split()
+    return rss, (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def usage(pool):
+    """Суммарные RSS и CPU процесса бота и процессов шардов"""
+    pids = [os.getpid()]
+    if pool.shards:
+        pids += [shard.process.pid for shard in pool.shards.shards if shard.alive]
+    rss, cpu = 0, 0.0
+    for pid in pids:
+        process_rss, process_cpu = process_usage(pid)
+        rss += process_rss
+        cpu += process_cpu
+    return rss, cpu
+
+
+def mem_available_kb():
+    with open('/proc/meminfo') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('MemAvailable:'))
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Transitions:
+    """Счетчик обрывов и переподключений по переходам SessionStore"""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def __call__(self, account_name, old_state, new_state):
+        self.counts[(old_state.value, new_state.value)] += 1
+
+
+async def login_all(pool, registry, names, user_id, concurrency, results):
+    from src.steam.steam_manager import LOGIN_GUARD_MOBILE, LOGIN_GUARD_EMAIL
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login(name):
+        async with semaphore:
+            started = time.perf_counter()
+            result = await pool.login(name, registry[name], user_id)
+            status = result.status
+            if result.status == LOGIN_GUARD_MOBILE:
+                result = await pool.login(name, registry[name], user_id, two_factor_code=fake_steam.GUARD_CODE)
+            elif result.status == LOGIN_GUARD_EMAIL:
+                result = await pool.login(name, registry[name], user_id, auth_code=fake_steam.GUARD_CODE)
+            results.append((status, result.status, time.perf_counter() - started))
+
+    await asyncio.gather(*(login(name) for name in names))
+
+
+async def callback_latency(registry, user_id, count):
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiohttp import web
+    import HourBooster
+    from src.bot.access_middleware import Tenant
+    from src.bot.edit_queue import edit_queue
+    from telegram_replay import FakeTelegram, synthetic_updates, TOKEN, API_PORT
+
+    # Лимиты правок мешали бы измерять обработку нажатий
+    edit_queue.configure(0, 10 ** 6)
+    # Меню строится по аккаунтам бенчмарка, а не по config.ini
+    HourBooster.access.tenants[user_id] = Tenant(user_id, 'admin', registry)
+    fake = FakeTelegram(synthetic_updates(count, user_id))
+    runner = web.AppRunner(fake.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', API_PORT).start()
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f'http://127.0.0.1:{API_PORT}'))
+    bot = Bot(token=TOKEN, session=session)
+    fake.start_polling_feed()
+    task = asyncio.create_task(HourBooster.dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+    await fake.done.wait()
+    await HourBooster.dp.stop_polling()
+    await task
+    await session.close()
+    await runner.cleanup()
+    return [fake.answered[key] - fake.delivered[key] for key in fake.answered]
+
+
+async def run(args, settings):
+    from src.account_registry import AccountRegistry
+    from src.config_manager import ConfigManager
+    from src.steam.session_store import SessionState
+    from src.steam.steam_manager import session_pool, session_store, stop_all_clients, LOGIN_OK, STOP_OK
+
+    if args.processes:
+        initializer = functools.partial(fake_steam.install, settings)
+    else:
+        fake_steam.install(settings)
+        initializer = None
+    registry = AccountRegistry()
+    for index in range(args.accounts):
+        name = f'bench{index:06d}'
+        registry.add(name, name, 'password', '730, 570, 440')
+    names = list(registry.keys())
+    user_id = ConfigManager().get_allowed_user_id()
+    transitions = Transitions()
+    session_store.subscribe(transitions, asyncio.get_running_loop())
+
+    session_pool.start(args.workers, args.login_timeout, processes=args.processes, initializer=initializer)
+    mode = f"{args.processes} процессов по {args.workers} воркеров" if args.processes else f"{args.workers} воркеров"
+    print(f"Аккаунтов: {args.accounts}, {mode}, входов одновременно: {args.concurrency}\n")
+
+    # Первые 10% сессий отделяют постоянные расходы (импорты, воркеры, процессы шардов)
+    results = []
+    warmup = max(1, len(names) // 10)
+    started = time.perf_counter()
+    await login_all(session_pool, registry, names[:warmup], user_id, args.concurrency, results)
+    warm_active = session_store.counts().get(SessionState.ACTIVE, 0)
+    warm_rss, _ = usage(session_pool)
+    await login_all(session_pool, registry, names[warmup:], user_id, args.concurrency, results)
+    ramp = time.perf_counter() - started
+    active = session_store.counts().get(SessionState.ACTIVE, 0)
+    rss, _ = usage(session_pool)
+
+    durations = [elapsed for _, status, elapsed in results if status == LOGIN_OK]
+    guarded = sum(1 for first, status, _ in results if first != LOGIN_OK and status == LOGIN_OK)
+    outcomes = Counter(status for _, status, _ in results)
+    print(f"вход: p50 {statistics.median(durations) * 1000:.0f} мс, p99 {percentile(durations, 0.99) * 1000:.0f} мс, "
+          f"{len(results) / ramp:.0f} входов/с, из них с кодом {guarded}; исходы: {dict(outcomes)}")
+    per_session = (rss - warm_rss) / max(1, active - warm_active)
+    print(f"память: RSS {rss / 1024:.1f} МиБ, {per_session:.1f} КиБ на сессию ({active} активных)")
+
+    before = transitions.counts.copy()
+    _, cpu_start = usage(session_pool)
+    await asyncio.sleep(args.hold)
+    _, cpu_end = usage(session_pool)
+    changes = transitions.counts - before
+    cpu_per_session = (cpu_end - cpu_start) / args.hold / max(1, active)
+    print(f"простой {args.hold:g} с: CPU {(cpu_end - cpu_start) / args.hold * 100:.1f}% ядра, "
+          f"{cpu_per_session * 1e6:.1f} мкс/с на сессию, обрывов {changes[('active', 'backoff')]}, "
+          f"переподключений {changes[('backoff', 'active')]}")
+
+    by_memory = mem_available_kb() / per_session if per_session > 0 else float('inf')
+    by_cpu = (os.cpu_count() or 1) / cpu_per_session if cpu_per_session > 0 else float('inf')
+    print(f"сессий на хост: по памяти ~{by_memory:,.0f}, по CPU ~{by_cpu:,.0f} "
+          f"({os.cpu_count()} ядер, свободно {mem_available_kb() / 1024 ** 2:.1f} ГиБ)")
+
+    if args.updates:
+        latencies = await callback_latency(registry, user_id, args.updates)
+        print(f"кнопки ({args.updates} нажатий при {session_store.counts().get(SessionState.ACTIVE, 0)} сессиях): "
+              f"p50 {statistics.median(latencies) * 1000:.1f} мс, p99 {percentile(latencies, 0.99) * 1000:.1f} мс")
+
+    started = time.perf_counter()
+    report = await stop_all_clients(args.stop_timeout)
+    elapsed = time.perf_counter() - started
+    print(f"остановка: {elapsed * 1000:.0f} мс, остановлено {sum(1 for outcome in report.values() if outcome == STOP_OK)}"
+          f"/{len(report)}; исходы: {dict(Counter(report.values()))}")
+    session_store.unsubscribe(transitions)
+    session_pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--processes', type=int, default=0, help="процессы шардов (0 - потоки в одном процессе)")
+    parser.add_argument('--concurrency', type=int, default=200, help="входов одновременно")
+    parser.add_argument('--login-timeout', type=float, default=30)
+    parser.add_argument('--hold', type=float, default=10, help="сколько держать сессии до замера кнопок (секунды)")
+    parser.add_argument('--updates', type=int, default=300, help="нажатий кнопок (0 - без Telegram)")
+    parser.add_argument('--stop-timeout', type=float, default=30)
+    # Поведение поддельного Steam (см. fake_steam.DEFAULTS)
+    parser.add_argument('--login-latency', type=float, default=fake_steam.DEFAULTS['login_latency'])
+    parser.add_argument('--guard', type=float, default=fake_steam.DEFAULTS['guard'], help="доля аккаунтов со Steam Guard")
+    parser.add_argument('--failures', type=float, default=fake_steam.DEFAULTS['failures'], help="доля отклоненных входов")
+    parser.add_argument('--cm-failures', type=float, default=fake_steam.DEFAULTS['cm_failures'])
+    parser.add_argument('--disconnect-interval', type=float, default=600, help="среднее время жизни соединения (секунды)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    settings = {
+        'login_latency': args.login_latency,
+        'guard': args.guard,
+        'failures': args.failures,
+        'cm_failures': args.cm_failures,
+        'disconnect_interval': args.disconnect_interval,
+        'seed': args.seed,
+    }
+    asyncio.run(run(args, settings))
+
+
+if __name__ == '__main__':
+    main()
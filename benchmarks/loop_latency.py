@@ -0,0 +1,115 @@
+"""Задержка asyncio цикла бота в зависимости от числа сессий:
+все сессии в процессе бота против шардирования по процессам.
+
+Вместо Steam используется фейковый клиент, который раз в секунду выполняет
+работу, похожую на разбор протобафов и heartbeat (сериализация и сжатие).
+Пока сессии работают, в цикле бота крутится таймер на 5 мс и копится опоздание.
+
+Запуск: python benchmarks/loop_latency.py [--sessions 100 500 1000] [--processes 4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TICK = 0.005
+HEARTBEAT = 1.0
+PAYLOAD = {'games_played': list(range(32)), 'persona': 'x' * 512, 'stats': {str(i): i for i in range(64)}}
+
+
+class FakeClient:
+    logged_on = False
+    login_key = None
+    EVENT_DISCONNECTED = 'disconnected'
+    EVENT_NEW_LOGIN_KEY = 'new_login_key'
+
+    def __init__(self):
+        self._heartbeat = None
+
+    def on(self, event, callback):
+        pass
+
+    def login(self, username, password='', **kwargs):
+        import gevent
+        self.logged_on = True
+        self._heartbeat = gevent.spawn(self._beat)
+        return _ok()
+
+    def _beat(self):
+        import gevent
+        while self.logged_on:
+            gevent.sleep(HEARTBEAT)
+            zlib.decompress(zlib.compress(json.dumps(PAYLOAD).encode()))
+
+    def games_played(self, games):
+        pass
+
+    def logout(self):
+        self.logged_on = False
+
+    def disconnect(self):
+        self.logged_on = False
+
+
+def _ok():
+    from steam.enums import EResult
+    return EResult.OK
+
+
+def use_fake_client():
+    import src.steam.steam_manager as steam_manager
+    steam_manager.SteamClient = FakeClient
+
+
+async def measure(sessions, processes, workers, duration):
+    from src.steam.steam_manager import session_pool, stop_all_clients
+    use_fake_client()
+    session_pool.start(workers, 60, 60, processes, use_fake_client)
+    account_data = {'username': 'user', 'password': 'secret', 'games': [730]}
+    await asyncio.gather(*(session_pool.login(f"account{i}", account_data) for i in range(sessions)))
+
+    lags = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        await asyncio.sleep(TICK)
+        lags.append(time.monotonic() - started - TICK)
+    await stop_all_clients(30)
+    session_pool.close()
+
+    lags.sort()
+    p50 = statistics.median(lags) * 1000
+    p99 = lags[int(len(lags) * 0.99)] * 1000
+    mode = f"processes={processes}" if processes else "in-process"
+    print(f"{mode:<14} sessions={sessions:<6} lag p50={p50:.2f}ms p99={p99:.2f}ms max={lags[-1] * 1000:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--run', nargs=2, type=int, metavar=('SESSIONS', 'PROCESSES'))
+    args = parser.parse_args()
+
+    if args.run:
+        asyncio.run(measure(args.run[0], args.run[1], args.workers, args.duration))
+        return
+    # Каждое измерение в отдельном интерпретаторе, чтобы пулы не мешали друг другу
+    import subprocess
+    for sessions in args.sessions:
+        for processes in (0, args.processes):
+            subprocess.run([sys.executable, __file__, '--run', str(sessions), str(processes),
+                            '--workers', str(args.workers), '--duration', str(args.duration)],
+                           stderr=subprocess.DEVNULL)
+
+
+if __name__ == '__main__':
+    main()
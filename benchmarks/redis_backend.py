@@ -0,0 +1,208 @@
+"""Проверка и скорость RedisBackend на локальном сервере с протоколом RESP2.
+
+Без --url поднимается встроенный заменитель Redis (только команды, которые
+использует бэкенд: AUTH, SELECT, HGET, HSET, HDEL, HGETALL). Проверяется:
+- те же ответы, что у MemoryBackend (пустые и отсутствующие ключи, юникод,
+  переводы строк и пробелы в значениях);
+- пароль и номер базы из url;
+- одна повторная попытка после обрыва соединения сервером;
+- скорость: последовательные и одновременные HSET/HGET (операций в секунду).
+С --url те же проверки идут против настоящего сервера (кроме обрыва
+соединения); ключи пишутся под отдельным префиксом и удаляются.
+
+Запуск: python benchmarks/redis_backend.py [--ops 5000] [--url redis://127.0.0.1:6379/0]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.storage import MemoryBackend, RedisBackend
+
+PASSWORD = 'bench-password'
+PREFIX = 'hourbooster-bench:'
+VALUES = ['', 'plain', 'юникод ✓', 'with\r\nnewline', ' spaces ', '{"user_id": 42}', '$5\r\n*1']
+
+
+class RespServer:
+    """Заменитель Redis: хэши в памяти, по словарю на номер базы"""
+
+    def __init__(self, password=None):
+        self.password = password
+        self.databases = {}
+        self._server = None
+        self._writers = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._client, '127.0.0.1', 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.drop()
+        # Обработчики соединений должны завершиться до остановки цикла
+        while self._writers:
+            await asyncio.sleep(0.01)
+        self._server.close()
+        await self._server.wait_closed()
+
+    def drop(self):
+        """Разорвать все соединения клиентов"""
+        for writer in list(self._writers):
+            writer.close()
+
+    async def _read_command(self, reader):
+        line = await reader.readuntil(b'\r\n')
+        if line[:1] != b'*':
+            raise ValueError(f"ожидался массив, получено {line!r}")
+        args = []
+        for _ in range(int(line[1:-2])):
+            header = await reader.readuntil(b'\r\n')
+            if header[:1] != b'$':
+                raise ValueError(f"ожидалась строка, получено {header!r}")
+            data = await reader.readexactly(int(header[1:-2]) + 2)
+            args.append(data[:-2].decode())
+        return args
+
+    async def _client(self, reader, writer):
+        self._writers.add(writer)
+        session = {'authed': self.password is None, 'db': 0}
+        try:
+            while True:
+                try:
+                    args = await self._read_command(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                writer.write(self._execute(session, args[0].upper(), args[1:]))
+                await writer.drain()
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _execute(self, session, name, args):
+        if name == 'AUTH':
+            if args[0] != self.password:
+                return b'-WRONGPASS invalid password\r\n'
+            session['authed'] = True
+            return b'+OK\r\n'
+        if not session['authed']:
+            return b'-NOAUTH Authentication required.\r\n'
+        if name == 'SELECT':
+            session['db'] = int(args[0])
+            return b'+OK\r\n'
+        hashes = self.databases.setdefault(session['db'], {})
+        if name == 'HSET':
+            fields = hashes.setdefault(args[0], {})
+            added = args[1] not in fields
+            fields[args[1]] = args[2]
+            return b':%d\r\n' % added
+        if name == 'HGET':
+            value = hashes.get(args[0], {}).get(args[1])
+            return b'$-1\r\n' if value is None else _bulk(value)
+        if name == 'HDEL':
+            return b':%d\r\n' % (hashes.get(args[0], {}).pop(args[1], None) is not None)
+        if name == 'HGETALL':
+            fields = hashes.get(args[0], {})
+            return b'*%d\r\n' % (len(fields) * 2) + b''.join(_bulk(item) for pair in fields.items() for item in pair)
+        return b'-ERR unknown command\r\n'
+
+
+def _bulk(value):
+    data = value.encode()
+    return b'$%d\r\n%s\r\n' % (len(data), data)
+
+
+async def exercise(backend):
+    """Одинаковый сценарий для проверяемого бэкенда и MemoryBackend"""
+    results = [await backend.items('empty'), await backend.get('empty', 'missing')]
+    for index, value in enumerate(VALUES):
+        await backend.set('checks', f'ключ {index}', value)
+    await backend.set('checks', 'ключ 0', 'overwritten')
+    await backend.delete('checks', 'ключ 1')
+    await backend.delete('checks', 'missing')
+    results.append(await backend.items('checks'))
+    results.extend([await backend.get('checks', f'ключ {index}') for index in range(len(VALUES))])
+    for index in range(len(VALUES)):
+        await backend.delete('checks', f'ключ {index}')
+    results.append(await backend.items('checks'))
+    return results
+
+
+async def measure(backend, ops):
+    started = time.perf_counter()
+    for index in range(ops):
+        await backend.set('speed', str(index), 'x' * 32)
+        await backend.get('speed', str(index))
+    sequential = 2 * ops / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(backend.set('speed', str(index), 'y' * 32) for index in range(ops)))
+    concurrent = ops / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    items = await backend.items('speed')
+    items_elapsed = time.perf_counter() - started
+    for index in range(ops):
+        await backend.delete('speed', str(index))
+    return sequential, concurrent, len(items), items_elapsed
+
+
+async def run(args):
+    server = None
+    url = args.url
+    if url is None:
+        server = RespServer(PASSWORD)
+        port = await server.start()
+        url = f'redis://:{PASSWORD}@127.0.0.1:{port}/3'
+        print(f"Заменитель Redis на порту {port}")
+
+    backend = RedisBackend(url, PREFIX)
+    expected = await exercise(MemoryBackend())
+    actual = await exercise(backend)
+    print(f"ответы как у MemoryBackend: {'да' if actual == expected else 'НЕТ'}")
+    if actual != expected:
+        for want, got in zip(expected, actual):
+            if want != got:
+                print(f"  ожидалось {want!r}, получено {got!r}")
+
+    if server is not None:
+        print(f"база из url: {'да' if set(server.databases) == {3} else 'НЕТ'} ({sorted(server.databases)})")
+        await backend.set('reconnect', 'key', 'before')
+        server.drop()
+        await asyncio.sleep(0.05)
+        try:
+            reconnected = await backend.get('reconnect', 'key') == 'before'
+        except Exception as e:
+            reconnected = False
+            print(f"  ошибка после обрыва: {e!r}")
+        await backend.delete('reconnect', 'key')
+        print(f"повтор после обрыва соединения: {'да' if reconnected else 'НЕТ'}")
+
+        wrong = RedisBackend(url.replace(PASSWORD, 'wrong'), PREFIX)
+        try:
+            await wrong.get('checks', 'key')
+            print("неверный пароль: ошибки НЕТ")
+        except RuntimeError as e:
+            print(f"неверный пароль: {e}")
+        await wrong.close()
+
+    sequential, concurrent, count, items_elapsed = await measure(backend, args.ops)
+    print(f"скорость ({args.ops} ключей): последовательно {sequential:,.0f} оп/с, одновременно HSET {concurrent:,.0f} оп/с, "
+          f"HGETALL {count} ключей за {items_elapsed * 1000:.1f} мс")
+    await backend.close()
+    if server is not None:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=5000)
+    parser.add_argument('--url', help="настоящий сервер вместо встроенного заменителя")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Нагрузочная проверка SessionStore: потоки воркеров выполняют тысячи
+переходов, а asyncio цикл параллельно читает снимки и получает уведомления.
+
+Запуск: python benchmarks/session_store_stress.py [--threads 8] [--transitions 20000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.steam.session_store import SessionStore, SessionState
+
+STATES = list(SessionState)
+
+
+def writer(store, accounts, transitions, seed, changed):
+    rng = random.Random(seed)
+    count = 0
+    for _ in range(transitions):
+        # Как в пуле: у каждого потока свой набор аккаунтов
+        account_name = rng.choice(accounts)
+        old_state = store.state(account_name)
+        new_state = rng.choice(STATES)
+        store.transition(account_name, new_state, user_id=rng.randint(1, 5))
+        if new_state is not old_state:
+            count += 1
+    changed.append(count)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--transitions', type=int, default=20000)
+    args = parser.parse_args()
+
+    store = SessionStore()
+    delivered = 0
+
+    def on_change(account_name, old_state, new_state):
+        nonlocal delivered
+        delivered += 1
+
+    store.subscribe(on_change, asyncio.get_running_loop())
+
+    shards = [[f"account{i}" for i in range(t, args.accounts, args.threads)] for t in range(args.threads)]
+    changed = []
+    threads = [threading.Thread(target=writer, args=(store, shards[t], args.transitions, t, changed))
+               for t in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    # Читатель: снимки и счетчики без блокировок, пока идут записи
+    reads = 0
+    while any(thread.is_alive() for thread in threads):
+        snapshot = store.snapshot()
+        for record in snapshot.values():
+            assert record.state is not SessionState.IDLE
+        store.counts()
+        reads += 1
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.1)
+
+    counts = store.counts()
+    active_total = sum(count for state, count in counts.items() if state is not SessionState.IDLE)
+    total_transitions = args.threads * args.transitions
+    assert active_total == len(store.snapshot()), (active_total, len(store.snapshot()))
+    assert delivered == sum(changed), (delivered, sum(changed))
+    print(f"transitions={total_transitions} in {elapsed:.2f}s "
+          f"({total_transitions / elapsed:.0f}/s), snapshot reads={reads}, notifications={delivered} - OK")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""Время запуска и память: Telegram бот против фонового режима без Telegram.
+
+Для каждого варианта несколько раз запускается отдельный интерпретатор, который
+импортирует точку входа и создает пул сессий; измеряется время до готовности
+и пиковый RSS процесса.
+
+Запуск: python benchmarks/startup.py [--runs 5]
+(нужен config/config.ini, достаточно скопировать config.ini.example)
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VARIANTS = {
+    'bot': "import HourBooster; from src.steam.steam_manager import session_pool; session_pool.start(4)",
+    'daemon': "import src.daemon; from src.steam.steam_manager import session_pool; session_pool.start(4)",
+}
+
+
+def measure(code):
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - started
+    if status != 0:
+        raise RuntimeError(process.stderr.read().decode())
+    # ru_maxrss в Linux измеряется в килобайтах
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'режим':<8} {'запуск, мс':>12} {'RSS, МБ':>10}")
+    for name, code in VARIANTS.items():
+        results = [measure(code) for _ in range(args.runs)]
+        elapsed = statistics.median(r[0] for r in results) * 1000
+        rss = statistics.median(r[1] for r in results)
+        print(f"{name:<8} {elapsed:>12.0f} {rss:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
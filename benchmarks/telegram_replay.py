@@ -0,0 +1,192 @@
+"""Пропускная способность и задержка обработки обновлений: long polling против webhook.
+
+Локальный фейковый Telegram (aiohttp) отдает записанные обновления боту из
+HourBooster.py - через getUpdates или POST на webhook - и отмечает, когда бот
+ответил на каждое нажатие (answerCallbackQuery). Сеть и Steam не используются.
+
+Запуск: python benchmarks/telegram_replay.py [--updates 2000] [--replay updates.jsonl]
+(нужен config/config.ini, достаточно скопировать config.ini.example;
+в --replay - по одному JSON объекту Update в строке)
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import ClientSession, web
+
+TOKEN = '123456:BENCHMARK'
+SECRET = 'benchmark-secret'
+API_PORT = 18081
+WEBHOOK_PORT = 18082
+WEBHOOK_CONNECTIONS = 40  # как max_connections по умолчанию у Telegram
+
+
+def synthetic_updates(count, user_id):
+    # Нажатия "Обновить" в главном меню в разных чатах
+    updates = []
+    for i in range(count):
+        chat = {'id': 1000 + i, 'type': 'private'}
+        user = {'id': user_id, 'is_bot': False, 'first_name': 'Bench'}
+        updates.append({
+            'update_id': i + 1,
+            'callback_query': {
+                'id': str(i + 1),
+                'from': user,
+                'chat_instance': str(i),
+                'data': 'm:0:all',
+                'message': {'message_id': i + 1, 'date': 1700000000, 'chat': chat, 'text': 'menu'},
+            },
+        })
+    return updates
+
+
+class FakeTelegram:
+    def __init__(self, updates):
+        self.updates = updates
+        self.delivered = {}  # id нажатия -> время выдачи боту
+        self.answered = {}  # id нажатия -> время ответа бота
+        self.edits = 0
+        self.done = asyncio.Event()
+        self._pending = list(updates)
+        self._available = asyncio.Event()
+        self._message_ids = itertools.count(10 ** 6)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        return app
+
+    def _mark_delivered(self, updates):
+        now = time.perf_counter()
+        for update in updates:
+            if 'callback_query' in update:
+                self.delivered[update['callback_query']['id']] = now
+
+    async def handle(self, request):
+        method = request.match_info['method'].lower()
+        params = await request.post()
+        result = True
+        if method == 'getme':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+        elif method == 'getupdates':
+            result = await self.get_updates(int(params.get('offset', 0)), float(params.get('timeout', 0)))
+        elif method == 'answercallbackquery':
+            self.answered[params['callback_query_id']] = time.perf_counter()
+        elif method in ('editmessagetext', 'sendmessage'):
+            # Заканчиваем, когда бот и ответил на все нажатия, и обновил все меню
+            self.edits += 1
+            if self.edits >= len(self.updates) and len(self.answered) == len(self.updates):
+                self.done.set()
+            chat_id = int(params.get('chat_id', 0))
+            result = {
+                'message_id': int(params.get('message_id', 0)) or next(self._message_ids),
+                'date': 1700000000,
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        return web.json_response({'ok': True, 'result': result})
+
+    async def get_updates(self, offset, timeout):
+        self._pending = [update for update in self._pending if update['update_id'] >= offset]
+        if not self._pending:
+            try:
+                await asyncio.wait_for(self._available.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        batch = self._pending[:100]
+        self._mark_delivered(batch)
+        return batch
+
+    def start_polling_feed(self):
+        self._available.set()
+
+    async def push_webhook(self, url):
+        semaphore = asyncio.Semaphore(WEBHOOK_CONNECTIONS)
+        headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+        async with ClientSession() as session:
+            async def push(update):
+                async with semaphore:
+                    self._mark_delivered([update])
+                    async with session.post(url, json=update, headers=headers) as response:
+                        await response.read()
+            await asyncio.gather(*(push(update) for update in self.updates))
+
+
+async def run(mode, updates):
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    import HourBooster
+    from src.bot.edit_queue import edit_queue
+    from src.bot.webhook import run_webhook
+
+    # Лимиты правок мешали бы измерять сам прием обновлений
+    edit_queue.configure(0, 10 ** 6)
+    fake = FakeTelegram(updates)
+    runner = web.AppRunner(fake.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', API_PORT).start()
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f'http://127.0.0.1:{API_PORT}'))
+    bot = Bot(token=TOKEN, session=session)
+    started = time.perf_counter()
+    if mode == 'polling':
+        fake.start_polling_feed()
+        task = asyncio.create_task(HourBooster.dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+        await fake.done.wait()
+        await HourBooster.dp.stop_polling()
+    else:
+        stop = asyncio.Event()
+        settings = {'url': '', 'host': '127.0.0.1', 'port': WEBHOOK_PORT, 'path': '/webhook', 'secret_token': SECRET}
+        task = asyncio.create_task(run_webhook(HourBooster.dp, bot, settings, stop))
+        await asyncio.sleep(0.2)
+        await fake.push_webhook(f'http://127.0.0.1:{WEBHOOK_PORT}/webhook')
+        await fake.done.wait()
+        stop.set()
+    elapsed = time.perf_counter() - started
+    await task
+    await session.close()
+    await runner.cleanup()
+
+    latencies = sorted(fake.answered[key] - fake.delivered[key] for key in fake.answered)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{mode:<8} updates={len(updates)} throughput={len(updates) / elapsed:.0f}/s "
+          f"p50={p50:.1f}ms p99={p99:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--replay', help="файл с записанными обновлениями (JSON Lines)")
+    parser.add_argument('--mode', choices=['polling', 'webhook'])
+    args = parser.parse_args()
+
+    if args.mode is None:
+        # Каждый режим в отдельном интерпретаторе: диспетчер нельзя запустить дважды подряд без следов
+        import subprocess
+        for mode in ('polling', 'webhook'):
+            command = [sys.executable, __file__, '--mode', mode, '--updates', str(args.updates)]
+            if args.replay:
+                command += ['--replay', args.replay]
+            subprocess.run(command)
+        return
+
+    from src.config_manager import ConfigManager
+    if args.replay:
+        with open(args.replay, encoding='utf-8') as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        updates = synthetic_updates(args.updates, ConfigManager().get_allowed_user_id())
+    asyncio.run(run(args.mode, updates))
+
+
+if __name__ == '__main__':
+    main()
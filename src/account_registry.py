@@ -0,0 +1,341 @@
+import csv
+import hashlib
+import json
+import logging
+import re
+from array import array
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Компактная запись аккаунта
+# Поддерживает доступ как к словарю (account['username']) для совместимости с обработчиками
+class Account:
+    __slots__ = ('name', 'username', 'password', 'games')
+
+    def __init__(self, name, username, password, games):
+        self.name = name
+        self.username = username
+        self.password = password
+        self.games = array('I', games)
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"Account({self.name!r}, {self.username!r}, games={len(self.games)})"
+
+# Разобрать строку с ID игр через запятую
+def parse_games(games):
+    """Преобразовать '570,730' или список в список ID игр"""
+    if isinstance(games, str):
+        return [int(game.strip()) for game in games.split(',') if game.strip()]
+    return [int(game) for game in games]
+
+# Короткий устойчивый ключ аккаунта для данных кнопок
+# Имя может быть длинным или содержать ':', а данные кнопки ограничены 64 байтами
+def account_key(account_name):
+    """16 hex символов от имени: одинаковый после перезапуска и перезагрузки"""
+    return hashlib.blake2b(account_name.encode('utf-8'), digest_size=8).hexdigest()
+
+# Разница между двумя версиями реестра
+AccountDiff = namedtuple('AccountDiff', ['added', 'removed', 'changed'])
+# Изменения записей одного источника: новые отпечатки {отпечаток: имя}, пропавшие отпечатки
+# и имена, у которых не осталось записей
+OriginUpdate = namedtuple('OriginUpdate', ['stamp', 'index', 'gone', 'lost'])
+
+# Реестр аккаунтов: загружается один раз и индексируется по имени и логину
+# Ведет себя как словарь {имя_аккаунта: Account}
+class AccountRegistry:
+    def __init__(self):
+        self._by_name = {}
+        self._by_username = {}
+        self._by_key = {}  # account_key(имя) -> имя
+        self._origins = {}  # источник -> (метка, {отпечаток записи: имя аккаунта})
+        self._origin_updates = ({}, [])  # изменения источников, которые переносит apply()
+        self._names = None
+        self.version = 0  # Увеличивается при любом изменении состава или данных
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def __iter__(self):
+        return iter(self._by_name)
+
+    def __contains__(self, account_name):
+        return account_name in self._by_name
+
+    def __getitem__(self, account_name):
+        return self._by_name[account_name]
+
+    def get(self, account_name, default=None):
+        return self._by_name.get(account_name, default)
+
+    def keys(self):
+        return self._by_name.keys()
+
+    def values(self):
+        return self._by_name.values()
+
+    def items(self):
+        return self._by_name.items()
+
+    def names(self):
+        """Имена аккаунтов в порядке загрузки (список кэшируется до изменения реестра)"""
+        if self._names is None:
+            self._names = list(self._by_name)
+        return self._names
+
+    def by_username(self, username):
+        """Найти аккаунт по логину Steam"""
+        return self._by_username.get(username)
+
+    def name_for_key(self, key):
+        """Имя аккаунта по ключу из данных кнопки (None, если аккаунта больше нет)"""
+        return self._by_key.get(key)
+
+    def _index_key(self, name):
+        key = account_key(name)
+        other = self._by_key.setdefault(key, name)
+        if other != name:
+            logger.error(f"Аккаунты {other} и {name} получили одинаковый ключ кнопок, кнопки {name} не работают")
+
+    def add(self, name, username, password, games):
+        """Добавить или заменить аккаунт"""
+        previous = self._by_name.get(name)
+        if previous is not None:
+            self._by_username.pop(previous.username, None)
+        account = Account(name, username, password, parse_games(games))
+        self._by_name[name] = account
+        self._by_username[username] = account
+        if previous is None:
+            self._index_key(name)
+        self._names = None
+        self.version += 1
+        return account
+
+    # Загрузка и перечитывание источников
+    # Источник - config.ini ('ini') или файл аккаунтов. Записи читаются потоком, отпечаток
+    # (хэш сырой записи) считается при чтении; разбирается запись, только если ее отпечатка
+    # не было при прошлом чтении. Кроме объектов Account реестр хранит лишь индекс отпечатков
+    def read_changes(self, sources):
+        """Сравнить источники с реестром: (реестр с новыми и измененными аккаунтами, AccountDiff)
+
+        sources - {источник: (метка, загрузка)}, загрузка() -> (итератор сырых записей, разбор).
+        Источник с прежней меткой (или без загрузки) не читается; источники не из sources считаются удаленными.
+        Можно вызывать из потока: сам реестр не меняется до apply()
+        """
+        fresh = AccountRegistry()
+        added, changed = [], {}
+        updates = {}  # источник -> OriginUpdate
+        for origin, (stamp, load) in sources.items():
+            previous = self._origins.get(origin)
+            if previous is not None and (load is None or stamp is not None and previous[0] == stamp):
+                continue
+            records, parse = load()
+            old_index = previous[1] if previous is not None else {}
+            updates[origin] = self._read_origin(stamp, records, parse, old_index, fresh, added, changed)
+        dropped = [origin for origin in self._origins if origin not in sources]
+        lost = {name for update in updates.values() for name in update.lost}
+        lost.update(name for origin in dropped for name in self._origins[origin][1].values())
+        lost.difference_update(fresh)
+        if lost:
+            # Аккаунт мог остаться в другом источнике: имена собираются, только когда что-то пропало
+            remaining = set()
+            for origin, (_, index) in self._origins.items():
+                if origin in dropped:
+                    continue
+                update = updates.get(origin)
+                gone = update.gone if update is not None else ()
+                remaining.update(name for fingerprint, name in index.items() if fingerprint not in gone)
+            lost -= remaining
+        fresh._origin_updates = (updates, dropped)
+        return fresh, AccountDiff(added, list(lost), changed)
+
+    def _read_origin(self, stamp, records, parse, old_index, fresh, added, changed):
+        """Разобрать новые записи источника; индекс самого реестра меняет только apply()"""
+        index, kept = {}, set()
+        for record in records:
+            fingerprint = hash(record)
+            if fingerprint in old_index:
+                kept.add(fingerprint)
+                continue
+            if fingerprint in index:
+                continue
+            try:
+                name, username, password, games = parse(record)
+                seen = name in fresh
+                account = fresh.add(name, username, password, games)
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                logger.error(f"Пропущена запись аккаунта: {e}")
+                continue
+            index[fingerprint] = name
+            current = self._by_name.get(name)
+            if current is None:
+                if not seen:
+                    added.append(name)
+                continue
+            fields = [field for field in ('username', 'password', 'games')
+                      if getattr(current, field) != getattr(account, field)]
+            if fields:
+                changed[name] = fields
+            else:
+                changed.pop(name, None)
+        gone = old_index.keys() - kept
+        lost = {old_index[fingerprint] for fingerprint in gone}
+        lost.difference_update(index.values())
+        return OriginUpdate(stamp, index, gone, lost)
+
+    def load(self, origin, load):
+        """Загрузить источник целиком, не трогая остальные"""
+        sources = {name: (stamp, None) for name, (stamp, _) in self._origins.items()}
+        sources[origin] = (None, load)
+        self.apply(*self.read_changes(sources))
+
+    def load_ini(self, config):
+        """Загрузить все секции accountN из configparser"""
+        self.load('ini', lambda: ini_records(config))
+
+    def load_file(self, path):
+        """Загрузить аккаунты из CSV или JSONL, формат определяется по расширению"""
+        self.load(path, lambda: file_records(path))
+
+    def apply(self, other, diff):
+        """Применить изменения на месте: живые сессии продолжают видеть те же объекты Account"""
+        for name in diff.removed:
+            account = self._by_name.pop(name)
+            self._by_username.pop(account.username, None)
+            if self._by_key.get(account_key(name)) == name:
+                del self._by_key[account_key(name)]
+        for name in diff.changed:
+            account, new_account = self._by_name[name], other._by_name[name]
+            self._by_username.pop(account.username, None)
+            account.username = new_account.username
+            account.password = new_account.password
+            account.games = new_account.games
+            self._by_username[account.username] = account
+        for name in diff.added:
+            account = other._by_name[name]
+            self._by_name[name] = account
+            self._by_username[account.username] = account
+            self._index_key(name)
+        updates, dropped = other._origin_updates
+        for origin in dropped:
+            del self._origins[origin]
+        for origin, update in updates.items():
+            if origin not in self._origins:
+                self._origins[origin] = (update.stamp, update.index)
+                continue
+            _, index = self._origins[origin]
+            for fingerprint in update.gone:
+                del index[fingerprint]
+            index.update(update.index)
+            self._origins[origin] = (update.stamp, index)
+        if diff.added or diff.removed or diff.changed:
+            self._names = None
+            self.version += 1
+
+# Записи источников для AccountRegistry.read_changes: (итератор сырых записей, разбор)
+# Файлы читаются потоком, пустые строки отбрасываются без цикла на Python
+def _parse_ini(record):
+    return record
+
+def ini_records(config):
+    """Секции accountN из configparser"""
+    records = [(section, config[section]['username'], config[section]['password'], config[section].get('games', ''))
+               for section in config.sections() if re.fullmatch(r'account\d+', section)]
+    return records, _parse_ini
+
+def _csv_rows(f, reader):
+    with f:
+        yield from filter(None, map(tuple, reader))
+
+def _csv_records(path):
+    f = open(path, newline='', encoding='utf-8')
+    reader = csv.reader(f)
+    header = next(reader, [])
+    missing = [column for column in ('name', 'username', 'password') if column not in header]
+    if missing:
+        f.close()
+        raise ValueError(f"В {path} нет колонок: {', '.join(missing)}")
+    columns = [header.index(column) for column in ('name', 'username', 'password')]
+    games = header.index('games') if 'games' in header else None
+
+    def parse(row):
+        name, username, password = (row[column] for column in columns)
+        return name, username, password, row[games] if games is not None and games < len(row) else ''
+    return _csv_rows(f, reader), parse
+
+def _parse_jsonl(line):
+    try:
+        record = json.loads(line)
+        return record['name'], record['username'], record['password'], record.get('games', [])
+    except (ValueError, KeyError) as e:
+        raise ValueError(f"{line[:80]}: {e}")
+
+def _jsonl_lines(path):
+    with open(path, encoding='utf-8') as f:
+        yield from filter(None, map(str.strip, f))
+
+def _jsonl_records(path):
+    return _jsonl_lines(path), _parse_jsonl
+
+def file_records(path):
+    """Записи файла аккаунтов (CSV или JSONL)"""
+    if path.endswith('.csv'):
+        return _csv_records(path)
+    if path.endswith('.jsonl'):
+        return _jsonl_records(path)
+    raise ValueError(f"Неизвестный формат файла аккаунтов: {path}")
+
+# Подмножество реестра (например, аккаунты одного пользователя бота)
+# Читается как сам реестр; список имен пересобирается только при смене версии реестра
+class RegistryView:
+    def __init__(self, registry, names):
+        self.registry = registry
+        self.scope = frozenset(names)
+        self._names = None
+        self._names_version = None
+
+    @property
+    def version(self):
+        return self.registry.version
+
+    def __len__(self):
+        return len(self.names())
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __contains__(self, account_name):
+        return account_name in self.scope and account_name in self.registry
+
+    def __getitem__(self, account_name):
+        if account_name not in self.scope:
+            raise KeyError(account_name)
+        return self.registry[account_name]
+
+    def get(self, account_name, default=None):
+        return self.registry.get(account_name, default) if account_name in self.scope else default
+
+    def name_for_key(self, key):
+        name = self.registry.name_for_key(key)
+        return name if name in self.scope else None
+
+    def keys(self):
+        return self.names()
+
+    def values(self):
+        return [self.registry[name] for name in self.names()]
+
+    def items(self):
+        return [(name, self.registry[name]) for name in self.names()]
+
+    def names(self):
+        """Имена аккаунтов подмножества в порядке реестра"""
+        if self._names_version != self.registry.version:
+            self._names = [name for name in self.registry.names() if name in self.scope]
+            self._names_version = self.registry.version
+        return self._names
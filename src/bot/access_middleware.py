@@ -1,13 +1,67 @@
+import logging
+import time
+from collections import OrderedDict
 from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
+from ..account_registry import RegistryView
 from ..config_manager import ConfigManager
 
-class AccessMiddleware(BaseMiddleware):    
+logger = logging.getLogger(__name__)
+
+# Роли по возрастанию прав
+ROLE_LEVELS = {'viewer': 0, 'operator': 1, 'admin': 2}
+
+# Чужому пользователю отвечаем не чаще раза в интервал (секунды), остальное молча отбрасываем
+UNAUTHORIZED_REPLY_INTERVAL = 60
+# Сколько чужих пользователей помним для ограничения ответов
+UNAUTHORIZED_CACHE_SIZE = 10000
+
+# Пользователь бота: роль и видимые ему аккаунты
+class Tenant:
+    __slots__ = ('user_id', 'role', 'accounts')
+
+    def __init__(self, user_id, role, accounts):
+        self.user_id = user_id
+        self.role = role
+        self.accounts = accounts  # реестр целиком или RegistryView
+
+    def can(self, role):
+        """Роль пользователя не ниже указанной"""
+        return ROLE_LEVELS[self.role] >= ROLE_LEVELS[role]
+
+    def __repr__(self):
+        return f"Tenant({self.user_id}, {self.role!r}, accounts={len(self.accounts)})"
+
+class AccessMiddleware(BaseMiddleware):
     def __init__(self, config_manager: ConfigManager):
         self.config_manager = config_manager
-        self.allowed_user_id = config_manager.get_allowed_user_id()
-    
+        self.stats = {'denied': 0, 'replied': 0}
+        self._replied = OrderedDict()  # user_id -> время последнего ответа об отказе
+        self.reload()
+
+    def reload(self):
+        """Перестроить таблицу пользователей (при запуске и после изменения config.ini)"""
+        registry = self.config_manager.get_accounts_from_config()
+        tenants = {}
+        for user_id, (role, names) in self.config_manager.get_users().items():
+            if role not in ROLE_LEVELS:
+                logger.error(f"Неизвестная роль {role!r} у пользователя {user_id}, доступ закрыт")
+                continue
+            tenants[user_id] = Tenant(user_id, role, registry if names is None else RegistryView(registry, names))
+        self.tenants = tenants
+
+    def _should_reply(self, user_id):
+        now = time.monotonic()
+        last = self._replied.get(user_id)
+        if last is not None and now - last < UNAUTHORIZED_REPLY_INTERVAL:
+            return False
+        self._replied[user_id] = now
+        self._replied.move_to_end(user_id)
+        if len(self._replied) > UNAUTHORIZED_CACHE_SIZE:
+            self._replied.popitem(last=False)
+        return True
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
@@ -20,13 +74,18 @@ class AccessMiddleware(BaseMiddleware):
             user_id = event.from_user.id
         elif isinstance(event, CallbackQuery):
             user_id = event.from_user.id
-        
+
         # Если user_id не определен, пропускаем
         if user_id is None:
             return await handler(event, data)
-        
+
         # Проверяем доступ
-        if user_id != self.allowed_user_id:
+        tenant = self.tenants.get(user_id)
+        if tenant is None:
+            self.stats['denied'] += 1
+            if not self._should_reply(user_id):
+                return
+            self.stats['replied'] += 1
             # Отправляем сообщение о том, что бот доступен на GitHub
             if isinstance(event, Message):
                 await event.answer(
@@ -44,6 +103,7 @@ class AccessMiddleware(BaseMiddleware):
                     show_alert=True
                 )
             return
-        
-        # Если пользователь авторизован, продолжаем обработку
+
+        # Если пользователь авторизован, продолжаем обработку; хэндлеры получают tenant
+        data['tenant'] = tenant
         return await handler(event, data)
@@ -0,0 +1,83 @@
+from functools import lru_cache
+from aiogram.filters.callback_data import CallbackData
+
+# Типизированные данные кнопок (упаковываются в строку до 64 байт)
+
+# Страница главного меню с фильтром по статусу
+class MenuCallback(CallbackData, prefix='m'):
+    page: int = 0
+    status: str = 'all'
+
+# Действие с аккаунтом: одно из ACCOUNT_ACTIONS
+# Вместо имени передается account_key(имя): имя ищется в реестре при нажатии
+class AccountCallback(CallbackData, prefix='a'):
+    action: str
+    key: str
+
+ACCOUNT_ACTIONS = ('open', 'start', 'stop', 'stats')
+
+# Кнопки без параметров
+HELP = 'help'
+BACK = 'back'
+CANCEL_CODE = 'cancel_code'
+
+KNOWN_ROUTES = {HELP, BACK, CANCEL_CODE, MenuCallback.__prefix__}
+
+# Разобранные данные кнопок: одни и те же кнопки нажимают снова и снова,
+# а валидация pydantic на порядок дороже поиска в словаре
+UNPACK_CACHE_SIZE = 4096
+
+# Маршрутизатор нажатий: обработчик находится одним поиском в словаре
+# Кнопки без параметров ищутся по строке целиком, типизированные - по префиксу
+# (и по полю action, если оно есть), данные распаковываются один раз
+class CallbackRouter:
+    def __init__(self):
+        self._exact = {}  # данные кнопки -> обработчик
+        self._factories = {}  # префикс -> класс CallbackData
+        self._typed = {}  # (префикс, action или None) -> обработчик
+        self._unpack = lru_cache(maxsize=UNPACK_CACHE_SIZE)(self._unpack_uncached)
+
+    def exact(self, data):
+        """Зарегистрировать обработчик кнопки без параметров: handler(callback_query, state, accounts, tenant)"""
+        def register(handler):
+            self._exact[data] = handler
+            return handler
+        return register
+
+    def typed(self, factory, action=None):
+        """Зарегистрировать обработчик типизированной кнопки: handler(callback_query, state, accounts, tenant, payload)"""
+        prefix = factory.__prefix__
+        self._factories[prefix] = factory
+
+        def register(handler):
+            self._typed[(prefix, action)] = handler
+            self._unpack.cache_clear()
+            return handler
+        return register
+
+    def resolve(self, data):
+        """Найти обработчик и распакованные данные; (None, None), если кнопка неизвестна"""
+        handler = self._exact.get(data)
+        if handler is not None:
+            return handler, None
+        return self._unpack(data)
+
+    def _unpack_uncached(self, data):
+        prefix = data.split(':', 1)[0]
+        factory = self._factories.get(prefix)
+        if factory is None:
+            return None, None
+        try:
+            payload = factory.unpack(data)
+        except (TypeError, ValueError):
+            return None, None
+        return self._typed.get((prefix, getattr(payload, 'action', None))), payload
+
+    @staticmethod
+    def route_name(data):
+        """Короткое имя маршрута для метрик: help, m, a:start ..."""
+        parts = data.split(':', 2)
+        if parts[0] == AccountCallback.__prefix__ and len(parts) > 1 and parts[1] in ACCOUNT_ACTIONS:
+            return f"{parts[0]}:{parts[1]}"
+        # Произвольные строки не попадают в метки метрик
+        return parts[0] if parts[0] in KNOWN_ROUTES else 'other'
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from aiogram.exceptions import TelegramBadRequest
+from ..steam.steam_manager import session_store, SessionState
+from .edit_queue import edit_queue
+from .ui_manager import PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Сколько строк по страницам помещаем в сообщение (лимит Telegram - 4096 символов)
+MAX_PAGE_LINES = 60
+
+# Значки состояний для строк по страницам
+STATE_ICONS = (
+    (SessionState.ACTIVE, "🟢"),
+    (SessionState.CONNECTING, "🟡"),
+    (SessionState.AWAITING_GUARD, "🔐"),
+    (SessionState.BACKOFF, "⏳"),
+)
+
+# Живая панель состояния: закрепленное сообщение, которое обновляется само
+# Перерисовывается только по событиям смены состояния сессий, не чаще раза в interval секунд
+class Dashboard:
+    def __init__(self, get_accounts, interval=5.0):
+        self.get_accounts = get_accounts
+        self.interval = interval
+        self._messages = {}  # chat_id -> (сообщение панели, аккаунты панели или None - все)
+        self._loop = None
+        self._scheduled = None
+
+    @property
+    def enabled(self):
+        return bool(self._messages)
+
+    async def open(self, message, accounts=None):
+        """Отправить панель в чат сообщения и закрепить ее; accounts - видимые в панели аккаунты"""
+        self.close(message.chat.id)
+        dashboard_message = await message.answer(self.render(accounts), parse_mode='Markdown')
+        try:
+            await dashboard_message.pin(disable_notification=True)
+        except TelegramBadRequest as e:
+            logger.warning(f"Не удалось закрепить панель: {e}")
+        if not self._messages:
+            self._loop = asyncio.get_running_loop()
+            session_store.subscribe(self.on_state_change, self._loop)
+        self._messages[message.chat.id] = (dashboard_message, accounts)
+
+    def close(self, chat_id):
+        """Перестать обновлять панель в чате"""
+        if self._messages.pop(chat_id, None) is None:
+            return False
+        if not self._messages:
+            # Без открытых панелей события состояний нам не нужны
+            session_store.unsubscribe(self.on_state_change)
+            if self._scheduled:
+                self._scheduled.cancel()
+                self._scheduled = None
+        return True
+
+    def on_state_change(self, account_name, old_state, new_state):
+        """Событие смены состояния (в asyncio цикле): запланировать перерисовку"""
+        self.schedule()
+
+    def schedule(self):
+        """Перерисовать панели через interval секунд, склеивая все события за это время"""
+        if self._messages and self._scheduled is None:
+            self._scheduled = self._loop.call_later(self.interval, self._flush)
+
+    def _flush(self):
+        self._scheduled = None
+        # Панели с одним набором аккаунтов рисуются один раз
+        texts = {}
+        for dashboard_message, accounts in self._messages.values():
+            if id(accounts) not in texts:
+                texts[id(accounts)] = self.render(accounts)
+            edit_queue.post(dashboard_message, texts[id(accounts)], parse_mode='Markdown')
+
+    def render(self, accounts=None):
+        """Текст панели по текущему снимку состояний"""
+        if accounts is None:
+            accounts = self.get_accounts()
+        names = accounts.names() if hasattr(accounts, 'names') else list(accounts)
+        records = session_store.snapshot()
+        scope = getattr(accounts, 'scope', None)
+        if scope is None:
+            counts = session_store.counts()
+        else:
+            # Подмножество аккаунтов считаем по снимку
+            counts = {state: 0 for state in SessionState}
+            for name in names:
+                if name in records:
+                    counts[records[name].state] += 1
+        running = sum(counts.values())
+
+        text = "📡 *Панель состояния*\n\n"
+        text += f"🟢 Активны: {counts[SessionState.ACTIVE]}\n"
+        text += f"🟡 Подключаются: {counts[SessionState.CONNECTING]}\n"
+        text += f"🔐 Ждут Steam Guard: {counts[SessionState.AWAITING_GUARD]}\n"
+        text += f"⏳ Переподключаются: {counts[SessionState.BACKOFF]}\n"
+        text += f"🔴 Остановлены: {max(0, len(names) - running)}\n"
+
+        pages = (len(names) + PAGE_SIZE - 1) // PAGE_SIZE
+        if pages:
+            text += "\n*По страницам:*\n"
+        for page in range(min(pages, MAX_PAGE_LINES)):
+            page_states = [records[name].state for name in names[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+                           if name in records]
+            parts = [f"{icon}{page_states.count(state)}" for state, icon in STATE_ICONS if state in page_states]
+            idle = min(PAGE_SIZE, len(names) - page * PAGE_SIZE) - len(page_states)
+            if idle:
+                parts.append(f"🔴{idle}")
+            text += f"`{page + 1:>3}` " + " ".join(parts) + "\n"
+        if pages > MAX_PAGE_LINES:
+            text += f"… и еще {pages - MAX_PAGE_LINES} стр.\n"
+        return text
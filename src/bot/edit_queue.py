@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from ..steam.startup_scheduler import TokenBucket
+from ..metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних отправленных версий сообщений помнить для пропуска повторов
+SENT_CACHE_SIZE = 10000
+
+# Очередь редактирования сообщений Telegram
+# Склеивает несколько правок одного сообщения в последнюю, пропускает правки без изменений,
+# соблюдает лимиты на чат и общий лимит, выдерживает паузу RetryAfter
+class EditQueue:
+    def __init__(self, per_chat_interval=0.5, global_rate=25):
+        self.per_chat_interval = per_chat_interval
+        self.bucket = TokenBucket(global_rate, global_rate)
+        self.stats = {'requested': 0, 'sent': 0, 'coalesced': 0, 'unchanged': 0, 'retry_after': 0, 'errors': 0}
+        self._pending = OrderedDict()  # (chat_id, message_id) -> [message, text, markup, parse_mode, fingerprint, futures]
+        self._sent = OrderedDict()  # (chat_id, message_id) -> отпечаток последней отправленной версии
+        self._chat_ready_at = {}
+        self._pause_until = 0
+        self._wakeup = None
+        self._worker = None
+
+    def configure(self, per_chat_interval, global_rate):
+        """Задать лимиты из конфигурации"""
+        self.per_chat_interval = per_chat_interval
+        self.bucket = TokenBucket(global_rate, global_rate)
+
+    @staticmethod
+    def _fingerprint(text, reply_markup, parse_mode):
+        markup = reply_markup.model_dump_json(exclude_none=True) if reply_markup is not None else None
+        return hash((text, markup, parse_mode))
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    def submit(self, message, text, reply_markup=None, parse_mode=None):
+        """Поставить правку в очередь; возвращает future, завершающийся после отправки"""
+        self._ensure_worker()
+        self.stats['requested'] += 1
+        future = asyncio.get_running_loop().create_future()
+        key = (message.chat.id, message.message_id)
+        fingerprint = self._fingerprint(text, reply_markup, parse_mode)
+
+        entry = self._pending.get(key)
+        if entry is not None:
+            # Более ранняя правка еще не ушла: заменяем ее последней версией
+            self.stats['coalesced'] += 1
+            entry[1:5] = [text, reply_markup, parse_mode, fingerprint]
+            entry[5].append(future)
+        elif self._sent.get(key) == fingerprint:
+            # Telegram ответил бы "message is not modified"
+            self.stats['unchanged'] += 1
+            future.set_result(False)
+            return future
+        else:
+            self._pending[key] = [message, text, reply_markup, parse_mode, fingerprint, [future]]
+        self._wakeup.set()
+        return future
+
+    async def edit(self, message, text, reply_markup=None, parse_mode=None):
+        """Отредактировать сообщение через очередь и дождаться результата"""
+        return await self.submit(message, text, reply_markup, parse_mode)
+
+    def post(self, message, text, reply_markup=None, parse_mode=None):
+        """Поставить правку в очередь, не дожидаясь отправки; ошибки только логируются"""
+        self.submit(message, text, reply_markup, parse_mode).add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Не удалось отредактировать сообщение: {future.exception()}")
+
+    def _remember_sent(self, key, fingerprint):
+        self._sent[key] = fingerprint
+        self._sent.move_to_end(key)
+        if len(self._sent) > SENT_CACHE_SIZE:
+            self._sent.popitem(last=False)
+
+    def _next_ready(self):
+        # Первая правка, чей чат уже можно редактировать, и время ожидания, если таких нет
+        now = time.monotonic()
+        wait = None
+        for key in self._pending:
+            ready_at = self._chat_ready_at.get(key[0], 0)
+            if ready_at <= now:
+                return key, 0
+            wait = ready_at - now if wait is None else min(wait, ready_at - now)
+        return None, wait
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            pause = self._pause_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+
+            key, wait = self._next_ready()
+            if key is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.bucket.acquire()
+            entry = self._pending.pop(key, None)
+            if entry is None:
+                continue
+            await self._send(key, entry)
+
+    async def _send(self, key, entry):
+        message, text, reply_markup, parse_mode, fingerprint, futures = entry
+        self._chat_ready_at[key[0]] = time.monotonic() + self.per_chat_interval
+        result, error = True, None
+        try:
+            await message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+            self.stats['sent'] += 1
+        except TelegramRetryAfter as e:
+            # Флуд-контроль: ждем сколько сказал Telegram и повторяем, если не пришла новая правка
+            self.stats['retry_after'] += 1
+            logger.warning(f"Telegram просит подождать {e.retry_after} сек перед правками")
+            self._pause_until = time.monotonic() + e.retry_after
+            newer = self._pending.get(key)
+            if newer is None:
+                self._pending[key] = entry
+            else:
+                newer[5].extend(futures)
+            return
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                logger.debug("Сообщение не изменилось, пропускаем обновление")
+                result = False
+            else:
+                self.stats['errors'] += 1
+                error = e
+        except Exception as e:
+            self.stats['errors'] += 1
+            error = e
+
+        if error is None:
+            self._remember_sent(key, fingerprint)
+        for future in futures:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def saved_calls(self):
+        """Сколько запросов к Telegram удалось не отправлять"""
+        return self.stats['coalesced'] + self.stats['unchanged']
+
+edit_queue = EditQueue()
+metrics.gauge('hourbooster_edit_queue', "Счетчики очереди правок сообщений", ['counter'],
+              lambda: {(name,): value for name, value in edit_queue.stats.items()})
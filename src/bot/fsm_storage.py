@@ -0,0 +1,81 @@
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+
+STATE_NAMESPACE = 'fsm_state'
+DATA_NAMESPACE = 'fsm_data'
+
+# Сколько диалогов держать в памяти: FSM разрешается до проверки доступа, поэтому
+# без предела любой, кто пишет боту, заводил бы по записи навсегда
+CACHE_SIZE = 1024
+
+# FSM хранилище aiogram поверх StateStorage
+# Состояние диалога (например, ожидание Steam Guard кода) переживает перезапуск бота.
+# Бот - единственный писатель, поэтому прочитанное кэшируется в памяти, а запись
+# без изменений (state.clear() при каждом нажатии кнопки) до хранилища не доходит.
+# Кэш ограничен CACHE_SIZE последними диалогами, вытесненные читаются заново
+class PersistentStorage(BaseStorage):
+    def __init__(self, storage, cache_size=CACHE_SIZE):
+        self.storage = storage
+        self.cache_size = cache_size
+        self._states = OrderedDict()
+        self._data = OrderedDict()
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        name = self._key(key)
+        if await self._get_state(name) == state:
+            return
+        if state is None:
+            await self.storage.delete(STATE_NAMESPACE, name)
+        else:
+            await self.storage.set(STATE_NAMESPACE, name, state)
+        self._remember(self._states, name, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._get_state(self._key(key))
+
+    async def _get_state(self, name):
+        return await self._cached(self._states, STATE_NAMESPACE, name)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        name = self._key(key)
+        encoded = json.dumps(data) if data else None
+        if await self._get_data(name) == encoded:
+            return
+        if encoded is None:
+            await self.storage.delete(DATA_NAMESPACE, name)
+        else:
+            await self.storage.set(DATA_NAMESPACE, name, encoded)
+        self._remember(self._data, name, encoded)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        encoded = await self._get_data(self._key(key))
+        return json.loads(encoded) if encoded else {}
+
+    async def _get_data(self, name):
+        return await self._cached(self._data, DATA_NAMESPACE, name)
+
+    async def _cached(self, cache, namespace, name):
+        if name in cache:
+            cache.move_to_end(name)
+            return cache[name]
+        value = await self.storage.get(namespace, name)
+        self._remember(cache, name, value)
+        return value
+
+    def _remember(self, cache, name, value):
+        cache[name] = value
+        cache.move_to_end(name)
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    async def close(self) -> None:
+        # Хранилище закрывается вместе с остальными сервисами (stop_services)
+        pass
@@ -1,29 +1,38 @@
-import asyncio
 import logging
-import threading
 import time
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
-from aiogram.exceptions import TelegramBadRequest
 from .states import SteamGuardStates
-from ..steam.steam_manager import clients, client_threads, pending_logins, run_steam_client, stop_steam_client
+from ..steam.steam_manager import session_pool, session_store, session_stats, playtime_tracker, stop_steam_client, SessionState, LOGIN_OK, LOGIN_TIMEOUT
 from .ui_manager import create_account_keyboard, create_cancel_keyboard
+from .edit_queue import edit_queue
 
 logger = logging.getLogger(__name__)
 
 # Сохраняем ссылку на исходное сообщение для обновления
 async def safe_edit_message(callback_query: CallbackQuery, text: str, reply_markup=None, parse_mode=None):
-    """Безопасное редактирование сообщения с обработкой ошибки 'message is not modified'"""
-    try:
-        await callback_query.message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
-    except TelegramBadRequest as e:
-        if "message is not modified" in str(e):
-            # Сообщение не изменилось, просто игнорируем ошибку
-            logger.debug("Сообщение не изменилось, пропускаем обновление")
-            pass
-        else:
-            # Другая ошибка - пробрасываем дальше
-            raise e
+    """Редактирование сообщения через очередь правок
+
+    Принимает нажатие кнопки или само сообщение (например, запрос кода после перезапуска).
+    Очередь склеивает частые правки одного сообщения, пропускает неизмененный текст
+    и ошибку 'message is not modified'; остальные ошибки пробрасываются дальше.
+    """
+    message = callback_query.message if isinstance(callback_query, CallbackQuery) else callback_query
+    await edit_queue.edit(message, text, reply_markup, parse_mode)
+
+def guard_prompt(account_data, guard_type):
+    """Текст запроса Steam Guard кода и состояние диалога для его ввода"""
+    if guard_type == 'mobile':
+        text = f"🔐 *Требуется Steam Guard*\n\n"
+        text += f"👤 Аккаунт: `{account_data['username']}`\n\n"
+        text += "📱 Введите код из мобильного приложения Steam Guard:\n\n"
+        text += "💡 Код состоит из 5 символов (например: ABC12)"
+        return text, SteamGuardStates.waiting_for_guard_code
+    text = f"📧 *Требуется код с Email*\n\n"
+    text += f"👤 Аккаунт: `{account_data['username']}`\n\n"
+    text += "📧 Введите код, отправленный на ваш email:\n\n"
+    text += "💡 Код состоит из 5 символов"
+    return text, SteamGuardStates.waiting_for_email_code
 
 # Обработчики команд для управления аккаунтами
 async def handle_account_start(account_name, accounts, callback_query: CallbackQuery, state: FSMContext):
@@ -34,7 +43,7 @@ async def handle_account_start(account_name, accounts, callback_query: CallbackQ
         await safe_edit_message(callback_query, "❌ Аккаунт не найден в конфигурации")
         return
     
-    if account_name in clients and clients[account_name].logged_on:
+    if session_store.state(account_name) in (SessionState.ACTIVE, SessionState.CONNECTING, SessionState.BACKOFF):
         text = "⚠️ *Аккаунт уже запущен*\n\n"
         account_data = accounts[account_name]
         text += f"👤 Аккаунт: `{account_data['username']}`\n"
@@ -44,6 +53,10 @@ async def handle_account_start(account_name, accounts, callback_query: CallbackQ
         await safe_edit_message(callback_query, text, keyboard, 'Markdown')
         return
     
+    if session_store.state(account_name) is SessionState.AWAITING_GUARD:
+        # Новый вход заменяет незавершенный: клиент, ожидающий код, отключаем
+        await stop_steam_client(account_name, forget=False)
+    
     account_data = accounts[account_name]
     
     # Показываем сообщение о запуске
@@ -55,50 +68,42 @@ async def handle_account_start(account_name, accounts, callback_query: CallbackQ
     keyboard = create_account_keyboard(account_name)
     await safe_edit_message(callback_query, text, keyboard, 'Markdown')
     
-    # Запускаем клиент в отдельном потоке
-    thread = threading.Thread(target=run_steam_client, args=(account_name, account_data, user_id))
-    thread.daemon = True
-    thread.start()
-    client_threads[account_name] = thread
-    
-    # Ждем немного для инициализации
-    await asyncio.sleep(5)
+    # Запускаем сессию в пуле Steam воркеров и ждем ответа Steam
+    result = await session_pool.login(account_name, account_data, user_id)
     
     # Проверяем результат
-    if account_name in clients and clients[account_name].logged_on:
+    if result.status == LOGIN_OK:
         text = f"🚀 *Аккаунт запущен*\n\n"
         text += f"👤 Аккаунт: `{account_data['username']}`\n"
         text += f"🎮 Игры: {', '.join(map(str, account_data['games']))}\n\n"
         text += "✅ Аккаунт успешно запущен!\n⏰ Накрутка часов активна"
         keyboard = create_account_keyboard(account_name)
         await safe_edit_message(callback_query, text, keyboard, 'Markdown')
-    elif user_id in pending_logins:
+    elif session_store.pending_login(user_id):
         # Требуется Steam Guard
-        login_data = pending_logins[user_id]
         # Сохраняем ссылку на исходное сообщение для обновления
-        pending_logins[user_id]['original_message'] = callback_query
+        login_data = session_store.update(account_name, original_message=callback_query)
         cancel_keyboard = create_cancel_keyboard()
         
-        if login_data['guard_type'] == 'mobile':
-            text = f"🔐 *Требуется Steam Guard*\n\n"
-            text += f"👤 Аккаунт: `{account_data['username']}`\n\n"
-            text += "📱 Введите код из мобильного приложения Steam Guard:\n\n"
-            text += "💡 Код состоит из 5 символов (например: ABC12)"
-            await state.set_state(SteamGuardStates.waiting_for_guard_code)
-        else:  # email
-            text = f"📧 *Требуется код с Email*\n\n"
-            text += f"👤 Аккаунт: `{account_data['username']}`\n\n"
-            text += "📧 Введите код, отправленный на ваш email:\n\n"
-            text += "💡 Код состоит из 5 символов"
-            await state.set_state(SteamGuardStates.waiting_for_email_code)
+        text, guard_state = guard_prompt(account_data, login_data.guard_type)
+        await state.set_state(guard_state)
         
         # Показываем сообщение с кнопкой отмены
         await safe_edit_message(callback_query, text, cancel_keyboard, 'Markdown')
     else:
+        if result.status == LOGIN_TIMEOUT:
+            # Сессия продолжает входить в воркере: останавливаем ее, чтобы аккаунт
+            # не запустился после сообщения об ошибке
+            await stop_steam_client(account_name, forget=False)
         text = f"❌ *Ошибка запуска*\n\n"
         text += f"👤 Аккаунт: `{account_data['username']}`\n"
         text += f"🎮 Игры: {', '.join(map(str, account_data['games']))}\n\n"
-        text += "⚠️ Не удалось подключиться к Steam\n"
+        if result.status == LOGIN_TIMEOUT:
+            text += "⚠️ Steam не ответил вовремя, вход прерван\n"
+        else:
+            text += "⚠️ Не удалось подключиться к Steam\n"
+        if result.eresult is not None:
+            text += f"Код ответа: `{result.eresult.name}`\n"
         text += "Проверьте:\n"
         text += "• Правильность логина и пароля\n"
         text += "• Подключение к интернету\n"
@@ -109,20 +114,23 @@ async def handle_account_start(account_name, accounts, callback_query: CallbackQ
 # Обработчики для управления аккаунтами
 async def handle_account_stop(account_name, accounts, callback_query: CallbackQuery):
     """Остановить аккаунт"""
-    if account_name not in clients:
-        account_data = accounts[account_name] if account_name in accounts else None
-        
+    if account_name not in accounts:
+        await safe_edit_message(callback_query, "❌ Аккаунт не найден")
+        return
+
+    if account_name not in session_store:
+        account_data = accounts[account_name]
+
         text = f"⚠️ *Аккаунт не запущен*\n\n"
-        if account_data:
-            text += f"👤 Аккаунт: `{account_data['username']}`\n"
-            text += f"📁 Статус: 🔴 Неактивен\n\n"
+        text += f"👤 Аккаунт: `{account_data['username']}`\n"
+        text += f"📁 Статус: 🔴 Неактивен\n\n"
         text += "Аккаунт уже остановлен"
         
         keyboard = create_account_keyboard(account_name)
         await safe_edit_message(callback_query, text, keyboard, 'Markdown')
         return
     
-    if stop_steam_client(account_name):
+    if await stop_steam_client(account_name):
         account_data = accounts[account_name]
         
         text = f"⏹️ *Аккаунт остановлен*\n\n"
@@ -136,20 +144,37 @@ async def handle_account_stop(account_name, accounts, callback_query: CallbackQu
         await safe_edit_message(callback_query, f"❌ Ошибка при остановке аккаунта")
 
 # Обработчик для показа статистики аккаунта
-async def handle_account_stats(account_name, accounts, callback_query: CallbackQuery):
+async def handle_account_stats(account_name, accounts, callback_query: CallbackQuery, can_control=True):
     """Показать статистику аккаунта"""
     if account_name not in accounts:
         await safe_edit_message(callback_query, "❌ Аккаунт не найден")
         return
     
     account_data = accounts[account_name]
-    is_active = account_name in clients and clients[account_name].logged_on
+    is_active = session_store.is_active(account_name)
     
     text = f"📊 *Статистика аккаунта*\n\n"
     text += f"👤 Логин: `{account_data['username']}`\n"
     text += f"📁 Статус: {'🟢 Активен' if is_active else '🔴 Неактивен'}\n"
     text += f"🎮 Количество игр: {len(account_data['games'])}\n"
-    text += f"🎯 Игры: {', '.join(map(str, account_data['games']))}\n\n"
+    text += f"🎯 Игры: {', '.join(map(str, account_data['games']))}\n"
+    
+    stats = session_stats.get(account_name)
+    if stats:
+        uptime = stats['uptime']
+        if stats['online_since'] is not None:
+            uptime += time.monotonic() - stats['online_since']
+        text += f"⏱ Онлайн: {uptime / 3600:.1f} ч, офлайн: {stats['downtime'] / 3600:.1f} ч\n"
+        text += f"🔁 Обрывов: {stats['disconnects']}, переподключений: {stats['reconnects']}\n"
+    
+    if playtime_tracker.enabled:
+        summary = playtime_tracker.summary(account_name)
+        text += f"\n📈 *За все время:*\n"
+        text += f"⏱ Накручено: {summary['online_hours']:.1f} ч, онлайн {summary['uptime_percent']:.0f}% времени\n"
+        text += f"🔁 Обрывов: {summary['disconnects']}\n"
+        for app_id, hours in sorted(summary['game_hours'].items(), key=lambda item: -item[1])[:10]:
+            text += f"🎮 {app_id}: {hours:.1f} ч\n"
+    text += "\n"
     
     if is_active:
         text += "⏰ Накрутка часов активна"
@@ -158,5 +183,5 @@ async def handle_account_stats(account_name, accounts, callback_query: CallbackQ
     
     text += f"\n🕐 Обновлено: {time.strftime('%H:%M:%S')}"
     
-    keyboard = create_account_keyboard(account_name)
+    keyboard = create_account_keyboard(account_name, can_control)
     await safe_edit_message(callback_query, text, keyboard, 'Markdown')
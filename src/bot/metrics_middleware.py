@@ -0,0 +1,44 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, CallbackQuery
+from ..metrics import metrics
+from .callbacks import CallbackRouter
+
+telegram_seconds = metrics.histogram(
+    'hourbooster_telegram_request_seconds', "Длительность запросов к Telegram API", ['method'])
+telegram_errors = metrics.counter(
+    'hourbooster_telegram_errors_total', "Ошибки запросов к Telegram API", ['method', 'error'])
+callback_seconds = metrics.histogram(
+    'hourbooster_callback_seconds', "Время обработки нажатий на кнопки", ['action'])
+
+# Замер всех запросов бота к Telegram API (подключается к сессии бота, только если метрики включены)
+class TelegramRequestMetrics(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.monotonic()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            telegram_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            telegram_seconds.observe(time.monotonic() - started, name)
+
+# Замер обработки нажатий на кнопки по типу действия (start_, stop_, menu_ ...)
+class CallbackMetricsMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, CallbackQuery) or not event.data:
+            return await handler(event, data)
+        action = CallbackRouter.route_name(event.data)
+        started = time.monotonic()
+        try:
+            return await handler(event, data)
+        finally:
+            callback_seconds.observe(time.monotonic() - started, action)
@@ -1,25 +1,128 @@
+import threading
 import time
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from ..steam.steam_manager import clients
+from ..account_registry import account_key
+from ..steam.steam_manager import session_store, SessionState
+from .callbacks import MenuCallback, AccountCallback, HELP, BACK, CANCEL_CODE
+
+# Количество аккаунтов на одной странице главного меню
+PAGE_SIZE = 8
+
+# Фильтры главного меню по статусу аккаунта
+STATUS_FILTERS = {
+    'all': "Все",
+    'on': "🟢 Активные",
+    'off': "🔴 Неактивные",
+}
+
+# Кэш страниц главного меню и инкрементальный счетчик активных аккаунтов
+# Страница сбрасывается только когда меняется статус одного из ее аккаунтов
+# generation растет с каждой сменой статуса: страница, построенная до смены, в кэш не попадает
+class MenuCache:
+    def __init__(self):
+        self.active = set()
+        self.generation = 0
+        self._pages = {}  # (страница, фильтр, набор аккаунтов) -> (версия реестра, имена на странице, клавиатура)
+        self._lock = threading.Lock()
+    
+    def on_state_change(self, account_name, old_state, new_state):
+        """Обновить счетчик и сбросить страницы, на которых есть этот аккаунт"""
+        active = new_state is SessionState.ACTIVE
+        with self._lock:
+            if active == (account_name in self.active):
+                return
+            if active:
+                self.active.add(account_name)
+            else:
+                self.active.discard(account_name)
+            self.generation += 1
+            # В отфильтрованных видах меняется сам состав страниц
+            self._pages = {
+                key: entry for key, entry in self._pages.items()
+                if key[1] == 'all' and account_name not in entry[1]
+            }
+    
+    def get(self, key, version):
+        with self._lock:
+            entry = self._pages.get(key)
+        if entry and entry[0] == version:
+            return entry[2]
+        return None
+    
+    def put(self, key, version, generation, names, keyboard):
+        """Сохранить страницу, если статусы не менялись с generation, прочитанного до ее построения"""
+        with self._lock:
+            if generation == self.generation:
+                self._pages[key] = (version, frozenset(names), keyboard)
+
+menu_cache = MenuCache()
+session_store.subscribe(menu_cache.on_state_change)
+
+# Проверить, активен ли аккаунт
+def is_account_active(account_name):
+    """Аккаунт вошел в Steam и накручивает часы"""
+    return session_store.is_active(account_name)
+
+# Подпись аккаунта на кнопке: account12 -> 12, остальные имена как есть
+def account_label(account_name):
+    """Получить короткое имя аккаунта для кнопки"""
+    suffix = account_name[len('account'):] if account_name.startswith('account') else ''
+    return suffix if suffix.isdigit() else account_name
+
+# Отобрать имена аккаунтов для фильтра
+def filter_accounts(accounts, status_filter):
+    """Список имен аккаунтов с учетом фильтра по статусу"""
+    names = accounts.names() if hasattr(accounts, 'names') else list(accounts)
+    if status_filter == 'on':
+        return [name for name in names if name in menu_cache.active]
+    if status_filter == 'off':
+        return [name for name in names if name not in menu_cache.active]
+    return names
 
 # Функция для создания главной клавиатуры
-def create_main_keyboard(accounts):
-    """Создать главную клавиатуру"""
-    keyboard = []
+def create_main_keyboard(accounts, page=0, status_filter='all'):
+    """Создать страницу главной клавиатуры"""
+    # Пользователи с разными наборами аккаунтов видят разные страницы
+    key = (page, status_filter, getattr(accounts, 'scope', None))
+    version = getattr(accounts, 'version', None)
+    cached = menu_cache.get(key, version)
+    if cached is not None:
+        return cached
+    
+    generation = menu_cache.generation
+    names = filter_accounts(accounts, status_filter)
+    pages = max(1, (len(names) + PAGE_SIZE - 1) // PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+    page_names = names[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
     
-    for account_name in accounts:
-        account_num = account_name[-1]  # Получаем номер аккаунта
+    keyboard = []
+    for account_name in page_names:
         username = accounts[account_name]['username']
-        status = "🟢 Активен" if account_name in clients and clients[account_name].logged_on else "🔴 Неактивен"
+        status = "🟢 Активен" if is_account_active(account_name) else "🔴 Неактивен"
         keyboard.append([InlineKeyboardButton(
-            text=f"Аккаунт {account_num} ({username}) - {status}", 
-            callback_data=f"account_{account_name}"
+            text=f"Аккаунт {account_label(account_name)} ({username}) - {status}",
+            callback_data=AccountCallback(action="open", key=account_key(account_name)).pack()
         )])
     
-    keyboard.append([InlineKeyboardButton(text="🔄 Обновить", callback_data="refresh")])
-    keyboard.append([InlineKeyboardButton(text="ℹ️ Помощь", callback_data="help")])
+    if pages > 1:
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton(text="◀️", callback_data=MenuCallback(page=page - 1, status=status_filter).pack()))
+        navigation.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=MenuCallback(page=page, status=status_filter).pack()))
+        if page < pages - 1:
+            navigation.append(InlineKeyboardButton(text="▶️", callback_data=MenuCallback(page=page + 1, status=status_filter).pack()))
+        keyboard.append(navigation)
     
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+    keyboard.append([
+        InlineKeyboardButton(text=("• " if name == status_filter else "") + title, callback_data=MenuCallback(page=0, status=name).pack())
+        for name, title in STATUS_FILTERS.items()
+    ])
+    keyboard.append([InlineKeyboardButton(text="🔄 Обновить", callback_data=MenuCallback(page=page, status=status_filter).pack())])
+    keyboard.append([InlineKeyboardButton(text="ℹ️ Помощь", callback_data=HELP)])
+    
+    markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+    menu_cache.put(key, version, generation, page_names, markup)
+    return markup
 
 # Функция для получения текста главного меню с актуальной информацией
 def get_main_menu_text(accounts):
@@ -30,25 +133,27 @@ def get_main_menu_text(accounts):
     if not accounts:
         text += "❌ Аккаунты не найдены в config.ini"
     else:
-        # Добавляем краткую сводку активных аккаунтов
-        active_count = sum(1 for acc in accounts if acc in clients and clients[acc].logged_on)
-        text += f"📊 Активных аккаунтов: {active_count}/{len(accounts)}\n"
+        # Счетчик активных аккаунтов ведется инкрементально
+        scope = getattr(accounts, 'scope', None)
+        active = len(menu_cache.active) if scope is None else len(menu_cache.active & scope)
+        text += f"📊 Активных аккаунтов: {active}/{len(accounts)}\n"
         text += f"🕐 Обновлено: {time.strftime('%H:%M:%S')}\n\n"
     
     return text
 
 # Функция для создания клавиатуры для управления конкретным аккаунтом
-def create_account_keyboard(account_name):
-    """Создать клавиатуру для управления конкретным аккаунтом"""
+def create_account_keyboard(account_name, can_control=True):
+    """Создать клавиатуру для управления конкретным аккаунтом (без can_control - только просмотр)"""
     keyboard = []
     
-    if account_name in clients and clients[account_name].logged_on:
-        keyboard.append([InlineKeyboardButton(text="⏹️ Остановить", callback_data=f"stop_{account_name}")])
-        keyboard.append([InlineKeyboardButton(text="📊 Статистика", callback_data=f"stats_{account_name}")])
-    else:
-        keyboard.append([InlineKeyboardButton(text="▶️ Запустить", callback_data=f"start_{account_name}")])
+    if is_account_active(account_name):
+        if can_control:
+            keyboard.append([InlineKeyboardButton(text="⏹️ Остановить", callback_data=AccountCallback(action="stop", key=account_key(account_name)).pack())])
+        keyboard.append([InlineKeyboardButton(text="📊 Статистика", callback_data=AccountCallback(action="stats", key=account_key(account_name)).pack())])
+    elif can_control:
+        keyboard.append([InlineKeyboardButton(text="▶️ Запустить", callback_data=AccountCallback(action="start", key=account_key(account_name)).pack())])
     
-    keyboard.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="back")])
+    keyboard.append([InlineKeyboardButton(text="⬅️ Назад", callback_data=BACK)])
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
@@ -56,6 +161,6 @@ def create_account_keyboard(account_name):
 def create_cancel_keyboard():
     """Создать клавиатуру с кнопкой отмены"""
     keyboard = [
-        [InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_code")]
+        [InlineKeyboardButton(text="❌ Отменить", callback_data=CANCEL_CODE)]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
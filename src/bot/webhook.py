@@ -0,0 +1,48 @@
+import asyncio
+import logging
+import secrets
+import signal
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+logger = logging.getLogger(__name__)
+
+# Прием обновлений Telegram через webhook вместо long polling
+# Telegram сам присылает обновления на aiohttp сервер; запросы без верного
+# X-Telegram-Bot-Api-Secret-Token отклоняются
+async def run_webhook(dispatcher, bot, settings, stop_event=None):
+    """Работать в режиме webhook до stop_event (по умолчанию - до SIGINT/SIGTERM)"""
+    secret_token = settings['secret_token']
+    if not secret_token:
+        if settings['url']:
+            # Бот сам ставит webhook, поэтому может сгенерировать новый секрет при каждом запуске
+            secret_token = secrets.token_urlsafe(32)
+        else:
+            # Webhook ставит внешняя сторона: случайный секрет ей неизвестен
+            logger.warning("Webhook без url и secret_token: заголовок X-Telegram-Bot-Api-Secret-Token не проверяется")
+            secret_token = None
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dispatcher, bot=bot, secret_token=secret_token).register(app, path=settings['path'])
+    setup_application(app, dispatcher, bot=bot)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, settings['host'], settings['port']).start()
+    if settings['url']:
+        await bot.set_webhook(
+            settings['url'].rstrip('/') + settings['path'],
+            secret_token=secret_token,
+            allowed_updates=dispatcher.resolve_used_update_types()
+        )
+    logger.info(f"Webhook слушает {settings['host']}:{settings['port']}{settings['path']}")
+
+    if stop_event is None:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop_event.set)
+    try:
+        await stop_event.wait()
+    finally:
+        # Закрывает и сессию бота (SimpleRequestHandler.close)
+        await runner.cleanup()
@@ -1,32 +1,235 @@
 import configparser
 import logging
+import os
+from .account_registry import AccountRegistry, ini_records, file_records
 
 logger = logging.getLogger(__name__)
 
+# Ключ шифрования кэша учетных данных по умолчанию: вне каталога проекта, отдельно от кэша
+DEFAULT_KEY_FILE = '~/.config/hourbooster/credentials.key'
+# Прежнее место ключа по умолчанию (рядом с кэшем)
+LEGACY_KEY_FILE = 'config/credentials.key'
+
 # ConfigManager для управления конфигурацией
 # Читает данные из config.ini и предоставляет методы для доступа к ним
 class ConfigManager:
     def __init__(self, config_file='config/config.ini'):
+        self.config_file = config_file
         self.config = configparser.ConfigParser()
         self.config.read(config_file, encoding='utf-8')
+        self._accounts = None
+    
+    def read_config(self):
+        """Прочитать config.ini и изменения аккаунтов, не трогая текущие (можно вызывать из потока)"""
+        config = configparser.ConfigParser()
+        config.read(self.config_file, encoding='utf-8')
+        accounts = self.get_accounts_from_config()
+        return config, accounts.read_changes(self._account_sources(config))
+    
+    def apply_config(self, config, changes):
+        """Применить прочитанную конфигурацию, вернуть разницу аккаунтов"""
+        self.config = config
+        fresh, diff = changes
+        self.get_accounts_from_config().apply(fresh, diff)
+        return diff
+    
+    @staticmethod
+    def _account_sources(config):
+        """Источники аккаунтов для AccountRegistry.read_changes
+        Файл аккаунтов помечается mtime и размером: неизмененный файл не перечитывается"""
+        sources = {'ini': (None, lambda: ini_records(config))}
+        source = config.get('accounts', 'source', fallback='')
+        if source:
+            stat = os.stat(source)
+            sources[source] = ((stat.st_mtime_ns, stat.st_size), lambda: file_records(source))
+        return sources
+    
+    def get_watched_files(self):
+        """Файлы, изменение которых требует перезагрузки конфигурации"""
+        files = [self.config_file]
+        source = self.config.get('accounts', 'source', fallback='')
+        if source:
+            files.append(source)
+        return files
+    
+    def get_reload_interval(self):
+        """Получить интервал проверки изменений конфигурации (0 - отключено)"""
+        return self.config.getfloat('reload', 'interval', fallback=2.0)
     
     def get_bot_token(self):
         """Получить токен бота"""
         return self.config['telegram']['bot_token']
     
+    def get_update_mode(self):
+        """Получить способ получения обновлений Telegram: polling или webhook"""
+        return self.config.get('telegram', 'mode', fallback='polling')
+    
+    def get_webhook_settings(self):
+        """Получить параметры webhook: внешний URL, адрес и порт сервера, путь и секрет"""
+        return {
+            'url': self.config.get('webhook', 'url', fallback=''),
+            'host': self.config.get('webhook', 'host', fallback='0.0.0.0'),
+            'port': self.config.getint('webhook', 'port', fallback=8080),
+            'path': self.config.get('webhook', 'path', fallback='/webhook'),
+            'secret_token': self.config.get('webhook', 'secret_token', fallback=''),
+        }
+    
     def get_allowed_user_id(self):
         """Получить ID разрешенного пользователя"""
         return int(self.config['telegram']['allowed_user_id'])
     
+    def get_users(self):
+        """Получить пользователей бота: {user_id: (роль, имена аккаунтов или None - все)}
+
+        Секция [users]: <user_id> = <роль>[: account1, account2]. Владелец из
+        [telegram] allowed_user_id всегда администратор со всеми аккаунтами.
+        """
+        users = {}
+        if self.config.has_section('users'):
+            for user_id, value in self.config.items('users'):
+                role, _, names = value.partition(':')
+                names = [name.strip() for name in names.split(',') if name.strip()]
+                users[int(user_id)] = (role.strip(), names or None)
+        if self.config.has_option('telegram', 'allowed_user_id'):
+            users[self.get_allowed_user_id()] = ('admin', None)
+        return users
+    
+    def get_steam_workers(self):
+        """Получить количество воркеров пула Steam сессий"""
+        return self.config.getint('steam', 'workers', fallback=4)
+    
+    def get_steam_processes(self):
+        """Получить количество процессов для сессий Steam (0 - все сессии в процессе бота)"""
+        return self.config.getint('steam', 'processes', fallback=0)
+    
+    def get_login_timeout(self):
+        """Получить максимальное время ожидания ответа Steam на вход (секунды)"""
+        return self.config.getfloat('steam', 'login_timeout', fallback=30)
+    
+    def get_reconnect_max_delay(self):
+        """Получить максимальную паузу между попытками переподключения (секунды)"""
+        return self.config.getfloat('steam', 'reconnect_max_delay', fallback=300)
+    
+    def get_shutdown_timeout(self):
+        """Получить максимальное время остановки всех сессий (секунды)"""
+        return self.config.getfloat('steam', 'shutdown_timeout', fallback=10)
+    
+    def get_edit_limits(self):
+        """Получить лимиты редактирования сообщений: интервал на чат (секунды) и правок в секунду всего"""
+        return (
+            self.config.getfloat('telegram', 'edit_interval', fallback=0.5),
+            self.config.getfloat('telegram', 'edit_rate', fallback=25)
+        )
+    
+    def get_dashboard_interval(self):
+        """Получить минимальный интервал между обновлениями панели состояния (секунды)"""
+        return self.config.getfloat('dashboard', 'interval', fallback=5)
+    
+    def get_playtime_settings(self):
+        """Получить путь к базе статистики накрутки (пустой - учет выключен) и период записи"""
+        return (
+            self.config.get('stats', 'database', fallback='config/playtime.db'),
+            self.config.getfloat('stats', 'flush_interval', fallback=5)
+        )
+    
+    def get_boost_settings(self):
+        """Получить окна накрутки, цели по часам и смену партий игр
+
+        Секции [schedule] и [hour_targets]: <аккаунт> = значение, * - для всех остальных.
+        """
+        schedules = dict(self.config['schedule']) if self.config.has_section('schedule') else {}
+        targets = dict(self.config['hour_targets']) if self.config.has_section('hour_targets') else {}
+        return {
+            'schedules': {name: spec for name, spec in schedules.items() if spec.strip()},
+            'targets': {name: spec for name, spec in targets.items() if spec.strip()},
+            'batch_size': self.config.getint('rotation', 'batch_size', fallback=32),
+            'interval': self.config.getfloat('rotation', 'interval', fallback=3600)
+        }
+    
+    def get_storage_settings(self):
+        """Получить настройки хранилища состояния (диалоги и запущенные аккаунты)"""
+        return {
+            'backend': self.config.get('storage', 'backend', fallback='sqlite'),
+            'path': self.config.get('storage', 'path', fallback='config/state.db'),
+            'url': self.config.get('storage', 'url', fallback='redis://127.0.0.1:6379/0'),
+            'prefix': self.config.get('storage', 'prefix', fallback='hourbooster:'),
+            'resume': self.config.getboolean('storage', 'resume', fallback=True)
+        }
+    
+    def get_metrics_settings(self):
+        """Получить адрес и порт HTTP endpoint метрик (порт 0 - метрики выключены)"""
+        return (
+            self.config.get('metrics', 'host', fallback='127.0.0.1'),
+            self.config.getint('metrics', 'port', fallback=0)
+        )
+    
+    def get_daemon_socket(self):
+        """Получить путь к Unix сокету управления фоновым режимом"""
+        return self.config.get('daemon', 'socket', fallback='config/hourbooster.sock')
+    
+    def get_credential_cache_paths(self):
+        """Получить пути к зашифрованному кэшу учетных данных и его ключу"""
+        key_file = self.config.get('cache', 'key_file', fallback=None)
+        if key_file is None and os.path.exists(LEGACY_KEY_FILE):
+            # Ключ из прежнего места по умолчанию: иначе сохраненный кэш не расшифровать
+            logger.warning(f"Ключ кэша учетных данных лежит в {LEGACY_KEY_FILE}, перенесите его в {DEFAULT_KEY_FILE}")
+            key_file = LEGACY_KEY_FILE
+        return (
+            self.config.get('cache', 'credentials', fallback='config/credentials.cache'),
+            os.path.expanduser(key_file or DEFAULT_KEY_FILE)
+        )
+    
+    def get_cm_settings(self):
+        """Получить путь к кэшу списка CM серверов Steam и срок его актуальности (секунды)"""
+        return (
+            self.config.get('cache', 'cm_servers', fallback='config/cm_servers.json'),
+            self.config.getfloat('cache', 'cm_servers_ttl', fallback=86400)
+        )
+    
+    def get_startup_settings(self):
+        """Получить параметры массового запуска аккаунтов"""
+        return {
+            'rate': self.config.getfloat('startup', 'rate', fallback=1.0),
+            'burst': self.config.getint('startup', 'burst', fallback=3),
+            'max_concurrent': self.config.getint('startup', 'max_concurrent', fallback=5),
+            'jitter': self.config.getfloat('startup', 'jitter', fallback=2.0),
+            'max_retries': self.config.getint('startup', 'max_retries', fallback=5),
+            'backoff_base': self.config.getfloat('startup', 'backoff_base', fallback=30),
+            'backoff_max': self.config.getfloat('startup', 'backoff_max', fallback=600)
+        }
+    
+    def get_route_settings(self):
+        """Получить исходящие маршруты к Steam (прокси, локальные адреса) и правила их выбора"""
+        routes = dict(self.config['routes']) if self.config.has_section('routes') else {}
+        accounts = dict(self.config['route_accounts']) if self.config.has_section('route_accounts') else {}
+        return {
+            'routes': routes,
+            'accounts': accounts,
+            'strategy': self.config.get('routing', 'strategy', fallback='least_loaded'),
+            'max_sessions': self.config.getint('routing', 'max_sessions', fallback=0),
+            'max_rate_limits': self.config.getint('routing', 'max_rate_limits', fallback=3),
+            'cooldown': self.config.getfloat('routing', 'cooldown', fallback=600),
+            'health_interval': self.config.getfloat('routing', 'health_interval', fallback=60)
+        }
+    
+    def get_startup_accounts(self, accounts):
+        """Отобрать аккаунты для массового запуска (по умолчанию все)"""
+        names = self.config.get('startup', 'accounts', fallback='')
+        selected = [name.strip() for name in names.split(',') if name.strip()]
+        if not selected:
+            return accounts
+        return {name: accounts[name] for name in selected if name in accounts}
+    
     def get_accounts_from_config(self):
-        """Получить информацию об аккаунтах из config.ini"""
-        accounts = {}
-        for i in range(1, 4):  # account1, account2, account3
-            section = f'account{i}'
-            if section in self.config:
-                accounts[section] = {
-                    'username': self.config[section]['username'],
-                    'password': self.config[section]['password'],
-                    'games': [int(game.strip()) for game in self.config[section]['games'].split(',') if game.strip()]
-                }
-        return accounts
+        """Получить реестр аккаунтов (загружается один раз)"""
+        if self._accounts is None:
+            self._accounts = self.load_accounts()
+        return self._accounts
+    
+    def load_accounts(self, config=None):
+        """Загрузить аккаунты из config.ini и внешнего файла [accounts] source"""
+        config = config or self.config
+        registry = AccountRegistry()
+        registry.apply(*registry.read_changes(self._account_sources(config)))
+        logger.info(f"Загружено аккаунтов: {len(registry)}")
+        return registry
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import os
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # inotify_simple не установлен - работаем через опрос
+    INotify = None
+
+logger = logging.getLogger(__name__)
+
+# Слежение за config.ini и файлом аккаунтов
+# Использует inotify, если он доступен, иначе периодически проверяет mtime
+class ConfigWatcher:
+    def __init__(self, config_manager, on_change, interval=2.0):
+        self.config_manager = config_manager
+        self.on_change = on_change
+        self.interval = interval
+        self._snapshot = {}
+
+    def _stat_files(self):
+        snapshot = {}
+        for path in self.config_manager.get_watched_files():
+            try:
+                stat = os.stat(path)
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                snapshot[path] = None
+        return snapshot
+
+    def _open_inotify(self):
+        if INotify is None:
+            return None
+        try:
+            inotify = INotify()
+            # Следим за каталогами: редакторы часто сохраняют файл через переименование
+            mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE
+            for directory in {os.path.dirname(os.path.abspath(path)) for path in self._snapshot}:
+                inotify.add_watch(directory, mask)
+            return inotify
+        except OSError as e:
+            logger.warning(f"inotify недоступен, используем опрос файлов: {e}")
+            return None
+
+    async def _reload(self):
+        # run_in_executor, а не asyncio.to_thread: бот поддерживает Python 3.8
+        loop = asyncio.get_running_loop()
+        config, accounts = await loop.run_in_executor(None, self.config_manager.read_config)
+        diff = self.config_manager.apply_config(config, accounts)
+        if diff.added or diff.removed or diff.changed:
+            logger.info(
+                f"Конфигурация перезагружена: добавлено {len(diff.added)}, "
+                f"удалено {len(diff.removed)}, изменено {len(diff.changed)}"
+            )
+        # Вызывается и без изменений аккаунтов: могли поменяться другие секции (например, [users])
+        await self.on_change(diff)
+
+    async def run(self):
+        """Следить за файлами и применять изменения до отмены задачи"""
+        self._snapshot = self._stat_files()
+        loop = asyncio.get_running_loop()
+        inotify = self._open_inotify()
+        changed = asyncio.Event()
+        if inotify:
+            loop.add_reader(inotify.fileno(), changed.set)
+        try:
+            while True:
+                if inotify:
+                    await changed.wait()
+                    changed.clear()
+                    inotify.read(timeout=0)
+                    # Даем редактору дописать файл
+                    await asyncio.sleep(0.2)
+                else:
+                    await asyncio.sleep(self.interval)
+
+                # Перечитываем конфигурацию только если файлы действительно изменились
+                snapshot = self._stat_files()
+                if snapshot == self._snapshot:
+                    continue
+                self._snapshot = snapshot
+                try:
+                    await self._reload()
+                except Exception as e:
+                    logger.error(f"Ошибка перезагрузки конфигурации: {e}")
+        finally:
+            if inotify:
+                loop.remove_reader(inotify.fileno())
+                inotify.close()
@@ -0,0 +1,173 @@
+"""Фоновый режим без Telegram: аккаунты запускаются прямо из конфигурации,
+управление - через локальный Unix сокет с JSON протоколом (одна строка - один запрос).
+
+Запуск:     python -m src.daemon [--config config/config.ini] [--no-start-all]
+Управление: python -m src.daemon status | start <аккаунт> | stop <аккаунт> | startall | stopall
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+from .config_manager import ConfigManager
+from .runtime import start_services, stop_services, start_all_accounts, resume_accounts
+from .steam.steam_manager import session_pool, session_store, apply_account_changes, stop_steam_client, stop_all_clients, LOGIN_OK
+
+logger = logging.getLogger(__name__)
+
+# Сервер управления на Unix сокете
+class ControlServer:
+    def __init__(self, config_manager, path):
+        self.config_manager = config_manager
+        self.path = path
+        self._server = None
+        self._commands = {
+            'status': self._status,
+            'start': self._start,
+            'stop': self._stop,
+            'startall': self._start_all,
+            'stopall': self._stop_all,
+        }
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        # Управлять демоном может только владелец
+        os.chmod(self.path, 0o600)
+        logger.info(f"Сокет управления: {self.path}")
+
+    async def close(self):
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    command = self._commands.get(request.get('cmd'))
+                    if command is None:
+                        response = {'ok': False, 'error': f"неизвестная команда: {request.get('cmd')}"}
+                    else:
+                        response = await command(request)
+                except (ValueError, AttributeError) as e:
+                    response = {'ok': False, 'error': f"некорректный запрос: {e}"}
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _account(self, request):
+        account_name = request.get('account')
+        accounts = self.config_manager.get_accounts_from_config()
+        if account_name not in accounts:
+            return account_name, None
+        return account_name, accounts[account_name]
+
+    async def _status(self, request):
+        return {
+            'ok': True,
+            'sessions': session_pool.status(),
+            'counts': {state.value: count for state, count in session_store.counts().items()},
+            'workers': session_pool.worker_load(),
+        }
+
+    async def _start(self, request):
+        account_name, account_data = self._account(request)
+        if account_data is None:
+            return {'ok': False, 'error': f"аккаунт не найден: {account_name}"}
+        if account_name in session_store:
+            return {'ok': True, 'state': session_store.state(account_name).value}
+        # Без Telegram ввести Steam Guard код некому: такие аккаунты сообщают ошибку входа
+        result = await session_pool.login(account_name, account_data)
+        return {
+            'ok': result.status == LOGIN_OK,
+            'status': result.status,
+            'eresult': result.eresult.name if result.eresult is not None else None,
+        }
+
+    async def _stop(self, request):
+        account_name = request.get('account')
+        return {'ok': await stop_steam_client(account_name, self.config_manager.get_shutdown_timeout())}
+
+    async def _start_all(self, request):
+        report = await start_all_accounts(self.config_manager)
+        return {'ok': not report['failed'], **report}
+
+    async def _stop_all(self, request):
+        report = await stop_all_clients(self.config_manager.get_shutdown_timeout())
+        return {'ok': True, 'report': report}
+
+async def run_daemon(config_manager, start_all=True):
+    """Работать до SIGINT/SIGTERM, затем остановить все сессии"""
+    tasks = await start_services(
+        config_manager,
+        lambda diff: apply_account_changes(diff, config_manager.get_accounts_from_config())
+    )
+    server = ControlServer(config_manager, config_manager.get_daemon_socket())
+    await server.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    async def start_accounts():
+        # Сначала аккаунты, работавшие до перезапуска, затем остальные из конфигурации
+        await resume_accounts(config_manager)
+        if start_all:
+            await start_all_accounts(config_manager)
+
+    tasks.append(asyncio.create_task(start_accounts()))
+    logger.info("Фоновый режим запущен")
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+        await stop_services(config_manager, tasks)
+
+def send_command(path, request):
+    """Отправить запрос работающему демону и вернуть ответ"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile('rb') as f:
+            return json.loads(f.readline())
+
+def main():
+    parser = argparse.ArgumentParser(description="Steam Hour Booster без Telegram")
+    parser.add_argument('command', nargs='*',
+                        help="команда работающему демону: status | start <аккаунт> | stop <аккаунт> | startall | stopall")
+    parser.add_argument('--config', default='config/config.ini', help="путь к config.ini")
+    parser.add_argument('--no-start-all', action='store_true', help="не запускать аккаунты при старте")
+    args = parser.parse_args()
+    config_manager = ConfigManager(args.config)
+
+    if args.command:
+        request = {'cmd': args.command[0]}
+        if len(args.command) > 1:
+            request['account'] = args.command[1]
+        try:
+            response = send_command(config_manager.get_daemon_socket(), request)
+        except OSError as e:
+            print(f"Демон недоступен: {e}", file=sys.stderr)
+            return 1
+        print(json.dumps(response, ensure_ascii=False, indent=2))
+        return 0 if response.get('ok') else 1
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_daemon(config_manager, start_all=not args.no_start_all))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Период измерения задержки asyncio цикла (секунды)
+LOOP_LAG_INTERVAL = 1.0
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+# Счетчик с метками; наблюдения могут приходить из потоков Steam воркеров
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        self.forward = None  # (имя, значения меток, значение) -> None; учет ведет другой процесс
+
+    def inc(self, *label_values, amount=1):
+        if self.forward is not None:
+            self.forward(self.name, label_values, amount)
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in values]
+
+# Гистограмма с метками в формате Prometheus (накопительные корзины, _sum и _count)
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # значения меток -> [счетчики корзин..., +Inf, сумма]
+        self._lock = threading.Lock()
+        self.forward = None
+
+    def observe(self, value, *label_values):
+        if self.forward is not None:
+            self.forward(self.name, label_values, value)
+            return
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(series)) for key, series in self._values.items()]
+        samples = []
+        for key, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                labels = _format_labels(self.labels + ('le',), key + (bound,))
+                samples.append((self.name + '_bucket', labels, cumulative))
+            labels = _format_labels(self.labels, key)
+            samples.append((self.name + '_sum', labels, series[-1]))
+            samples.append((self.name + '_count', labels, cumulative))
+        return samples
+
+# Датчик, значения которого вычисляются в момент запроса метрик
+class CallbackGauge:
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.collect = collect  # () -> {значения меток: значение}
+
+    def samples(self):
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in self.collect().items()]
+
+# Реестр метрик и HTTP endpoint /metrics
+# Пока endpoint не запущен, enabled ложно и инструментированный код метрики не трогает
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.loop_lag = 0.0
+        self._metrics = []
+        self._runner = None
+        self._lag_task = None
+
+        self.gauge('hourbooster_event_loop_lag_seconds', "Задержка asyncio цикла", [],
+                   lambda: {(): self.loop_lag})
+
+    def counter(self, name, documentation, labels=()):
+        metric = Counter(name, documentation, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, documentation, labels, collect):
+        metric = CallbackGauge(name, documentation, labels, collect)
+        self._metrics.append(metric)
+        return metric
+
+    def forward(self, send):
+        """Пересылать наблюдения счетчиков и гистограмм в send(имя, значения меток, значение)
+
+        Нужно процессам шардов: endpoint метрик есть только у родителя, он и ведет учет.
+        """
+        for metric in self._metrics:
+            if isinstance(metric, (Counter, Histogram)):
+                metric.forward = send
+        self.enabled = True
+
+    def record(self, name, label_values, value):
+        """Учесть наблюдение, пересланное из процесса шарда"""
+        for metric in self._metrics:
+            if metric.name != name:
+                continue
+            if metric.kind == 'counter':
+                metric.inc(*label_values, amount=value)
+            elif metric.kind == 'histogram':
+                metric.observe(value, *label_values)
+            return
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрики {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def _handle(self, request):
+        from aiohttp import web
+        return web.Response(text=self.render(), content_type='text/plain', charset='utf-8')
+
+    async def _measure_loop_lag(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag = max(0.0, time.monotonic() - started - LOOP_LAG_INTERVAL)
+
+    async def start(self, host, port):
+        """Запустить HTTP endpoint /metrics и включить сбор"""
+        # aiohttp нужен только при включенных метриках
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self._lag_task = asyncio.create_task(self._measure_loop_lag())
+        self.enabled = True
+        logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._lag_task.cancel()
+        await self._runner.cleanup()
+
+metrics = Metrics()
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from .config_watcher import ConfigWatcher
+from .metrics import metrics
+from .storage import state_storage
+from .steam.steam_manager import (session_pool, session_store, credential_cache, cm_directory, playtime_tracker, route_pool,
+                                  boost_scheduler, stop_all_clients, STOP_OK)
+from .steam.startup_scheduler import StartupScheduler
+from .steam.active_accounts import active_accounts
+
+logger = logging.getLogger(__name__)
+
+# Общий запуск и остановка сервисов для Telegram бота и фонового режима без Telegram
+
+async def start_services(config_manager, on_config_change):
+    """Открыть кэши, хранилище состояния, метрики и пул сессий; вернуть фоновые задачи"""
+    credential_cache.open(*config_manager.get_credential_cache_paths())
+    cm_directory.open(*config_manager.get_cm_settings())
+    state_storage.open(config_manager.get_storage_settings())
+    await active_accounts.open(state_storage, session_store)
+    database, flush_interval = config_manager.get_playtime_settings()
+    if database:
+        playtime_tracker.open(database, flush_interval, session_store)
+    metrics_host, metrics_port = config_manager.get_metrics_settings()
+    if metrics_port:
+        await metrics.start(metrics_host, metrics_port)
+    route_pool.configure(config_manager.get_route_settings())
+    boost_settings = config_manager.get_boost_settings()
+    boost_scheduler.open(boost_settings, config_manager.get_accounts_from_config(), session_store, session_pool,
+                         playtime_tracker)
+    session_pool.start(
+        config_manager.get_steam_workers(),
+        config_manager.get_login_timeout(),
+        config_manager.get_reconnect_max_delay(),
+        config_manager.get_steam_processes()
+    )
+    tasks = [asyncio.create_task(boost_scheduler.run())]
+
+    async def on_change(diff):
+        nonlocal boost_settings
+        await on_config_change(diff)
+        settings = config_manager.get_boost_settings()
+        if settings != boost_settings:
+            # Поменялись расписания или цели: пересчитываем планы всех сессий
+            boost_settings = settings
+            boost_scheduler.configure(settings)
+            boost_scheduler.reschedule()
+
+    if config_manager.get_reload_interval() > 0:
+        # Изменения config.ini применяются без перезапуска
+        watcher = ConfigWatcher(config_manager, on_change, config_manager.get_reload_interval())
+        tasks.append(asyncio.create_task(watcher.run()))
+    return tasks
+
+async def stop_services(config_manager, tasks=()):
+    """Остановить фоновые задачи и корректно выйти из Steam всеми аккаунтами"""
+    for task in tasks:
+        task.cancel()
+    # Остановка при выключении не должна стирать список запущенных аккаунтов
+    await active_accounts.close()
+    boost_scheduler.close()
+    report = await stop_all_clients(config_manager.get_shutdown_timeout(), forget=False)
+    for account_name, outcome in report.items():
+        if outcome != STOP_OK:
+            logger.warning(f"Аккаунт {account_name} не остановлен корректно: {outcome}")
+    session_pool.close()
+    cm_directory.close()
+    credential_cache.close()
+    playtime_tracker.close()
+    await metrics.stop()
+    await state_storage.close()
+    return report
+
+# Массовый запуск аккаунтов с ограничением скорости
+async def start_all_accounts(config_manager, progress=None, accounts=None):
+    """Запустить все аккаунты из конфигурации (или из подмножества accounts) через планировщик"""
+    accounts = config_manager.get_startup_accounts(accounts if accounts is not None else config_manager.get_accounts_from_config())
+    scheduler = StartupScheduler(**config_manager.get_startup_settings())
+    return await scheduler.run(accounts, progress)
+
+# Восстановление после перезапуска
+async def resume_accounts(config_manager, progress=None):
+    """Снова запустить аккаунты, работавшие до перезапуска; None, если запускать нечего"""
+    if not config_manager.get_storage_settings()['resume']:
+        return None
+    accounts = config_manager.get_accounts_from_config()
+    resume = {}
+    for account_name in active_accounts.restored:
+        if account_name in accounts:
+            resume[account_name] = accounts[account_name]
+        else:
+            active_accounts.forget(account_name)
+    if not resume:
+        return None
+    logger.info(f"Восстановление {len(resume)} аккаунтов после перезапуска")
+    # Запросы Steam Guard кода уходят тем же пользователям, что запускали аккаунт
+    users = {name: active_accounts.restored[name]['user_id'] for name in resume}
+    scheduler = StartupScheduler(**config_manager.get_startup_settings())
+    return await scheduler.run(resume, progress, users)
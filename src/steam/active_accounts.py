@@ -0,0 +1,81 @@
+import asyncio
+import json
+import logging
+from .session_store import SessionState
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = 'active_accounts'
+
+# Состояния, в которых аккаунт считается запущенным пользователем
+RUNNING_STATES = (SessionState.ACTIVE, SessionState.AWAITING_GUARD)
+
+# Журнал аккаунтов, которые должны работать
+# Слушает переходы SessionStore и хранит аккаунты в StateStorage, чтобы после
+# перезапуска снова запустить те, что работали (или ждали Steam Guard код).
+# Убирает аккаунт из журнала только явная остановка (forget из stop_steam_client
+# и stop_all_clients); неудачный вход, обрыв и остановка при выключении - нет
+class ActiveAccounts:
+    def __init__(self):
+        self.restored = {}  # аккаунты, работавшие до перезапуска: имя -> {'user_id': ...}
+        self._accounts = {}
+        self._storage = None
+        self._store = None
+        self._queue = None
+        self._writer = None
+
+    @property
+    def enabled(self):
+        return self._storage is not None
+
+    async def open(self, storage, store):
+        """Загрузить журнал и начать записывать переходы store"""
+        self._storage = storage
+        self._store = store
+        self.restored = {name: json.loads(value) for name, value in (await storage.items(NAMESPACE)).items()}
+        self._accounts = dict(self.restored)
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._write_loop())
+        store.subscribe(self.on_state_change, asyncio.get_running_loop())
+        if self.restored:
+            logger.info(f"До перезапуска работало аккаунтов: {len(self.restored)}")
+
+    async def close(self):
+        """Перестать записывать переходы (до остановки сессий) и дописать очередь"""
+        if not self.enabled:
+            return
+        self._store.unsubscribe(self.on_state_change)
+        self._queue.put_nowait(None)
+        await self._writer
+        self._storage = None
+
+    def forget(self, account_name):
+        """Убрать аккаунт из журнала (например, удаленный из конфигурации)"""
+        if self._accounts.pop(account_name, None) is not None:
+            self._queue.put_nowait((account_name, None))
+
+    # Переходы состояний (доставляются в asyncio цикл)
+    def on_state_change(self, account_name, old_state, new_state):
+        if new_state in RUNNING_STATES:
+            record = self._store.get(account_name)
+            entry = {'user_id': record.user_id if record else None}
+            if self._accounts.get(account_name) != entry:
+                self._accounts[account_name] = entry
+                self._queue.put_nowait((account_name, entry))
+
+    async def _write_loop(self):
+        # Записи идут строго по очереди, чтобы запуск и остановка не поменялись местами
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            account_name, entry = item
+            try:
+                if entry is None:
+                    await self._storage.delete(NAMESPACE, account_name)
+                else:
+                    await self._storage.set(NAMESPACE, account_name, json.dumps(entry))
+            except Exception as e:
+                logger.error(f"Не удалось сохранить состояние аккаунта {account_name}: {e}")
+
+active_accounts = ActiveAccounts()
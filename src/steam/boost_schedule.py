@@ -0,0 +1,280 @@
+import asyncio
+import bisect
+import heapq
+import itertools
+import logging
+import time
+import zlib
+from .session_store import SessionState
+
+logger = logging.getLogger(__name__)
+
+# Steam засчитывает не больше 32 игр одновременно
+STEAM_MAX_GAMES = 32
+# Остаток цели (секунды), при котором игра считается выполненной
+BUDGET_EPSILON = 1.0
+# Самый долгий сон планировщика: после перевода часов план не уедет дальше этого (секунды)
+MAX_SLEEP = 300
+# Самое частое изменение плана одного аккаунта (секунды)
+MIN_STEP = 1.0
+
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+WEEK_MINUTES = 7 * 24 * 60
+
+def _parse_time(value):
+    hours, _, minutes = value.partition(':')
+    minute = int(hours) * 60 + int(minutes or 0)
+    if not 0 <= minute <= 24 * 60:
+        raise ValueError(f"Неверное время: {value}")
+    return minute
+
+def _parse_days(value):
+    if value == '*':
+        return list(range(7))
+    days = []
+    for part in value.split(','):
+        first, _, last = part.strip().partition('-')
+        last = last or first
+        if first not in DAYS or last not in DAYS:
+            raise ValueError(f"Неизвестный день: {part.strip()}")
+        start, end = DAYS.index(first), DAYS.index(last)
+        days.extend((start + offset) % 7 for offset in range((end - start) % 7 + 1))
+    return days
+
+# Недельное расписание окон накрутки: "mon-fri 18:00-23:00; sat,sun 10:00-02:00"
+# Окно, которое кончается раньше начала, переходит через полночь
+class Schedule:
+    def __init__(self, spec):
+        self.spec = spec
+        intervals = []
+        for window in spec.split(';'):
+            window = window.strip().lower()
+            if not window:
+                continue
+            try:
+                days, hours = window.split()
+                start, end = (_parse_time(value) for value in hours.split('-'))
+                days = _parse_days(days)
+            except ValueError as e:
+                raise ValueError(f"Неверное окно расписания {window!r}: {e}")
+            if end <= start:
+                end += 24 * 60
+            for day in days:
+                begin = day * 24 * 60 + start
+                finish = day * 24 * 60 + end
+                if finish > WEEK_MINUTES:
+                    # Окно воскресенья, уходящее в понедельник
+                    intervals.append((begin, WEEK_MINUTES))
+                    intervals.append((0, finish - WEEK_MINUTES))
+                else:
+                    intervals.append((begin, finish))
+        if not intervals:
+            raise ValueError(f"Пустое расписание: {spec!r}")
+        # Сливаем пересекающиеся окна; границы - минуты от начала недели
+        merged = []
+        for begin, finish in sorted(intervals):
+            if merged and begin <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], finish)
+            else:
+                merged.append([begin, finish])
+        self.starts = [begin for begin, _ in merged]
+        self.ends = [finish for _, finish in merged]
+
+    def state_at(self, now):
+        """Открыто ли окно в момент now и когда это изменится (time.time())"""
+        local = time.localtime(now)
+        minute = local.tm_wday * 24 * 60 + local.tm_hour * 60 + local.tm_min + local.tm_sec / 60
+        index = bisect.bisect_right(self.starts, minute) - 1
+        if index >= 0 and minute < self.ends[index]:
+            active, boundary = True, self.ends[index]
+            if boundary == WEEK_MINUTES and self.starts[0] == 0:
+                # Окно продолжается после полуночи понедельника
+                boundary = WEEK_MINUTES + self.ends[0]
+        elif index + 1 < len(self.starts):
+            active, boundary = False, self.starts[index + 1]
+        else:
+            active, boundary = False, WEEK_MINUTES + self.starts[0]
+        if active and boundary - minute >= WEEK_MINUTES:
+            return True, None  # круглосуточно
+        return active, now + (boundary - minute) * 60
+
+def parse_targets(spec):
+    """'730:100, 570:50' -> {730: 100.0, 570: 50.0} (часы)"""
+    targets = {}
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        app_id, _, hours = part.partition(':')
+        targets[int(app_id)] = float(hours)
+    return targets
+
+# Планировщик накрутки: окна по расписанию, смена партий игр и цели по часам
+# Все аккаунты делят одну кучу событий и одну задачу asyncio: в куче лежит только
+# ближайшее изменение плана каждого аккаунта, поэтому тысячи расписаний не будят
+# цикл чаще, чем меняются их планы. План - чистая функция времени, настроек и
+# накопленных часов, его можно посчитать и в потоке воркера при входе
+class BoostScheduler:
+    def __init__(self):
+        self.batch_size = STEAM_MAX_GAMES
+        self.interval = 3600
+        self.stats = {'plans': 0, 'updates': 0}
+        self._schedules = {}
+        self._targets = {}
+        self._accounts = None
+        self._store = None
+        self._pool = None
+        self._tracker = None
+        self._heap = []  # (время, номер, аккаунт); устаревшие записи пропускаются
+        self._due = {}  # аккаунт -> время его актуальной записи в куче
+        self._counter = itertools.count()
+        self._wakeup = None
+
+    @property
+    def enabled(self):
+        return self._store is not None
+
+    def configure(self, settings):
+        """Задать расписания, цели и партии из ConfigManager.get_boost_settings()"""
+        schedules = {}
+        for account_name, spec in settings['schedules'].items():
+            try:
+                schedules[account_name] = Schedule(spec)
+            except ValueError as e:
+                logger.error(f"Расписание {account_name} пропущено: {e}")
+        targets = {}
+        for account_name, spec in settings['targets'].items():
+            try:
+                targets[account_name] = parse_targets(spec)
+            except ValueError as e:
+                logger.error(f"Цели по часам {account_name} пропущены: {e}")
+        self._schedules = schedules
+        self._targets = targets
+        self.batch_size = max(1, min(settings['batch_size'], STEAM_MAX_GAMES))
+        self.interval = settings['interval']
+
+    def open(self, settings, accounts, store, pool, tracker):
+        """Начать планирование сессий store (вызывается в asyncio цикле)"""
+        self.configure(settings)
+        self._accounts = accounts
+        self._store = store
+        self._pool = pool
+        self._tracker = tracker
+        self._wakeup = asyncio.Event()
+        if self._targets and not tracker.enabled:
+            logger.warning("Цели по часам заданы, но учет времени ([stats] database) выключен: цели не проверяются")
+        store.subscribe(self.on_state_change, asyncio.get_running_loop())
+
+    def close(self):
+        if self.enabled:
+            self._store.unsubscribe(self.on_state_change)
+
+    def plan(self, account_name, games, now):
+        """Игры аккаунта на момент now и время следующего изменения плана (или None)"""
+        next_change = []
+        schedule = self._schedules.get(account_name, self._schedules.get('*'))
+        if schedule is not None:
+            active, boundary = schedule.state_at(now)
+            if boundary is not None:
+                next_change.append(boundary)
+            if not active:
+                return (), min(next_change, default=None)
+
+        games = list(games)
+        targets = self._targets.get(account_name, self._targets.get('*'))
+        remaining = {}
+        if targets and self._tracker is not None and self._tracker.enabled:
+            played = self._tracker.summary(account_name)['game_hours']
+            for app_id in games:
+                if app_id in targets:
+                    remaining[app_id] = (targets[app_id] - played.get(app_id, 0.0)) * 3600
+            games = [app_id for app_id in games if remaining.get(app_id, BUDGET_EPSILON) >= BUDGET_EPSILON]
+
+        if len(games) > self.batch_size:
+            # Партии сменяются по часам, а не от входа: план одинаков после перезапуска.
+            # Сдвиг по имени разводит смены аккаунтов по всему интервалу
+            slot = 0
+            if self.interval > 0:
+                shift = zlib.crc32(account_name.encode('utf-8')) % int(self.interval * 1000) / 1000
+                slot = int((now + shift) // self.interval)
+                next_change.append((slot + 1) * self.interval - shift)
+            start = slot * self.batch_size % len(games)
+            games = [games[(start + offset) % len(games)] for offset in range(self.batch_size)]
+        # Часы идут только у играющих игр: ближайшая выполненная цель меняет план
+        budgets = [remaining[app_id] for app_id in games if app_id in remaining]
+        if budgets:
+            next_change.append(now + min(budgets))
+        return tuple(games), min(next_change, default=None)
+
+    def games_for(self, account_name, games):
+        """Список игр для games_played при входе (в потоке воркера)"""
+        if not self.enabled:
+            return list(games)
+        return list(self.plan(account_name, games, time.time())[0])
+
+    # Переходы состояний (доставляются в asyncio цикл)
+    def on_state_change(self, account_name, old_state, new_state):
+        if new_state is SessionState.ACTIVE:
+            self._apply(account_name, time.time())
+        elif new_state is SessionState.IDLE:
+            self._due.pop(account_name, None)
+
+    def reschedule(self, account_name=None):
+        """Пересчитать план аккаунта (или всех активных) после изменения конфигурации"""
+        names = [account_name] if account_name else list(self._store.snapshot())
+        now = time.time()
+        for name in names:
+            self._apply(name, now)
+
+    def _apply(self, account_name, now):
+        record = self._store.get(account_name)
+        account = self._accounts.get(account_name)
+        if record is None or record.state is not SessionState.ACTIVE or account is None:
+            # Пересчитаем, когда сессия снова станет активной
+            self._due.pop(account_name, None)
+            return
+        games, next_change = self.plan(account_name, account['games'], now)
+        self.stats['plans'] += 1
+        if record.games is None or tuple(record.games) != games:
+            self._pool.update_games(account_name, games)
+            self.stats['updates'] += 1
+        if next_change is None:
+            self._due.pop(account_name, None)
+        else:
+            # Округление на границе интервала не должно зациклить run_due
+            self._push(account_name, max(next_change, now + MIN_STEP))
+
+    def _push(self, account_name, due):
+        self._due[account_name] = due
+        heapq.heappush(self._heap, (due, next(self._counter), account_name))
+        if self._heap[0][0] == due:
+            self._wakeup.set()
+        if len(self._heap) > 2 * len(self._due) + 64:
+            # Слишком много устаревших записей: пересобираем кучу
+            self._heap = [(due, next(self._counter), name) for name, due in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def run_due(self, now):
+        """Применить наступившие изменения планов; вернуть время следующего"""
+        while self._heap and self._heap[0][0] <= now:
+            due, _, account_name = heapq.heappop(self._heap)
+            if self._due.get(account_name) == due:
+                del self._due[account_name]
+                self._apply(account_name, now)
+        return self._heap[0][0] if self._heap else None
+
+    async def run(self):
+        """Единственный таймер всех расписаний"""
+        while True:
+            now = time.time()
+            next_due = self.run_due(now)
+            delay = MAX_SLEEP if next_due is None else min(max(0.0, next_due - now), MAX_SLEEP)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def scheduled(self):
+        """Число аккаунтов с запланированным изменением"""
+        return len(self._due)
@@ -0,0 +1,339 @@
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import gevent
+from steam.core.cm import CMServerList
+from ..metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Сколько сервер после неудачного подключения предлагается последним (секунды)
+BAD_TIMEOUT = 300
+# Пауза между попытками обновить список, если Steam не отдал его (секунды)
+REFRESH_RETRY = 60
+# Как часто клиент без списка проверяет, не получил ли его другой клиент (секунды)
+REFRESH_POLL = 0.05
+# Вес последней попытки в скользящих средних задержки и доли неудач
+EWMA_WEIGHT = 0.3
+# Во сколько раз доля неудач 1.0 ухудшает оценку сервера
+FAILURE_PENALTY = 10
+# Задержка серверов без замеров, пока замеров нет ни у кого (секунды)
+DEFAULT_LATENCY = 0.1
+
+connect_seconds = metrics.histogram('hourbooster_cm_connect_seconds', "Время подключения к CM серверу Steam")
+connect_failures_total = metrics.counter('hourbooster_cm_connect_failures_total', "Неудачные подключения к CM серверам")
+
+# Замеры по одному CM серверу
+class CMServer:
+    __slots__ = ('addr', 'latency', 'failure_rate', 'bad_until', 'sessions')
+
+    def __init__(self, addr, latency=None, failure_rate=0.0):
+        self.addr = addr
+        self.latency = latency  # скользящее среднее времени подключения, None - не замерялось
+        self.failure_rate = failure_rate
+        self.bad_until = 0.0
+        self.sessions = 0  # подключенные и подключающиеся клиенты
+
+    def score(self, median_latency, mean_sessions):
+        """Чем меньше, тем лучше: задержка с поправкой на неудачи и загрузку
+        Серверы быстрее медианы считаются одинаково быстрыми, и между ними решает
+        загрузка (относительно средней), чтобы сессии не копились на самом быстром"""
+        latency = max(self.latency, median_latency) if self.latency is not None else median_latency
+        return latency * (1 + self.failure_rate * FAILURE_PENALTY) * (1 + self.sessions / (mean_sessions + 1))
+
+# Общий для всех сессий справочник CM серверов
+# Список запрашивается у Steam один раз на ttl и хранится на диске вместе с замерами,
+# поэтому массовый запуск и переподключения не ходят каждый раз в WebAPI.
+# Серверы выдаются по оценке: сначала быстрые и надежные, недавно отказавшие - последними
+class CMDirectory:
+    def __init__(self):
+        self.path = None
+        self.ttl = 86400
+        self.updated = 0.0  # время последнего обновления списка (time.time())
+        self.cell_id = 0
+        self.stats = {'refreshes': 0, 'connects': 0, 'failures': 0}
+        self._servers = {}  # (ip, port) -> CMServer
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def settings(self):
+        """Параметры для процессов шардов"""
+        return self.path, self.ttl
+
+    def open(self, path, ttl):
+        """Загрузить список серверов и замеры с диска (пустой path - без файла)"""
+        self.path = path or None
+        self.ttl = ttl
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            servers = {(ip, port): CMServer((ip, port), latency, failure_rate)
+                       for ip, port, latency, failure_rate in data['servers']}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Не удалось прочитать кэш CM серверов: {e}")
+            return
+        with self._lock:
+            self._servers = servers
+            self.updated = data.get('updated', 0.0)
+            self.cell_id = data.get('cell_id', 0)
+        logger.info(f"Загружен кэш CM серверов: {len(servers)}, "
+                    f"{'актуален' if self.fresh else 'устарел'}")
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                'updated': self.updated,
+                'cell_id': self.cell_id,
+                'servers': [[*server.addr, server.latency, server.failure_rate] for server in self._servers.values()]
+            }
+        # Пишем во временный файл рядом и атомарно подменяем (файл могут писать процессы шардов)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.cm_servers-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить кэш CM серверов: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def close(self):
+        """Сохранить замеры на диск"""
+        if self._servers:
+            self._save()
+
+    def __len__(self):
+        return len(self._servers)
+
+    @property
+    def fresh(self):
+        return bool(self._servers) and time.time() < max(self.updated + self.ttl, self._retry_at)
+
+    def refresh(self):
+        """Обновить устаревший список у Steam; вернуть, есть ли серверы"""
+        if self.fresh:
+            return True
+        # Пока один клиент обновляет список, остальные подключаются по старому, а без списка ждут.
+        # Обычная блокировка остановила бы весь gevent хаб воркера вместе с обновляющим гринлетом
+        while not self._refresh_lock.acquire(blocking=False):
+            if self._servers:
+                return True
+            gevent.sleep(REFRESH_POLL)
+        try:
+            if self.fresh:
+                return True
+            # Без серверов CMClient.connect повторяет запрос без пауз: ждем срока повторной попытки
+            delay = self._retry_at - time.time()
+            if not self._servers and delay > 0:
+                gevent.sleep(delay)
+            servers = self._fetch()
+            if servers:
+                self.merge(servers)
+                self.stats['refreshes'] += 1
+                logger.info(f"Получен список CM серверов: {len(servers)}")
+            else:
+                self._retry_at = time.time() + REFRESH_RETRY
+            return bool(self._servers)
+        finally:
+            self._refresh_lock.release()
+
+    def _fetch(self):
+        """Запросить список у Steam: WebAPI, при ошибке DNS"""
+        servers = CMServerList()
+        if not servers.bootstrap_from_webapi(self.cell_id) and not servers.bootstrap_from_dns():
+            return []
+        return list(servers.list)
+
+    def merge(self, addresses):
+        """Заменить список серверов, сохранив замеры тех, что в нем остались"""
+        with self._lock:
+            self._servers = {addr: self._servers.get(addr) or CMServer(addr) for addr in map(tuple, addresses)}
+            self.updated = time.time()
+        self._save()
+
+    def offer(self, addresses):
+        """Список, присланный CM сервером после входа: принимаем, только если свой устарел"""
+        if not self.fresh:
+            self.merge(addresses)
+
+    def ranked(self):
+        """Адреса серверов от лучшего к худшему"""
+        now = time.monotonic()
+        with self._lock:
+            servers = list(self._servers.values())
+            latencies = [server.latency for server in servers if server.latency is not None]
+            median_latency = statistics.median(latencies) if latencies else DEFAULT_LATENCY
+            mean_sessions = sum(server.sessions for server in servers) / len(servers) if servers else 0
+            # Серверы без замеров получают медиану, равные оценки - случайный порядок
+            keyed = [(server.bad_until > now, server.score(median_latency, mean_sessions), random.random(), server.addr)
+                     for server in servers]
+        keyed.sort()
+        return [addr for *_, addr in keyed]
+
+    def attempt(self, addr):
+        """Клиент начинает подключение: считаем его загрузкой сервера сразу,
+        иначе при шторме переподключений все выберут один и тот же сервер"""
+        with self._lock:
+            server = self._servers.get(addr)
+            if server is not None:
+                server.sessions += 1
+
+    def record_success(self, addr, latency):
+        with self._lock:
+            self.stats['connects'] += 1
+            server = self._servers.get(addr)
+            if server is None:
+                return
+            server.latency = latency if server.latency is None else \
+                server.latency + EWMA_WEIGHT * (latency - server.latency)
+            server.failure_rate *= 1 - EWMA_WEIGHT
+        if metrics.enabled:
+            connect_seconds.observe(latency)
+
+    def record_failure(self, addr):
+        with self._lock:
+            self.stats['failures'] += 1
+            server = self._servers.get(addr)
+            if server is None:
+                return
+            server.failure_rate += EWMA_WEIGHT * (1 - server.failure_rate)
+            server.bad_until = time.monotonic() + BAD_TIMEOUT
+        if metrics.enabled:
+            connect_failures_total.inc()
+
+    def attempt_failed(self, addr):
+        self.record_failure(addr)
+        self.session_closed(addr)
+
+    def session_closed(self, addr):
+        with self._lock:
+            server = self._servers.get(addr)
+            if server is not None and server.sessions > 0:
+                server.sessions -= 1
+
+    def load(self):
+        """Число сессий на серверах, где они есть"""
+        with self._lock:
+            return {server.addr: server.sessions for server in self._servers.values() if server.sessions}
+
+    def attach(self, client):
+        """Подключать клиента к серверам из справочника"""
+        client.cm_servers = CMServerView(self, client)
+
+# Список CM серверов одного клиента поверх общего справочника
+# CMClient.connect перебирает адреса бесконечным итератором: если клиент просит следующий
+# адрес, предыдущий не подключился; успех отмечает событие EVENT_CONNECTED. Перебор,
+# закрытый без соединения, значит, что подключение прервано остановкой сессии
+class CMServerView(CMServerList):
+    def __init__(self, directory, client):
+        super().__init__()
+        self.directory = directory
+        self._client = client
+        self._connected = None  # адрес текущего соединения
+        self._attempt = None  # (адрес, начало) подключения, исход которого еще не известен
+        client.on(client.EVENT_CONNECTED, self._on_connected)
+        client.on(client.EVENT_DISCONNECTED, self._on_disconnected)
+
+    def __len__(self):
+        return len(self.directory)
+
+    @property
+    def last_updated(self):
+        return int(self.directory.updated)
+
+    @last_updated.setter
+    def last_updated(self, value):
+        pass  # время обновления ведет справочник
+
+    @property
+    def cell_id(self):
+        return self.directory.cell_id
+
+    @cell_id.setter
+    def cell_id(self, value):
+        if value:
+            self.directory.cell_id = value
+
+    def __iter__(self):
+        def ranked_iter():
+            # Новое подключение: прошлое соединение точно закончилось, даже если событие еще в пути
+            self._on_disconnected()
+            self._settle(None)
+            self.directory.refresh()
+            tried = set()
+            try:
+                while True:
+                    # Оценки меняются, пока клиент ждет (отказы у других клиентов), поэтому
+                    # выбираем заново перед каждой попыткой, не повторяясь в пределах прохода
+                    server_addr = next((addr for addr in self.directory.ranked() if addr not in tried), None)
+                    if server_addr is None:
+                        if not tried:
+                            return
+                        tried.clear()
+                        continue
+                    tried.add(server_addr)
+                    self.directory.attempt(server_addr)
+                    self._attempt = (server_addr, time.monotonic())
+                    yield server_addr
+                    self._settle(False)
+            finally:
+                # Соединение установлено: исход отметит EVENT_CONNECTED
+                if self._attempt is not None and self._client.connection.server_addr != self._attempt[0]:
+                    self._settle(None)
+        return ranked_iter()
+
+    def _settle(self, connected):
+        """Исход текущей попытки: True - подключились, False - отказ, None - подключение прервано"""
+        attempt, self._attempt = self._attempt, None
+        if attempt is None:
+            return
+        server_addr, started = attempt
+        if connected:
+            self._connected = server_addr
+            self.directory.record_success(server_addr, time.monotonic() - started)
+        elif connected is False:
+            self.directory.attempt_failed(server_addr)
+        else:
+            self.directory.session_closed(server_addr)
+
+    def _on_connected(self, *args):
+        self._settle(True)
+
+    def _on_disconnected(self, *args):
+        if self._connected is not None and not self._client.connected:
+            self.directory.session_closed(self._connected)
+            self._connected = None
+
+    # Список общий: клиенты не очищают его и не сбрасывают отметки
+    def bootstrap_from_webapi(self, cell_id=0):
+        return self.directory.refresh()
+
+    def bootstrap_from_dns(self):
+        return self.directory.refresh()
+
+    def clear(self):
+        pass
+
+    def merge_list(self, new_list):
+        self.directory.offer(list(new_list))
+
+    def reset_all(self):
+        pass
+
+    def mark_good(self, server_addr):
+        pass
+
+    def mark_bad(self, server_addr):
+        self.directory.record_failure(server_addr)
@@ -0,0 +1,219 @@
+import base64
+import json
+import logging
+import os
+import tempfile
+import threading
+from Cryptodome.Cipher import AES
+from Cryptodome.Random import get_random_bytes
+from ..metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: кэш пишет только один процесс
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+NONCE_SIZE = 12
+TAG_SIZE = 16
+KEY_SIZE = 32
+# Как часто поток записи сохраняет накопленные изменения (секунды)
+FLUSH_INTERVAL = 1.0
+
+lookups_total = metrics.counter('hourbooster_credential_cache_lookups_total',
+                                "Поиски сохраненного login key перед входом по результату", ['result'])
+invalidated_total = metrics.counter('hourbooster_credential_cache_invalidated_total',
+                                    "Сохраненные login key, отклоненные Steam")
+
+# Зашифрованный кэш login key и sentry данных аккаунтов
+# Позволяет после перезапуска входить без повторного ввода Steam Guard кода.
+# Изменения только помечаются, а файл переписывает отдельный поток раз в FLUSH_INTERVAL
+# секунд: шифрование и fsync не останавливают gevent хабы воркеров
+class CredentialCache:
+    def __init__(self):
+        self.path = None
+        self.key_file = None
+        self.stats = {'hits': 0, 'misses': 0, 'invalidated': 0, 'writes': 0}
+        self._key = None
+        self._entries = {}
+        self._dirty = set()  # аккаунты, измененные этим процессом с последнего сохранения
+        self._lock = threading.Lock()
+        self._writer = None
+        self._closing = threading.Event()
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def open(self, path, key_file):
+        """Загрузить кэш с диска, создав ключ шифрования при первом запуске"""
+        self.path = path
+        self.key_file = key_file
+        self._key = self._load_key(key_file)
+        self._entries = self._read()
+        if self._entries:
+            logger.info(f"Загружен кэш учетных данных: {len(self._entries)} аккаунтов")
+        self._writer = threading.Thread(target=self._write_loop, name='credential-cache-writer', daemon=True)
+        self._writer.start()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'rb') as f:
+                blob = f.read()
+            nonce, tag, ciphertext = blob[:NONCE_SIZE], blob[NONCE_SIZE:NONCE_SIZE + TAG_SIZE], blob[NONCE_SIZE + TAG_SIZE:]
+            cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce)
+            return json.loads(cipher.decrypt_and_verify(ciphertext, tag))
+        except (ValueError, KeyError) as e:
+            # Поврежденный файл или чужой ключ: начинаем с пустого кэша
+            logger.error(f"Не удалось расшифровать кэш учетных данных: {e}")
+            return {}
+
+    def _load_key(self, key_file):
+        if os.path.exists(key_file):
+            with open(key_file, 'rb') as f:
+                key = f.read()
+            if len(key) == KEY_SIZE:
+                return key
+            logger.error("Ключ кэша учетных данных поврежден, создаем новый")
+        key = get_random_bytes(KEY_SIZE)
+        os.makedirs(os.path.dirname(os.path.abspath(key_file)), mode=0o700, exist_ok=True)
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        return key
+
+    # Поток записи
+    def _write_loop(self):
+        while not self._closing.wait(FLUSH_INTERVAL):
+            self.flush()
+
+    def flush(self):
+        """Сохранить накопленные изменения одной записью файла"""
+        with self._lock:
+            if not self._dirty:
+                return
+            # Копии записей: вызывающие потоки меняют их, пока файл шифруется
+            changes = {account_name: dict(self._entries[account_name]) if account_name in self._entries else None
+                       for account_name in self._dirty}
+            self._dirty = set()
+        self._save(changes)
+        self.stats['writes'] += 1
+
+    def _save(self, changes):
+        # Кэш могут писать несколько процессов (шарды сессий): под файловой блокировкой
+        # перечитываем файл и переносим в него только свои изменения
+        if fcntl is None:
+            with self._lock:
+                entries = {account_name: dict(entry) for account_name, entry in self._entries.items()}
+            self._write(entries)
+            return
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            entries = self._read()
+            for account_name, entry in changes.items():
+                if entry is not None:
+                    entries[account_name] = entry
+                else:
+                    entries.pop(account_name, None)
+            self._write(entries)
+        # Записи других процессов; измененные здесь с начала записи уйдут следующей пачкой
+        with self._lock:
+            for account_name, entry in entries.items():
+                if account_name not in self._dirty:
+                    self._entries[account_name] = entry
+
+    def _write(self, entries):
+        # Пишем во временный файл рядом и атомарно подменяем
+        payload = json.dumps(entries).encode('utf-8')
+        nonce = get_random_bytes(NONCE_SIZE)
+        cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce)
+        ciphertext, tag = cipher.encrypt_and_digest(payload)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.credentials-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(nonce + tag + ciphertext)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить кэш учетных данных: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def _update(self, account_name, field, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._entries.setdefault(account_name, {})
+            if entry.get(field) == value:
+                return
+            entry[field] = value
+            self._dirty.add(account_name)
+
+    def get_login_key(self, account_name):
+        """Получить сохраненный login key аккаунта"""
+        if not self.enabled:
+            return None
+        login_key = self._entries.get(account_name, {}).get('login_key')
+        with self._lock:
+            self.stats['hits' if login_key else 'misses'] += 1
+        if metrics.enabled:
+            lookups_total.inc('hit' if login_key else 'miss')
+        return login_key
+
+    def store_login_key(self, account_name, login_key):
+        """Сохранить новый login key аккаунта"""
+        self._update(account_name, 'login_key', login_key)
+
+    def invalidate(self, account_name):
+        """Удалить login key, который Steam отклонил"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._entries.get(account_name)
+            if not (entry and entry.pop('login_key', None)):
+                return
+            self.stats['invalidated'] += 1
+            self._dirty.add(account_name)
+        if metrics.enabled:
+            invalidated_total.inc()
+        logger.info(f"Сохраненный login key аккаунта {account_name} отклонен Steam и удален")
+
+    def get_sentry(self, account_name):
+        """Получить sentry данные аккаунта"""
+        sentry = self._entries.get(account_name, {}).get('sentry')
+        return base64.b64decode(sentry) if sentry else None
+
+    def store_sentry(self, account_name, sentry_bytes):
+        """Сохранить sentry данные аккаунта"""
+        self._update(account_name, 'sentry', base64.b64encode(sentry_bytes).decode('ascii'))
+        return self.enabled
+
+    def hit_rate(self):
+        """Доля входов, для которых нашелся сохраненный login key"""
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+    def close(self):
+        """Остановить поток записи, сохранить остаток изменений и записать в журнал итоги"""
+        if not self.enabled:
+            return
+        self._closing.set()
+        self._writer.join()
+        self.flush()
+        total = self.stats['hits'] + self.stats['misses']
+        if total:
+            logger.info(f"Кэш учетных данных: login key найден для {self.hit_rate():.0%} входов ({total}), "
+                        f"отклонено Steam: {self.stats['invalidated']}")
+
+    def attach(self, client, account_name):
+        """Подключить кэш к клиенту: sentry и новые login key сохраняются в нем"""
+        if not self.enabled:
+            return
+        client.get_sentry = lambda username: self.get_sentry(account_name)
+        client.store_sentry = lambda username, sentry_bytes: self.store_sentry(account_name, sentry_bytes)
+        client.on(client.EVENT_NEW_LOGIN_KEY, lambda: self.store_login_key(account_name, client.login_key))
@@ -0,0 +1,197 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from .session_store import SessionState
+
+logger = logging.getLogger(__name__)
+
+# Интервалы с app_id 0 - время, когда аккаунт был в Steam, независимо от списка игр
+ACCOUNT_APP_ID = 0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS intervals (account TEXT NOT NULL, app_id INTEGER NOT NULL, started REAL NOT NULL, ended REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS sessions (account TEXT NOT NULL, started REAL NOT NULL, ended REAL NOT NULL, disconnects INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS intervals_account ON intervals (account, app_id);
+CREATE INDEX IF NOT EXISTS sessions_account ON sessions (account);
+"""
+
+# Учет накрученного времени по аккаунтам и играм
+# Слушает переходы SessionStore, итоги держит в памяти, а завершенные интервалы
+# пишет в SQLite отдельным потоком пачками раз в flush_interval секунд
+class PlaytimeTracker:
+    def __init__(self):
+        self.path = None
+        self.flush_interval = 5.0
+        self.stats = {'rows_written': 0, 'batches': 0}
+        self._totals = {}  # account -> {'online', 'session', 'disconnects', 'games': {app_id: секунды}}
+        self._open_sessions = {}  # account -> [первый вход, обрывы]
+        self._open_games = {}  # account -> (начало интервала, игры)
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self._store = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def open(self, path, flush_interval=5.0, store=None):
+        """Загрузить накопленные итоги и начать учет переходов store"""
+        self.path = path
+        self.flush_interval = flush_interval
+        db = sqlite3.connect(path)
+        try:
+            db.executescript(SCHEMA)
+            for account, app_id, seconds in db.execute(
+                    "SELECT account, app_id, SUM(ended - started) FROM intervals GROUP BY account, app_id"):
+                totals = self._account_totals(account)
+                if app_id == ACCOUNT_APP_ID:
+                    totals['online'] += seconds
+                else:
+                    totals['games'][app_id] = seconds
+            for account, seconds, disconnects in db.execute(
+                    "SELECT account, SUM(ended - started), SUM(disconnects) FROM sessions GROUP BY account"):
+                totals = self._account_totals(account)
+                totals['session'] += seconds
+                totals['disconnects'] += disconnects
+        finally:
+            db.close()
+        logger.info(f"Загружена статистика накрутки: {len(self._totals)} аккаунтов")
+
+        self._writer = threading.Thread(target=self._write_loop, name='playtime-writer', daemon=True)
+        self._writer.start()
+        if store is not None:
+            self._store = store
+            store.subscribe(self.on_state_change)
+
+    def close(self):
+        """Закрыть открытые интервалы, дописать очередь и остановить поток записи"""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            for account in list(self._open_games):
+                self._close_games(account, now)
+            for account in list(self._open_sessions):
+                self._close_session(account, now)
+        self._queue.put(None)
+        self._writer.join()
+
+    def _account_totals(self, account):
+        totals = self._totals.get(account)
+        if totals is None:
+            totals = self._totals[account] = {'online': 0.0, 'session': 0.0, 'disconnects': 0, 'games': {}}
+        return totals
+
+    # Переходы состояний (вызывается синхронно в потоке воркера)
+    def on_state_change(self, account_name, old_state, new_state):
+        now = time.time()
+        with self._lock:
+            # Сессия учета длится от первого успешного входа до остановки, включая переподключения
+            if new_state is SessionState.ACTIVE and account_name not in self._open_sessions:
+                self._open_sessions[account_name] = [now, 0]
+            if old_state is SessionState.ACTIVE:
+                self._close_games(account_name, now)
+                if new_state is SessionState.BACKOFF and account_name in self._open_sessions:
+                    self._open_sessions[account_name][1] += 1
+            if new_state is SessionState.ACTIVE:
+                # Подписчик вызывается после записи перехода, так что запись уже актуальна
+                record = self._store.get(account_name) if self._store else None
+                if record and record.games is not None:
+                    games = tuple(record.games)  # список от планировщика накрутки
+                else:
+                    games = tuple(record.account_data['games']) if record and record.account_data else ()
+                self._open_games[account_name] = (now, games)
+            if new_state is SessionState.IDLE:
+                self._close_session(account_name, now)
+
+    def games_changed(self, account_name, games):
+        """Список игр активной сессии поменялся: начать новые интервалы"""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            if account_name in self._open_games:
+                self._close_games(account_name, now)
+                self._open_games[account_name] = (now, tuple(games))
+
+    def _close_games(self, account_name, now):
+        started, games = self._open_games.pop(account_name, (None, ()))
+        if started is None:
+            return
+        seconds = now - started
+        totals = self._account_totals(account_name)
+        totals['online'] += seconds
+        rows = [(account_name, ACCOUNT_APP_ID, started, now)]
+        for app_id in games:
+            totals['games'][app_id] = totals['games'].get(app_id, 0.0) + seconds
+            rows.append((account_name, app_id, started, now))
+        self._queue.put(('intervals', rows))
+
+    def _close_session(self, account_name, now):
+        session = self._open_sessions.pop(account_name, None)
+        if session is None:
+            return
+        started, disconnects = session
+        totals = self._account_totals(account_name)
+        totals['session'] += now - started
+        totals['disconnects'] += disconnects
+        self._queue.put(('sessions', [(account_name, started, now, disconnects)]))
+
+    # Чтение итогов (с учетом еще открытых интервалов)
+    def summary(self, account_name):
+        """Итоги аккаунта: часы онлайн, часы по играм, процент онлайна и число обрывов"""
+        now = time.time()
+        with self._lock:
+            totals = self._totals.get(account_name, {'online': 0.0, 'session': 0.0, 'disconnects': 0, 'games': {}})
+            online, session, disconnects = totals['online'], totals['session'], totals['disconnects']
+            games = dict(totals['games'])
+            started, open_games = self._open_games.get(account_name, (None, ()))
+            if started is not None:
+                online += now - started
+                for app_id in open_games:
+                    games[app_id] = games.get(app_id, 0.0) + now - started
+            if account_name in self._open_sessions:
+                session_started, session_disconnects = self._open_sessions[account_name]
+                session += now - session_started
+                disconnects += session_disconnects
+        return {
+            'online_hours': online / 3600,
+            'game_hours': {app_id: seconds / 3600 for app_id, seconds in games.items()},
+            'uptime_percent': 100.0 * online / session if session > 0 else 0.0,
+            'disconnects': disconnects,
+        }
+
+    # Поток записи
+    def _write_loop(self):
+        db = sqlite3.connect(self.path)
+        running = True
+        try:
+            while running:
+                batch = {'intervals': [], 'sessions': []}
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        running = False
+                        break
+                    batch[item[0]].extend(item[1])
+                if batch['intervals'] or batch['sessions']:
+                    self._write_batch(db, batch)
+        finally:
+            db.close()
+
+    def _write_batch(self, db, batch):
+        try:
+            with db:
+                db.executemany("INSERT INTO intervals VALUES (?, ?, ?, ?)", batch['intervals'])
+                db.executemany("INSERT INTO sessions VALUES (?, ?, ?, ?)", batch['sessions'])
+            self.stats['rows_written'] += len(batch['intervals']) + len(batch['sessions'])
+            self.stats['batches'] += 1
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи статистики накрутки: {e}")
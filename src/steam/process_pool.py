@@ -0,0 +1,290 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from steam.enums import EResult
+from ..metrics import metrics
+from . import steam_manager
+from .session_store import SessionState
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед перезапуском упавшего процесса растет до этого предела (секунды)
+RESTART_MAX_DELAY = 60
+
+# Сколько ждать ответа процесса на остановку сверх таймаута самой остановки (секунды)
+STOP_REPLY_GRACE = 2
+
+# Состояния, которые восстанавливаются после перезапуска упавшего процесса
+RESUME_STATES = (SessionState.ACTIVE, SessionState.BACKOFF, SessionState.CONNECTING)
+
+# Дочерний процесс шарда
+# Внутри работает обычный пул потоков с gevent хабами; команды приходят по каналу,
+# а переходы состояний, исходы команд и наблюдения метрик отправляются обратно кортежами
+def _shard_main(conn, workers, login_timeout, reconnect_max_delay, credential_paths, initializer, route_settings=None,
+                cm_settings=None, forward_metrics=False):
+    # Ctrl+C получает вся группа процессов; выключением управляет родитель через канал
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO)
+    if initializer is not None:
+        initializer()
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            try:
+                conn.send(message)
+            except (OSError, ValueError):
+                pass  # Родитель завершился
+
+    def on_transition(account_name, old_state, new_state):
+        record = steam_manager.session_store.get(account_name)
+        fields = {}
+        if record is not None:
+            fields = {'account_data': record.account_data, 'user_id': record.user_id, 'guard_type': record.guard_type,
+                      'route': record.route, 'games': record.games}
+        send(('state', account_name, new_state.value, fields, steam_manager.session_stats.get(account_name)))
+
+    if forward_metrics:
+        metrics.forward(lambda name, label_values, value: send(('metric', name, label_values, value)))
+    if credential_paths:
+        steam_manager.credential_cache.open(*credential_paths)
+    if route_settings:
+        steam_manager.route_pool.configure(route_settings)
+    if cm_settings:
+        steam_manager.cm_directory.open(*cm_settings)
+    steam_manager.session_store.subscribe(on_transition)
+    pool = steam_manager.session_pool
+    pool.start(workers, login_timeout, reconnect_max_delay)
+
+    def reply_login(request_id):
+        if request_id is None:
+            return None
+        return lambda result: send(('login', request_id, result.status,
+                                    result.eresult.value if result.eresult is not None else None))
+
+    while True:
+        try:
+            command = conn.recv()
+        except (EOFError, OSError):
+            return
+        kind = command[0]
+        if kind == 'login':
+            _, request_id, account_name, account_data, user_id, two_factor_code, auth_code = command
+            pool.start_session(account_name, account_data, user_id, two_factor_code, auth_code, reply_login(request_id))
+        elif kind == 'stop':
+            _, request_id, account_name, timeout = command
+            worker = pool.worker_for(account_name)
+            worker.submit(worker._stop_session, account_name, timeout,
+                          lambda stopped, request_id=request_id: send(('stop', request_id, stopped)))
+        elif kind == 'games':
+            pool.update_games(command[1], command[2])
+        elif kind == 'exit':
+            steam_manager.cm_directory.close()
+            steam_manager.credential_cache.close()
+            return
+
+# Процесс шарда со стороны бота
+class Shard:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        self.alive = False
+
+# Набор процессов, между которыми аккаунты распределяются по crc32 имени
+# Состояния сессий зеркалируются в session_store родителя, поэтому меню, панель
+# и учет времени работают так же, как с потоками в одном процессе
+class ProcessShards:
+    def __init__(self, processes, workers, login_timeout, reconnect_max_delay, credential_paths=None, initializer=None,
+                 route_settings=None, cm_settings=None, forward_metrics=False):
+        self.workers = workers
+        self.login_timeout = login_timeout
+        self.reconnect_max_delay = reconnect_max_delay
+        self.credential_paths = credential_paths
+        self.initializer = initializer
+        self.route_settings = route_settings
+        self.cm_settings = cm_settings
+        self.forward_metrics = forward_metrics
+        self.shards = [Shard(i) for i in range(max(1, processes))]
+        self._context = multiprocessing.get_context('spawn')
+        self._requests = {}  # id запроса -> (future, шард, ответ при падении процесса)
+        self._request_ids = itertools.count()
+        self._loop = None
+        self._closing = False
+
+    def start(self, loop):
+        self._loop = loop
+        for shard in self.shards:
+            self._spawn(shard)
+        logger.info(f"Запущено процессов Steam сессий: {len(self.shards)} (по {self.workers} воркеров)")
+
+    def _spawn(self, shard):
+        parent_conn, child_conn = self._context.Pipe()
+        shard.process = self._context.Process(
+            target=_shard_main, name=f"steam-shard-{shard.index}", daemon=True,
+            args=(child_conn, self.workers, self.login_timeout, self.reconnect_max_delay,
+                  self.credential_paths, self.initializer, self.route_settings, self.cm_settings, self.forward_metrics)
+        )
+        shard.process.start()
+        child_conn.close()
+        shard.conn = parent_conn
+        shard.alive = True
+        self._loop.add_reader(parent_conn.fileno(), self._on_readable, shard)
+        self._loop.add_reader(shard.process.sentinel, self._on_exit, shard)
+
+    def shard_for(self, account_name):
+        return self.shards[steam_manager.shard_index(account_name, len(self.shards))]
+
+    # Сообщения от дочерних процессов
+    def _on_readable(self, shard):
+        try:
+            while shard.conn.poll():
+                self._dispatch(shard, shard.conn.recv())
+        except (EOFError, OSError):
+            self._loop.remove_reader(shard.conn.fileno())
+
+    def _dispatch(self, shard, message):
+        kind = message[0]
+        if kind == 'state':
+            _, account_name, state, fields, stats = message
+            if stats is not None:
+                steam_manager.session_stats[account_name] = stats
+            state = SessionState(state)
+            if state is SessionState.IDLE:
+                steam_manager.session_store.remove(account_name)
+            else:
+                steam_manager.session_store.transition(account_name, state, **fields)
+        elif kind == 'login':
+            _, request_id, status, eresult = message
+            result = steam_manager.LoginResult(status, EResult(eresult) if eresult is not None else None)
+            self._resolve(request_id, result)
+        elif kind == 'stop':
+            self._resolve(message[1], message[2])
+        elif kind == 'metric':
+            _, name, label_values, value = message
+            if metrics.enabled:
+                metrics.record(name, label_values, value)
+
+    def _resolve(self, request_id, value):
+        future, _, _ = self._requests.pop(request_id, (None, None, None))
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def _on_exit(self, shard):
+        self._loop.remove_reader(shard.process.sentinel)
+        self._loop.remove_reader(shard.conn.fileno())
+        # Дочитываем сообщения, отправленные перед завершением
+        self._on_readable(shard)
+        shard.alive = False
+        shard.conn.close()
+        if self._closing:
+            return
+
+        logger.error(f"Процесс Steam сессий {shard.index} завершился с кодом {shard.process.exitcode}")
+        resume = {}
+        for account_name, record in steam_manager.session_store.snapshot().items():
+            if self.shard_for(account_name) is not shard:
+                continue
+            if record.state in RESUME_STATES and record.account_data is not None:
+                resume[account_name] = record.account_data
+            steam_manager.session_store.remove(account_name)
+        for request_id, (_, owner, failure) in list(self._requests.items()):
+            if owner is shard:
+                self._resolve(request_id, failure)
+
+        delay = min(RESTART_MAX_DELAY, 2 ** shard.restarts)
+        shard.restarts += 1
+        self._loop.call_later(delay, self._restart, shard, resume)
+
+    def _restart(self, shard, resume):
+        if self._closing:
+            return
+        self._spawn(shard)
+        logger.info(f"Процесс Steam сессий {shard.index} перезапущен, восстанавливаем {len(resume)} аккаунтов")
+        for account_name, account_data in resume.items():
+            self.start_session(account_name, account_data)
+
+    # Команды
+    def _request(self, shard, command_factory, failure):
+        if not shard.alive:
+            return None
+        future = self._loop.create_future()
+        request_id = next(self._request_ids)
+        self._requests[request_id] = (future, shard, failure)
+        shard.conn.send(command_factory(request_id))
+        return future
+
+    def _forget(self, future):
+        """Забыть запрос, ответа на который больше не ждут"""
+        for request_id, (pending, _, _) in list(self._requests.items()):
+            if pending is future:
+                del self._requests[request_id]
+                return
+
+    def start_session(self, account_name, account_data, user_id=None, two_factor_code=None, auth_code=None):
+        shard = self.shard_for(account_name)
+        if shard.alive:
+            shard.conn.send(('login', None, account_name, account_data, user_id, two_factor_code, auth_code))
+        return shard.index
+
+    async def login(self, account_name, account_data, user_id=None, two_factor_code=None, auth_code=None, timeout=None):
+        shard = self.shard_for(account_name)
+        future = self._request(shard, lambda request_id: (
+            'login', request_id, account_name, account_data, user_id, two_factor_code, auth_code),
+            steam_manager.LoginResult(steam_manager.LOGIN_ERROR, None))
+        if future is None:
+            return steam_manager.LoginResult(steam_manager.LOGIN_ERROR, None)
+        try:
+            return await asyncio.wait_for(future, timeout or self.login_timeout)
+        except asyncio.TimeoutError:
+            self._forget(future)
+            logger.warning(f"Steam не ответил на вход аккаунта {account_name} вовремя")
+            return steam_manager.LoginResult(steam_manager.LOGIN_TIMEOUT, None)
+
+    async def stop_session(self, account_name, timeout=5):
+        shard = self.shard_for(account_name)
+        future = self._request(shard, lambda request_id: ('stop', request_id, account_name, timeout), True)
+        if future is None:
+            steam_manager.session_store.remove(account_name)
+            return True
+        # Зависший процесс не должен держать остановку бесконечно: вызывающий получит TimeoutError
+        try:
+            return await asyncio.wait_for(future, timeout + STOP_REPLY_GRACE)
+        except asyncio.TimeoutError:
+            self._forget(future)
+            logger.warning(f"Процесс Steam сессий {shard.index} не ответил на остановку аккаунта {account_name} вовремя")
+            raise
+
+    def update_games(self, account_name, games):
+        shard = self.shard_for(account_name)
+        if shard.alive:
+            shard.conn.send(('games', account_name, list(games)))
+            steam_manager.session_store.update(account_name, games=tuple(games))
+            steam_manager.playtime_tracker.games_changed(account_name, games)
+
+    def load(self):
+        """Количество сессий в каждом процессе (по зеркалу состояний)"""
+        load = [0] * len(self.shards)
+        for account_name in steam_manager.session_store.snapshot():
+            load[self.shard_for(account_name).index] += 1
+        return load
+
+    def close(self, timeout=5):
+        """Попросить процессы завершиться и дождаться их"""
+        self._closing = True
+        deadline = time.monotonic() + timeout
+        for shard in self.shards:
+            if shard.alive:
+                try:
+                    shard.conn.send(('exit',))
+                except OSError:
+                    pass
+        for shard in self.shards:
+            shard.process.join(max(0, deadline - time.monotonic()))
+            if shard.process.is_alive():
+                shard.process.terminate()
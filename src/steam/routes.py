@@ -0,0 +1,311 @@
+import base64
+import ipaddress
+import logging
+import socket as std_socket
+import struct
+import threading
+import time
+import zlib
+from urllib.parse import urlparse
+from gevent import socket
+from steam.core.connection import TCPConnection
+from .session_store import SessionState
+
+logger = logging.getLogger(__name__)
+
+# Таймаут подключения к прокси и рукопожатия (секунды)
+CONNECT_TIMEOUT = 10
+# Подряд неудачных подключений к прокси, после которых маршрут считается недоступным
+MAX_CONNECT_FAILURES = 3
+
+STRATEGIES = ('least_loaded', 'sticky')
+
+# Прокси или локальный адрес не отвечает: виноват маршрут, а не CM сервер
+class RouteUnavailable(OSError):
+    pass
+
+# Исходящий маршрут к Steam: direct://, bind://адрес, socks5://[логин:пароль@]хост:порт, http://...
+class Route:
+    def __init__(self, name, url):
+        parsed = urlparse(url)
+        self.name = name
+        self.kind = parsed.scheme or 'direct'
+        if self.kind not in ('direct', 'bind', 'socks5', 'http'):
+            raise ValueError(f"Неизвестный тип маршрута {name}: {url}")
+        self.host = parsed.hostname
+        self.port = parsed.port or {'socks5': 1080, 'http': 8080}.get(self.kind)
+        self.username = parsed.username
+        self.password = parsed.password
+        self.sessions = 0
+        self.rate_limits = 0  # подряд ответов Steam об ограничении входов
+        self.connect_failures = 0
+        self.down_until = 0.0  # до этого момента маршрут не выдается (после ограничений Steam)
+        self.reachable = True  # результат последней проверки доступности
+
+    def healthy(self, now):
+        return self.reachable and now >= self.down_until
+
+    def open(self, sock, server_addr):
+        """Подключить сокет к CM серверу через этот маршрут"""
+        if self.kind in ('direct', 'bind'):
+            if self.kind == 'bind':
+                try:
+                    sock.bind((self.host, 0))
+                except OSError as e:
+                    raise RouteUnavailable(e)
+            sock.connect(server_addr)
+            return
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect((self.host, self.port))
+        except OSError as e:
+            raise RouteUnavailable(e)
+        try:
+            if self.kind == 'socks5':
+                self._socks5_handshake(sock, server_addr)
+            else:
+                self._http_handshake(sock, server_addr)
+        except (std_socket.timeout, TimeoutError, ConnectionError) as e:
+            # Прокси завис или оборвал соединение посреди рукопожатия
+            # (socket.timeout до Python 3.10 не подкласс TimeoutError)
+            raise RouteUnavailable(e)
+        sock.settimeout(None)
+
+    def _socks5_handshake(self, sock, server_addr):
+        if self.username:
+            sock.sendall(b'\x05\x02\x00\x02')
+        else:
+            sock.sendall(b'\x05\x01\x00')
+        version, method = _recv_exact(sock, 2)
+        if version != 5 or method == 0xff:
+            raise RouteUnavailable(f"SOCKS5 прокси {self.name} отклонил способ авторизации")
+        if method == 2:
+            username, password = self.username.encode(), (self.password or '').encode()
+            sock.sendall(b'\x01' + bytes([len(username)]) + username + bytes([len(password)]) + password)
+            if _recv_exact(sock, 2)[1] != 0:
+                raise RouteUnavailable(f"SOCKS5 прокси {self.name} не принял логин и пароль")
+
+        host, port = server_addr
+        try:
+            address = b'\x01' + ipaddress.IPv4Address(host).packed
+        except ValueError:
+            address = b'\x03' + bytes([len(host)]) + host.encode()
+        sock.sendall(b'\x05\x01\x00' + address + struct.pack('>H', port))
+        _, reply, _, address_type = _recv_exact(sock, 4)
+        if reply != 0:
+            # Прокси работает, но не смог соединиться с CM сервером
+            raise OSError(f"SOCKS5 прокси {self.name} вернул ошибку {reply}")
+        if address_type == 1:
+            _recv_exact(sock, 4 + 2)
+        elif address_type == 4:
+            _recv_exact(sock, 16 + 2)
+        else:
+            _recv_exact(sock, _recv_exact(sock, 1)[0] + 2)
+
+    def _http_handshake(self, sock, server_addr):
+        target = f"{server_addr[0]}:{server_addr[1]}"
+        request = f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n"
+        if self.username:
+            credentials = base64.b64encode(f"{self.username}:{self.password or ''}".encode()).decode()
+            request += f"Proxy-Authorization: Basic {credentials}\r\n"
+        sock.sendall((request + "\r\n").encode())
+        # Читаем заголовки по байту: CM сервер начинает говорить сразу после них
+        response = b''
+        while not response.endswith(b'\r\n\r\n'):
+            response += _recv_exact(sock, 1)
+            if len(response) > 8192:
+                raise RouteUnavailable(f"HTTP прокси {self.name} прислал слишком длинный ответ")
+        status = response.split(b' ', 2)[1:2]
+        if status == [b'407']:
+            raise RouteUnavailable(f"HTTP прокси {self.name} не принял логин и пароль")
+        if status != [b'200']:
+            raise OSError(f"HTTP прокси {self.name} ответил {response.splitlines()[0].decode(errors='replace')}")
+
+    def probe(self):
+        """Проверить доступность маршрута (в отдельном потоке, обычными сокетами)"""
+        if self.kind == 'direct':
+            return True
+        if self.kind == 'bind':
+            with std_socket.socket(std_socket.AF_INET, std_socket.SOCK_STREAM) as probe:
+                try:
+                    probe.bind((self.host, 0))
+                    return True
+                except OSError:
+                    return False
+        try:
+            std_socket.create_connection((self.host, self.port), CONNECT_TIMEOUT).close()
+            return True
+        except OSError:
+            return False
+
+def _recv_exact(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise RouteUnavailable("Прокси закрыл соединение")
+        data += chunk
+    return data
+
+# Соединение SteamClient, которое выходит в сеть через маршрут аккаунта
+# Маршрут выбирается заново при каждом подключении, так что переподключение
+# после ограничений Steam само уходит на другой маршрут
+class RoutedConnection(TCPConnection):
+    def __init__(self, pool, account_name):
+        super().__init__()
+        self.pool = pool
+        self.account_name = account_name
+        self.route = None
+
+    def _new_socket(self):
+        self.route = self.pool.route_for(self.account_name)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    def _connect(self, server_addr):
+        try:
+            self.route.open(self.socket, server_addr)
+        except RouteUnavailable as e:
+            self.pool.connect_failed(self.route, e)
+            raise
+        self.pool.connect_succeeded(self.route)
+
+# Пул исходящих маршрутов
+# least_loaded - маршрут с наименьшим числом сессий, sticky - аккаунт закреплен за маршрутом
+# (первый выбор по crc32 имени), пока тот исправен. Аккаунты из [route_accounts] получают
+# свой маршрут, пока он исправен. С процессами шардов (steam processes > 0) у каждого
+# процесса свой пул и своя нагрузка
+class RoutePool:
+    def __init__(self):
+        self.settings = None
+        self.routes = []
+        self.strategy = 'least_loaded'
+        self._by_name = {}
+        self._pinned = {}  # аккаунт -> имя маршрута из конфигурации
+        self._assigned = {}  # аккаунт -> маршрут текущей сессии
+        self._lock = threading.Lock()
+        self._health = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self):
+        return bool(self.routes)
+
+    def configure(self, settings):
+        """Задать маршруты из ConfigManager.get_route_settings()"""
+        if not settings['routes']:
+            return
+        if settings['strategy'] not in STRATEGIES:
+            raise ValueError(f"Неизвестная стратегия маршрутов: {settings['strategy']}")
+        self.settings = settings
+        self.strategy = settings['strategy']
+        self.routes = [Route(name, url) for name, url in settings['routes'].items()]
+        self._by_name = {route.name: route for route in self.routes}
+        self._pinned = {account: name for account, name in settings['accounts'].items() if name in self._by_name}
+        logger.info(f"Маршрутов к Steam: {len(self.routes)}, стратегия {self.strategy}")
+
+    def start(self):
+        """Запустить фоновые проверки доступности маршрутов"""
+        if not self.enabled or self._health is not None or not self.settings['health_interval']:
+            return
+        self._health = threading.Thread(target=self._health_loop, name='route-health', daemon=True)
+        self._health.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def attach(self, client, account_name):
+        """Направить соединения клиента через маршруты пула"""
+        if self.enabled:
+            client.connection = RoutedConnection(self, account_name)
+
+    def route_for(self, account_name):
+        """Маршрут для очередного подключения аккаунта (переназначается, если текущий неисправен)"""
+        now = time.monotonic()
+        with self._lock:
+            current = self._assigned.get(account_name)
+            if current is not None and current.healthy(now):
+                return current
+            route = self._choose(account_name, now)
+            if current is not route:
+                if current is not None:
+                    # Переподключение после ограничений Steam или отказа прокси
+                    current.sessions -= 1
+                    logger.warning(f"Аккаунт {account_name} переведен с маршрута {current.name} на {route.name}")
+                route.sessions += 1
+                self._assigned[account_name] = route
+            return route
+
+    def _choose(self, account_name, now):
+        healthy = [route for route in self.routes if route.healthy(now)]
+        if not healthy:
+            # Все маршруты неисправны: берем тот, что раньше всех вернется в строй
+            return min(self.routes, key=lambda route: (not route.reachable, route.down_until))
+        pinned = self._by_name.get(self._pinned.get(account_name))
+        if pinned is not None and pinned in healthy:
+            return pinned
+        if self.strategy == 'sticky':
+            start = zlib.crc32(account_name.encode()) % len(self.routes)
+            for offset in range(len(self.routes)):
+                route = self.routes[(start + offset) % len(self.routes)]
+                if route in healthy:
+                    return route
+        limit = self.settings['max_sessions']
+        candidates = [route for route in healthy if not limit or route.sessions < limit] or healthy
+        return min(candidates, key=lambda route: route.sessions)
+
+    def release(self, account_name):
+        """Сессия аккаунта завершена: освободить место на маршруте"""
+        with self._lock:
+            route = self._assigned.pop(account_name, None)
+            if route is not None:
+                route.sessions -= 1
+
+    def on_state_change(self, account_name, old_state, new_state):
+        """Переход SessionStore (синхронно в потоке воркера): освобождаем маршрут остановленной сессии"""
+        if new_state is SessionState.IDLE:
+            self.release(account_name)
+
+    def route_name(self, account_name):
+        route = self._assigned.get(account_name)
+        return route.name if route else None
+
+    def report(self, account_name, rate_limited):
+        """Исход входа через маршрут аккаунта; после серии ограничений маршрут уходит на паузу"""
+        route = self._assigned.get(account_name)
+        if route is None:
+            return
+        with self._lock:
+            if not rate_limited:
+                route.rate_limits = 0
+                return
+            route.rate_limits += 1
+            if route.rate_limits >= self.settings['max_rate_limits'] and route.down_until <= time.monotonic():
+                route.down_until = time.monotonic() + self.settings['cooldown']
+                route.rate_limits = 0
+                logger.warning(f"Steam ограничивает входы через маршрут {route.name}, "
+                               f"пауза {self.settings['cooldown']:.0f} сек")
+
+    def connect_failed(self, route, error):
+        with self._lock:
+            route.connect_failures += 1
+            if route.connect_failures >= MAX_CONNECT_FAILURES and route.reachable:
+                route.reachable = False
+                logger.warning(f"Маршрут {route.name} недоступен: {error}")
+
+    def connect_succeeded(self, route):
+        route.connect_failures = 0
+
+    def _health_loop(self):
+        while not self._stop.wait(self.settings['health_interval']):
+            for route in self.routes:
+                reachable = route.probe()
+                if reachable != route.reachable:
+                    logger.info(f"Маршрут {route.name} {'снова доступен' if reachable else 'недоступен'}")
+                with self._lock:
+                    route.reachable = reachable
+                    if reachable:
+                        route.connect_failures = 0
+
+    def load(self):
+        """Число сессий на каждом маршруте"""
+        return {route.name: route.sessions for route in self.routes}
@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+# Жизненный цикл сессии аккаунта
+class SessionState(Enum):
+    IDLE = 'idle'
+    CONNECTING = 'connecting'
+    AWAITING_GUARD = 'awaiting_guard'
+    ACTIVE = 'active'
+    BACKOFF = 'backoff'
+    STOPPING = 'stopping'
+
+# Неизменяемая запись о сессии; при каждом переходе заменяется целиком
+SessionRecord = namedtuple('SessionRecord', [
+    'account_name', 'state', 'client', 'account_data',
+    'user_id', 'guard_type', 'original_message', 'changed_at', 'route', 'games'
+])
+
+# Хранилище состояний сессий
+# Пишут потоки Steam воркеров (под блокировкой), читает asyncio цикл без блокировок:
+# записи неизменяемы, а копия словаря делается одной C-операцией под GIL
+class SessionStore:
+    def __init__(self):
+        self._records = {}
+        self._pending_by_user = {}  # user_id -> account_name, ожидающий Steam Guard код
+        self._counts = {state: 0 for state in SessionState}
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    # Чтение (без блокировок)
+    def get(self, account_name):
+        """Получить запись о сессии или None"""
+        return self._records.get(account_name)
+
+    def state(self, account_name):
+        """Текущее состояние аккаунта"""
+        record = self._records.get(account_name)
+        return record.state if record else SessionState.IDLE
+
+    def client(self, account_name):
+        """Steam клиент аккаунта или None"""
+        record = self._records.get(account_name)
+        return record.client if record else None
+
+    def is_active(self, account_name):
+        """Аккаунт вошел в Steam и накручивает часы"""
+        record = self._records.get(account_name)
+        return record is not None and record.state is SessionState.ACTIVE
+
+    def pending_login(self, user_id):
+        """Запись аккаунта, для которого пользователь должен ввести код"""
+        account_name = self._pending_by_user.get(user_id)
+        record = self._records.get(account_name) if account_name else None
+        if record and record.state is SessionState.AWAITING_GUARD:
+            return record
+        return None
+
+    def snapshot(self):
+        """Копия всех записей на текущий момент"""
+        return self._records.copy()
+
+    def counts(self):
+        """Количество сессий в каждом состоянии (кроме IDLE)"""
+        return self._counts.copy()
+
+    def __contains__(self, account_name):
+        return account_name in self._records
+
+    # Запись
+    def transition(self, account_name, state, **fields):
+        """Перевести аккаунт в новое состояние, при необходимости обновив поля записи"""
+        with self._lock:
+            old = self._records.get(account_name)
+            old_state = old.state if old else SessionState.IDLE
+            if state is SessionState.IDLE:
+                if old is None:
+                    return None
+                record = None
+                del self._records[account_name]
+            else:
+                if old is None:
+                    old = SessionRecord(account_name, state, None, None, None, None, None, 0.0, None, None)
+                record = old._replace(state=state, changed_at=time.monotonic(), **fields)
+                self._records[account_name] = record
+                self._counts[state] += 1
+            if old_state is not SessionState.IDLE:
+                self._counts[old_state] -= 1
+
+            # Индекс ожидающих кода входов по пользователю
+            if old and old.user_id is not None and self._pending_by_user.get(old.user_id) == account_name:
+                del self._pending_by_user[old.user_id]
+            if record and state is SessionState.AWAITING_GUARD and record.user_id is not None:
+                self._pending_by_user[record.user_id] = account_name
+            subscribers = list(self._subscribers)
+
+        if old_state is not state:
+            for callback, loop in subscribers:
+                self._deliver(callback, loop, account_name, old_state, state)
+        return record
+
+    def update(self, account_name, **fields):
+        """Обновить поля записи, не меняя состояние"""
+        with self._lock:
+            record = self._records.get(account_name)
+            if record is None:
+                return None
+            record = record._replace(**fields)
+            self._records[account_name] = record
+            return record
+
+    def remove(self, account_name):
+        """Удалить запись (аккаунт становится IDLE)"""
+        return self.transition(account_name, SessionState.IDLE)
+
+    # Подписки
+    def subscribe(self, callback, loop=None):
+        """Подписаться на переходы: callback(account_name, old_state, new_state)
+
+        С loop уведомления доставляются в asyncio цикл через call_soon_threadsafe,
+        без него - синхронно в потоке, который выполнил переход.
+        """
+        with self._lock:
+            self._subscribers.append((callback, loop))
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [(cb, loop) for cb, loop in self._subscribers if cb is not callback]
+
+    @staticmethod
+    def _deliver(callback, loop, account_name, old_state, new_state):
+        try:
+            if loop is None:
+                callback(account_name, old_state, new_state)
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(callback, account_name, old_state, new_state)
+        except Exception as e:
+            logger.error(f"Ошибка в подписчике состояния {account_name}: {e}")
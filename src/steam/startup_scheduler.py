@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import random
+import time
+from .steam_manager import session_pool, session_store, LOGIN_OK, RATE_LIMIT_RESULTS
+
+logger = logging.getLogger(__name__)
+
+# Ведро токенов: не больше rate входов в секунду с запасом burst
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        """Дождаться свободного токена"""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+# Планировщик массового запуска аккаунтов с ограничением скорости
+class StartupScheduler:
+    def __init__(self, rate=1.0, burst=3, max_concurrent=5, jitter=2.0,
+                 max_retries=5, backoff_base=30, backoff_max=600):
+        self.bucket = TokenBucket(rate, burst)
+        self.jitter = jitter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Общий предел: CM сервер выбирается в воркере при подключении, уже после выдачи входа
+        self._in_flight = asyncio.Semaphore(max_concurrent)
+        self._pause_until = 0
+        self._backoff_level = 0
+
+    async def _wait_pause(self):
+        # Общая пауза после ответа Steam о превышении лимита
+        delay = self._pause_until - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._pause_until - time.monotonic()
+
+    def _register_rate_limit(self):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** self._backoff_level)
+        delay *= random.uniform(0.5, 1.0)
+        self._backoff_level += 1
+        self._pause_until = max(self._pause_until, time.monotonic() + delay)
+        logger.warning(f"Steam ограничивает входы, пауза запуска на {delay:.0f} сек")
+        return delay
+
+    async def _start_one(self, account_name, account_data, user_id=None):
+        for attempt in range(self.max_retries + 1):
+            await self._wait_pause()
+            await self.bucket.acquire()
+            await asyncio.sleep(random.uniform(0, self.jitter))
+            async with self._in_flight:
+                result = await session_pool.login(account_name, account_data, user_id)
+            if result.status == LOGIN_OK:
+                self._backoff_level = max(0, self._backoff_level - 1)
+                return result
+            if result.eresult not in RATE_LIMIT_RESULTS or attempt == self.max_retries:
+                return result
+            self._register_rate_limit()
+            logger.info(f"Повторный запуск {account_name}, попытка {attempt + 2}")
+
+    async def run(self, accounts, progress=None, users=None):
+        """Запустить аккаунты; progress(done, total, eta) вызывается после каждого
+
+        users - пользователи Telegram, которым придет запрос Steam Guard кода: имя -> user_id
+        """
+        users = users or {}
+        pending = {name: data for name, data in accounts.items()
+                   if name not in session_store}
+        total = len(pending)
+        report = {'started': [], 'failed': {}, 'total': total, 'elapsed': 0.0}
+        started_at = time.monotonic()
+        done = 0
+
+        async def start(account_name, account_data):
+            nonlocal done
+            result = await self._start_one(account_name, account_data, users.get(account_name))
+            if result.status == LOGIN_OK:
+                report['started'].append(account_name)
+            else:
+                report['failed'][account_name] = result.eresult.name if result.eresult is not None else result.status
+            done += 1
+            elapsed = time.monotonic() - started_at
+            eta = elapsed / done * (total - done)
+            if progress:
+                await progress(done, total, eta)
+
+        await asyncio.gather(*(start(name, data) for name, data in pending.items()))
+        report['elapsed'] = time.monotonic() - started_at
+        logger.info(
+            f"Массовый запуск завершен за {report['elapsed']:.1f} сек: "
+            f"запущено {len(report['started'])}/{total}, ошибок {len(report['failed'])}"
+        )
+        return report
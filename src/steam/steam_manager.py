@@ -1,108 +1,528 @@
 import asyncio
 import logging
+import random
 import threading
+import time
+import zlib
+from collections import Counter, deque, namedtuple
+import gevent
+from gevent.event import Event
 from steam.client import SteamClient, EResult
+from .active_accounts import active_accounts
+from .boost_schedule import BoostScheduler
+from .cm_directory import CMDirectory
+from .credential_cache import CredentialCache
+from .playtime import PlaytimeTracker
+from .routes import RoutePool
+from .session_store import SessionStore, SessionState
+from ..metrics import metrics
 
 logger = logging.getLogger(__name__)
 
-# Словарь для хранения клиентов и их состояний
-clients = {}
-client_threads = {}
-pending_logins = {}  # Для хранения данных незавершенных входов
+# Хранилище состояний всех сессий
+session_store = SessionStore()
 
-# Функция для запуска Steam клиента в отдельном потоке
-def run_steam_client(account_name, account_data, user_id=None, two_factor_code=None, auth_code=None):
-    """Запустить Steam клиент для аккаунта в отдельном потоке"""
+# Исходы входа, которые сессия сообщает обработчикам бота
+LOGIN_OK = 'ok'
+LOGIN_GUARD_MOBILE = 'mobile'
+LOGIN_GUARD_EMAIL = 'email'
+LOGIN_ERROR = 'error'
+LOGIN_TIMEOUT = 'timeout'
+
+LoginResult = namedtuple('LoginResult', ['status', 'eresult'])
+
+# Ответы Steam, при которых сохраненный login key не считается отклоненным
+TRANSIENT_RESULTS = (
+    EResult.Fail,
+    EResult.TryAnotherCM,
+    EResult.ServiceUnavailable,
+    EResult.Timeout,
+    EResult.RateLimitExceeded,
+    EResult.AccountLoginDeniedThrottle,
+)
+
+# Ответы Steam об ограничении входов: массовый запуск делает паузу, маршрут копит отказы
+RATE_LIMIT_RESULTS = (
+    EResult.RateLimitExceeded,
+    EResult.AccountLoginDeniedThrottle,
+    EResult.TryAnotherCM,
+    EResult.ServiceUnavailable,
+)
+
+credential_cache = CredentialCache()
+
+# Общий список CM серверов с замерами задержки (кэш на диске включается в main)
+cm_directory = CMDirectory()
+
+# Исходящие маршруты (прокси и локальные адреса); без настройки соединения идут напрямую
+route_pool = RoutePool()
+session_store.subscribe(route_pool.on_state_change)
+
+# Накопленное время накрутки по аккаунтам и играм (включается в main)
+playtime_tracker = PlaytimeTracker()
+
+# Окна накрутки, смена партий игр и цели по часам (включается в main)
+boost_scheduler = BoostScheduler()
+
+# Время онлайн/офлайн и число переподключений по аккаунтам
+session_stats = {}
+
+# Метрики Steam сессий (собираются, только когда включен endpoint метрик)
+login_seconds = metrics.histogram('hourbooster_login_seconds', "Длительность входа в Steam по результату", ['result'])
+stop_seconds = metrics.histogram('hourbooster_stop_seconds', "Длительность остановки сессии по исходу", ['outcome'])
+disconnects_total = metrics.counter('hourbooster_disconnects_total', "Обрывы соединения с Steam")
+reconnects_total = metrics.counter('hourbooster_reconnects_total', "Успешные переподключения к Steam")
+metrics.gauge('hourbooster_sessions', "Количество сессий по состояниям", ['state'],
+              lambda: {(state.value,): count for state, count in session_store.counts().items()})
+# Входы с кодом: сколько клиентов переиспользовано и сколько запросов сэкономлено
+guard_logins_total = metrics.counter('hourbooster_guard_logins_total',
+                                     "Входы со Steam Guard кодом: клиент ожидания кода (reused) или новый (fresh)", ['client'])
+guard_round_trips_saved_total = metrics.counter('hourbooster_guard_round_trips_saved_total',
+                                                "Запросы списка CM серверов, сэкономленные повторным использованием клиента")
+
+# Сообщить исход входа ожидающему обработчику
+def _report_login(on_login, status, eresult=None):
+    """Передать результат входа подписчику, если он есть"""
+    if on_login:
+        on_login(LoginResult(status, eresult))
+
+# Забрать клиент, оставшийся после запроса Steam Guard кода
+def _take_pending_client(account_name, user_id):
+    """Вернуть клиент незавершенного входа этого аккаунта, если он есть"""
+    record = session_store.pending_login(user_id)
+    if record is None or record.account_name != account_name:
+        return None
+    client = record.client
+    if client is None or client.logged_on:
+        return None
+    # Клиент уже знает список CM серверов, поэтому запрос к WebAPI за ним не нужен
+    saved = 1 if len(client.cm_servers) else 0
+    if metrics.enabled:
+        guard_logins_total.inc('reused')
+        guard_round_trips_saved_total.inc(amount=saved)
+    logger.info(f"Повторно используем клиент аккаунта {account_name}, сэкономлено запросов: {saved}")
+    return client
+
+# Вход клиента: сначала сохраненный login key, затем пароль
+def _login(client, account_name, account_data, two_factor_code=None, auth_code=None):
+    """Выполнить вход и вернуть EResult"""
+    # Сначала пробуем сохраненный login key, чтобы не спрашивать Steam Guard
+    login_key = None
+    if not (two_factor_code or auth_code):
+        login_key = client.login_key or credential_cache.get_login_key(account_name)
+    if login_key:
+        result = client.login(username=account_data['username'], login_key=login_key)
+        if result == EResult.OK or result in TRANSIENT_RESULTS:
+            route_pool.report(account_name, result in RATE_LIMIT_RESULTS)
+            return result
+        credential_cache.invalidate(account_name)
+
+    # Пробуем войти по паролю с дополнительными кодами если они есть
+    result = client.login(
+        username=account_data['username'],
+        password=account_data['password'],
+        two_factor_code=two_factor_code,
+        auth_code=auth_code
+    )
+    route_pool.report(account_name, result in RATE_LIMIT_RESULTS)
+    return result
+
+# Супервизор сессии: держит аккаунт онлайн и переподключает при обрывах
+def _supervise(account_name, account_data, client, stop_event):
+    """Ждать остановки, восстанавливая сессию после разрывов соединения"""
+    stats = session_stats.setdefault(account_name, {'uptime': 0.0, 'downtime': 0.0, 'disconnects': 0, 'reconnects': 0, 'online_since': None})
+    disconnected = Event()
+    client.on(client.EVENT_DISCONNECTED, lambda *args: disconnected.set())
+
+    while not stop_event.is_set():
+        online_at = stats['online_since'] = time.monotonic()
+        if client.logged_on:
+            disconnected.clear()
+        else:
+            disconnected.set()
+        gevent.wait([stop_event, disconnected], count=1)
+        stats['uptime'] += time.monotonic() - online_at
+        stats['online_since'] = None
+        if stop_event.is_set():
+            return
+
+        stats['disconnects'] += 1
+        if metrics.enabled:
+            disconnects_total.inc()
+        session_store.transition(account_name, SessionState.BACKOFF)
+        offline_at = time.monotonic()
+        logger.warning(f"Аккаунт {account_name} отключился от Steam, переподключаемся")
+        attempt = 0
+        try:
+            while True:
+                # Экспоненциальная пауза с ограничением и разбросом
+                delay = min(session_pool.reconnect_max_delay, 2 ** attempt) * random.uniform(0.5, 1.0)
+                if stop_event.wait(delay):
+                    return
+                login_started = time.monotonic()
+                result = _login(client, account_name, account_data)
+                if metrics.enabled:
+                    login_seconds.observe(time.monotonic() - login_started, result.name)
+                if result == EResult.OK:
+                    games = boost_scheduler.games_for(account_name, account_data['games'])
+                    client.games_played(games)
+                    stats['reconnects'] += 1
+                    if metrics.enabled:
+                        reconnects_total.inc()
+                    session_store.transition(account_name, SessionState.ACTIVE, route=route_pool.route_name(account_name),
+                                             games=tuple(games))
+                    logger.info(f"Аккаунт {account_name} переподключен (попытка {attempt + 1})")
+                    break
+                if result in (EResult.AccountLogonDenied, EResult.AccountLoginDeniedNeedTwoFactor, EResult.InvalidPassword):
+                    # Без пользователя не обойтись: прекращаем попытки
+                    logger.error(f"Аккаунт {account_name} не может переподключиться без участия пользователя: {result}")
+                    return
+                attempt += 1
+        finally:
+            stats['downtime'] += time.monotonic() - offline_at
+
+# Функция для запуска Steam клиента внутри воркера пула сессий
+def run_steam_client(account_name, account_data, user_id=None, two_factor_code=None, auth_code=None, stop_event=None, on_login=None):
+    """Запустить Steam клиент для аккаунта (выполняется как гринлет в воркере пула)"""
+    result = None
+    awaiting_guard = False
     try:
-        client = SteamClient()
-        clients[account_name] = client
-        
+        client = None
+        if two_factor_code or auth_code:
+            # Код завершает уже начатый вход: клиент живет в этом же воркере
+            client = _take_pending_client(account_name, user_id)
+            if client is None and metrics.enabled:
+                guard_logins_total.inc('fresh')
+        if client is None:
+            client = SteamClient()
+            credential_cache.attach(client, account_name)
+            cm_directory.attach(client)
+            route_pool.attach(client, account_name)
+        session_store.transition(account_name, SessionState.CONNECTING, client=client, account_data=account_data, user_id=user_id)
+
         logger.info(f"Попытка входа для аккаунта {account_name}")
-        
-        # Пробуем войти с дополнительными кодами если они есть
-        if two_factor_code:
-            result = client.login(
-                username=account_data['username'], 
-                password=account_data['password'],
-                two_factor_code=two_factor_code
-            )
-        elif auth_code:
-            result = client.login(
-                username=account_data['username'], 
-                password=account_data['password'],
-                auth_code=auth_code
-            )
-        else:
-            result = client.login(
-                username=account_data['username'], 
-                password=account_data['password']
-            )
-        
+
+        login_started = time.monotonic()
+        result = _login(client, account_name, account_data, two_factor_code, auth_code)
+        if metrics.enabled:
+            login_seconds.observe(time.monotonic() - login_started, result.name)
+
         logger.info(f"Результат входа для аккаунта {account_name}: {result} (код: {result.value})")
-        
+
         if result == EResult.OK:
             logger.info(f"Успешный вход для аккаунта {account_name}")
-            client.games_played(account_data['games'])
-            # Очищаем данные ожидающего входа
-            if user_id and user_id in pending_logins:
-                del pending_logins[user_id]
-            client.run_forever()
-        elif result.value == 85:  # EResult.AccountLogonDenied - требуется Steam Guard
+            games = boost_scheduler.games_for(account_name, account_data['games'])
+            client.games_played(games)
+            # Переход в ACTIVE заодно снимает ожидание кода
+            session_store.transition(account_name, SessionState.ACTIVE, route=route_pool.route_name(account_name),
+                                     games=tuple(games))
+            _report_login(on_login, LOGIN_OK, result)
+            on_login = None
+            # Вместо run_forever ждем сигнала остановки, переподключаясь при обрывах
+            if stop_event is None:
+                stop_event = Event()
+            _supervise(account_name, account_data, client, stop_event)
+            session_store.transition(account_name, SessionState.STOPPING)
+            client.logout()
+        elif result.value == 85:  # EResult.AccountLoginDeniedNeedTwoFactor - требуется Steam Guard
             logger.info(f"Требуется Steam Guard код для аккаунта {account_name}")
             if user_id:
-                pending_logins[user_id] = {
-                    'account_name': account_name,
-                    'account_data': account_data,
-                    'client': client,
-                    'guard_type': 'mobile'
-                }
-                # Не удаляем клиент в этом случае
-                return
-        elif result.value == 63:  # EResult.InvalidLoginAuthCode - требуется код с email
+                session_store.transition(account_name, SessionState.AWAITING_GUARD, guard_type='mobile')
+                awaiting_guard = True
+                _report_login(on_login, LOGIN_GUARD_MOBILE, result)
+                on_login = None
+        elif result.value == 63:  # EResult.AccountLogonDenied - требуется код с email
             logger.info(f"Требуется Email код для аккаунта {account_name}")
             if user_id:
-                pending_logins[user_id] = {
-                    'account_name': account_name,
-                    'account_data': account_data,
-                    'client': client,
-                    'guard_type': 'email'
-                }
-                # Не удаляем клиент в этом случае
-                return
+                session_store.transition(account_name, SessionState.AWAITING_GUARD, guard_type='email')
+                awaiting_guard = True
+                _report_login(on_login, LOGIN_GUARD_EMAIL, result)
+                on_login = None
         else:
             logger.error(f"Ошибка входа для аккаунта {account_name}: {result} (код: {result.value})")
-            
+            if user_id and (two_factor_code or auth_code):
+                # Неверный код: пользователь может ввести его еще раз
+                session_store.transition(account_name, SessionState.AWAITING_GUARD)
+                awaiting_guard = True
+
     except Exception as e:
-        logger.error(f"Ошибка в потоке для аккаунта {account_name}: {e}")
+        logger.error(f"Ошибка в сессии аккаунта {account_name}: {e}")
     finally:
-        # Удаляем клиент только если вход был неудачным
-        # НЕ удаляем если ждем Steam Guard код
-        if user_id and user_id in pending_logins:
-            # Ждем ввод кода, клиент не удаляем
+        # Если исход еще не сообщен, значит вход не удался
+        _report_login(on_login, LOGIN_ERROR, result)
+
+        # Клиент, ожидающий Steam Guard код, остается в хранилище
+        if not awaiting_guard:
+            session_store.remove(account_name)
+
+# Передать результат в asyncio future из чужого потока
+def _resolve_future(loop, future, value):
+    """Безопасно завершить future из потока воркера"""
+    def _set():
+        if not future.cancelled() and not future.done():
+            future.set_result(value)
+    loop.call_soon_threadsafe(_set)
+
+# Воркер пула: один поток ОС и один gevent хаб на множество сессий
+class SessionWorker(threading.Thread):
+    def __init__(self, index):
+        super().__init__(name=f"steam-worker-{index}", daemon=True)
+        self.index = index
+        self.sessions = {}  # account_name -> (гринлет, событие остановки)
+        self._jobs = deque()
+        self._wakeup = None
+        self._ready = threading.Event()
+
+    def run(self):
+        hub = gevent.get_hub()
+        # async-вотчер можно дергать из любого потока, он будит хаб воркера
+        self._wakeup = hub.loop.async_()
+        self._wakeup.start(self._drain_jobs)
+        self._ready.set()
+        Event().wait()
+
+    def submit(self, func, *args):
+        """Поставить задачу на выполнение в хабе воркера"""
+        self._ready.wait()
+        self._jobs.append((func, args))
+        self._wakeup.send()
+
+    def _drain_jobs(self):
+        while self._jobs:
+            func, args = self._jobs.popleft()
+            gevent.spawn(func, *args)
+
+    def _start_session(self, account_name, account_data, user_id, two_factor_code, auth_code, on_login):
+        stop_event = Event()
+        greenlet = gevent.spawn(
+            run_steam_client, account_name, account_data, user_id, two_factor_code, auth_code, stop_event, on_login
+        )
+        self.sessions[account_name] = (greenlet, stop_event)
+        greenlet.link(lambda g: self._forget_session(account_name, g))
+
+    def _forget_session(self, account_name, greenlet):
+        session = self.sessions.get(account_name)
+        if session and session[0] is greenlet:
+            del self.sessions[account_name]
+
+    def _stop_session(self, account_name, timeout, done):
+        session = self.sessions.get(account_name)
+        if session:
+            greenlet, stop_event = session
+            stop_event.set()
+            greenlet.join(timeout=timeout)
+            if not greenlet.dead:
+                greenlet.kill(block=False)
+        record = session_store.get(account_name)
+        if record and record.state is SessionState.AWAITING_GUARD:
+            # Клиент ждет Steam Guard код и не имеет активного гринлета
+            record.client.disconnect()
+            session_store.remove(account_name)
+        elif record and not self.sessions.get(account_name):
+            session_store.remove(account_name)
+        done(not session_store.is_active(account_name))
+
+    def _update_games(self, account_name, games):
+        client = session_store.client(account_name)
+        if client and client.logged_on:
+            client.games_played(list(games))
+            session_store.update(account_name, games=tuple(games))
+            playtime_tracker.games_changed(account_name, games)
+            logger.info(f"Обновлен список игр аккаунта {account_name}")
+
+# Номер шарда аккаунта: одинаковый для воркеров и процессов
+def shard_index(account_name, shards):
+    return zlib.crc32(account_name.encode('utf-8')) % shards
+
+# Пул сессий: аккаунты распределяются по фиксированному набору воркеров
+# С processes > 0 сессии живут в отдельных процессах, а пул только пересылает им команды
+class SessionPool:
+    def __init__(self):
+        self.workers = []
+        self.shards = None
+        self.login_timeout = 30
+        self.reconnect_max_delay = 300
+        self._lock = threading.Lock()
+
+    def start(self, workers=4, login_timeout=30, reconnect_max_delay=300, processes=0, initializer=None):
+        """Запустить воркеры пула (или процессы, если processes > 0)"""
+        self.login_timeout = login_timeout
+        self.reconnect_max_delay = reconnect_max_delay
+        if processes:
+            from .process_pool import ProcessShards
+            credential_paths = (credential_cache.path, credential_cache.key_file) if credential_cache.enabled else None
+            self.shards = ProcessShards(processes, workers, login_timeout, reconnect_max_delay, credential_paths, initializer,
+                                        route_pool.settings, cm_directory.settings, metrics.enabled)
+            self.shards.start(asyncio.get_running_loop())
+            return
+        route_pool.start()
+        with self._lock:
+            if self.workers:
+                return
+            self.workers = [SessionWorker(i) for i in range(max(1, workers))]
+            for worker in self.workers:
+                worker.start()
+            logger.info(f"Пул Steam сессий запущен: {len(self.workers)} воркеров")
+
+    def worker_for(self, account_name):
+        """Получить воркер, за которым закреплен аккаунт"""
+        if not self.workers:
+            self.start()
+        return self.workers[shard_index(account_name, len(self.workers))]
+
+    def start_session(self, account_name, account_data, user_id=None, two_factor_code=None, auth_code=None, on_login=None):
+        """Запустить сессию аккаунта в его воркере"""
+        if self.shards:
+            return self.shards.start_session(account_name, account_data, user_id, two_factor_code, auth_code)
+        worker = self.worker_for(account_name)
+        worker.submit(worker._start_session, account_name, account_data, user_id, two_factor_code, auth_code, on_login)
+        return worker.index
+
+    async def login(self, account_name, account_data, user_id=None, two_factor_code=None, auth_code=None, timeout=None):
+        """Запустить сессию и дождаться исхода входа от Steam"""
+        if self.shards:
+            return await self.shards.login(account_name, account_data, user_id, two_factor_code, auth_code, timeout)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.start_session(
+            account_name, account_data, user_id, two_factor_code, auth_code,
+            lambda result: _resolve_future(loop, future, result)
+        )
+        try:
+            return await asyncio.wait_for(future, timeout or self.login_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Steam не ответил на вход аккаунта {account_name} вовремя")
+            return LoginResult(LOGIN_TIMEOUT, None)
+
+    async def stop_session(self, account_name, timeout=5):
+        """Остановить сессию аккаунта и дождаться результата"""
+        if self.shards:
+            return await self.shards.stop_session(account_name, timeout)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        worker = self.worker_for(account_name)
+        worker.submit(
+            worker._stop_session, account_name, timeout,
+            lambda result: _resolve_future(loop, future, result)
+        )
+        return await future
+
+    def update_games(self, account_name, games):
+        """Отправить новый список игр в живую сессию без перезапуска"""
+        if self.shards:
+            self.shards.update_games(account_name, games)
             return
-            
-        # Удаляем клиент в остальных случаях
-        if account_name in clients and (not hasattr(clients[account_name], 'logged_on') or not clients[account_name].logged_on):
-            if account_name in clients:
-                del clients[account_name]
-        if account_name in client_threads:
-            del client_threads[account_name]
+        worker = self.worker_for(account_name)
+        worker.submit(worker._update_games, account_name, games)
+
+    def status(self):
+        """Снимок состояния сессий: аккаунт -> воркер и состояние"""
+        workers = len(self.shards.shards) if self.shards else len(self.workers)
+        return {
+            account_name: {
+                'worker': shard_index(account_name, workers),
+                'state': record.state.value
+            }
+            for account_name, record in session_store.snapshot().items()
+        }
+
+    def worker_load(self):
+        """Количество сессий на каждом воркере (или процессе)"""
+        if self.shards:
+            return self.shards.load()
+        return [len(worker.sessions) for worker in self.workers]
+
+    def close(self):
+        """Завершить процессы шардов; потоки воркеров завершаются вместе с процессом"""
+        route_pool.stop()
+        if self.shards:
+            self.shards.close()
+
+session_pool = SessionPool()
+metrics.gauge('hourbooster_worker_sessions', "Количество сессий на каждом воркере", ['worker'],
+              lambda: {(str(index),): load for index, load in enumerate(session_pool.worker_load())})
+# Считается по записям сессий, поэтому верно и при шардировании по процессам
+metrics.gauge('hourbooster_route_sessions', "Количество активных сессий на каждом исходящем маршруте", ['route'],
+              lambda: Counter((record.route,) for record in session_store.snapshot().values() if record.route))
 
 # Функция для остановки Steam клиента
-def stop_steam_client(account_name):
-    """Остановить Steam клиент"""
-    if account_name not in clients:
+async def stop_steam_client(account_name, timeout=5, forget=True):
+    """Остановить Steam клиент
+
+    forget - остановка по желанию пользователя: аккаунт не восстанавливается после перезапуска
+    """
+    if forget:
+        active_accounts.forget(account_name)
+    if account_name not in session_store:
         return False
-    
+
+    started = time.monotonic()
+    outcome = STOP_ERROR
     try:
-        client = clients[account_name]
-        client.logout()
-        
-        if account_name in client_threads:
-            # Ждем завершения потока
-            client_threads[account_name].join(timeout=5)
-        
-        return True
+        if await session_pool.stop_session(account_name, timeout):
+            outcome = STOP_OK
+    except asyncio.TimeoutError:
+        outcome = STOP_TIMEOUT
     except Exception as e:
         logger.error(f"Ошибка при остановке клиента {account_name}: {e}")
-        return False
+    if metrics.enabled:
+        stop_seconds.observe(time.monotonic() - started, outcome)
+    return outcome == STOP_OK
+
+# Исходы остановки сессии
+STOP_OK = 'stopped'
+STOP_TIMEOUT = 'timeout'
+STOP_ERROR = 'error'
+
+# Параллельная остановка всех сессий с ограничением общего времени
+async def stop_all_clients(timeout=10, accounts=None, forget=True):
+    """Остановить все сессии (или только сессии из accounts) одновременно и вернуть {аккаунт: исход}"""
+    account_names = [name for name in session_store.snapshot() if accounts is None or name in accounts]
+    if forget:
+        for account_name in account_names:
+            active_accounts.forget(account_name)
+    if not account_names:
+        return {}
+    logger.info(f"Останавливаем {len(account_names)} сессий (не дольше {timeout} сек)")
+    tasks = {
+        account_name: asyncio.create_task(session_pool.stop_session(account_name, timeout))
+        for account_name in account_names
+    }
+    _, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+
+    report = {}
+    for account_name, task in tasks.items():
+        if task in pending:
+            task.cancel()
+            report[account_name] = STOP_TIMEOUT
+        elif isinstance(task.exception(), asyncio.TimeoutError):
+            report[account_name] = STOP_TIMEOUT
+        elif task.exception() is not None:
+            logger.error(f"Ошибка при остановке клиента {account_name}: {task.exception()}")
+            report[account_name] = STOP_ERROR
+        else:
+            report[account_name] = STOP_OK if task.result() else STOP_ERROR
+    stopped = sum(1 for outcome in report.values() if outcome == STOP_OK)
+    logger.info(f"Остановлено сессий: {stopped}/{len(report)}")
+    return report
+
+# Применить изменения конфигурации только к затронутым сессиям
+async def apply_account_changes(diff, accounts):
+    """Остановить удаленные аккаунты, обновить игры или перезапустить измененные"""
+    for account_name in diff.removed:
+        if account_name in session_store:
+            logger.info(f"Аккаунт {account_name} удален из конфигурации, останавливаем")
+            await stop_steam_client(account_name)
+    for account_name, fields in diff.changed.items():
+        if not session_store.is_active(account_name):
+            continue
+        if fields == ['games']:
+            if boost_scheduler.enabled:
+                boost_scheduler.reschedule(account_name)
+            else:
+                session_pool.update_games(account_name, accounts[account_name]['games'])
+        else:
+            # Изменились учетные данные: нужен новый вход
+            logger.info(f"Учетные данные аккаунта {account_name} изменены, перезапускаем сессию")
+            await stop_steam_client(account_name, forget=False)
+            session_pool.start_session(account_name, accounts[account_name])
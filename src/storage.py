@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (namespace, key));
+"""
+
+# Все бэкенды хранят строки в пространствах имен: namespace -> {key: value}
+
+# Данные только в памяти процесса (теряются при перезапуске)
+class MemoryBackend:
+    def __init__(self):
+        self._data = {}
+
+    async def get(self, namespace, key):
+        return self._data.get(namespace, {}).get(key)
+
+    async def set(self, namespace, key, value):
+        self._data.setdefault(namespace, {})[key] = value
+
+    async def delete(self, namespace, key):
+        self._data.get(namespace, {}).pop(key, None)
+
+    async def items(self, namespace):
+        return dict(self._data.get(namespace, {}))
+
+    async def close(self):
+        pass
+
+# Локальная SQLite база; запросы выполняет один поток, чтобы не блокировать цикл
+class SQLiteBackend:
+    def __init__(self, path):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='state-db')
+        self._db = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _connection(self):
+        if self._db is None:
+            # isolation_level=None: каждая запись сразу фиксируется на диске
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SQLITE_SCHEMA)
+        return self._db
+
+    def _get(self, namespace, key):
+        row = self._connection().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        return row[0] if row else None
+
+    def _set(self, namespace, key, value):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO kv (namespace, key, value) VALUES (?, ?, ?)", (namespace, key, value))
+
+    def _delete(self, namespace, key):
+        self._connection().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def _items(self, namespace):
+        return dict(self._connection().execute("SELECT key, value FROM kv WHERE namespace = ?", (namespace,)))
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def get(self, namespace, key):
+        return await self._run(self._get, namespace, key)
+
+    async def set(self, namespace, key, value):
+        await self._run(self._set, namespace, key, value)
+
+    async def delete(self, namespace, key):
+        await self._run(self._delete, namespace, key)
+
+    async def items(self, namespace):
+        return await self._run(self._items, namespace)
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown()
+
+# Сервер с протоколом Redis (Redis, KeyDB, Valkey ...): пространство имен - хэш prefix + namespace
+# Клиент минимальный (RESP2, одно соединение), отдельная зависимость не нужна
+class RedisBackend:
+    def __init__(self, url, prefix='hourbooster:'):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.prefix = prefix
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._roundtrip('AUTH', self.password)
+        if self.db:
+            await self._roundtrip('SELECT', self.db)
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _roundtrip(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self._writer.write(b''.join(parts))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _read_reply(self):
+        line = await self._reader.readuntil(b'\r\n')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise RuntimeError(f"Redis: {payload.decode()}")
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode()
+        if kind == b'*':
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RuntimeError(f"Redis: неизвестный ответ {line!r}")
+
+    async def _command(self, *args):
+        async with self._lock:
+            # Одна повторная попытка после обрыва соединения
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    return await self._roundtrip(*args)
+                except (OSError, asyncio.IncompleteReadError) as e:
+                    self._disconnect()
+                    if attempt:
+                        raise
+                    logger.warning(f"Соединение с Redis потеряно, переподключение: {e}")
+
+    async def get(self, namespace, key):
+        return await self._command('HGET', self.prefix + namespace, key)
+
+    async def set(self, namespace, key, value):
+        await self._command('HSET', self.prefix + namespace, key, value)
+
+    async def delete(self, namespace, key):
+        await self._command('HDEL', self.prefix + namespace, key)
+
+    async def items(self, namespace):
+        reply = await self._command('HGETALL', self.prefix + namespace)
+        return dict(zip(reply[::2], reply[1::2]))
+
+    async def close(self):
+        async with self._lock:
+            self._disconnect()
+
+def create_backend(settings):
+    """Бэкенд по настройкам из ConfigManager.get_storage_settings()"""
+    backend = settings['backend']
+    if backend == 'sqlite':
+        return SQLiteBackend(settings['path'])
+    if backend == 'redis':
+        return RedisBackend(settings['url'], settings['prefix'])
+    if backend == 'memory':
+        return MemoryBackend()
+    raise ValueError(f"Неизвестный бэкенд хранилища: {backend}")
+
+# Постоянное хранилище состояния бота (диалоги FSM, список запущенных аккаунтов)
+# До open() работает в памяти, поэтому его можно передать в Dispatcher при импорте
+class StateStorage:
+    def __init__(self):
+        self.backend = MemoryBackend()
+
+    def open(self, settings):
+        """Переключиться на бэкенд из настроек"""
+        self.backend = create_backend(settings)
+        logger.info(f"Хранилище состояния: {settings['backend']}")
+
+    async def close(self):
+        await self.backend.close()
+
+    async def get(self, namespace, key):
+        return await self.backend.get(namespace, key)
+
+    async def set(self, namespace, key, value):
+        await self.backend.set(namespace, key, value)
+
+    async def delete(self, namespace, key):
+        await self.backend.delete(namespace, key)
+
+    async def items(self, namespace):
+        return await self.backend.items(namespace)
+
+state_storage = StateStorage()